@@ -0,0 +1,5 @@
+'''
+Performance benchmarks of Virtual Lab Manager against simulated hypervisors
+
+    python -m benchmarks.run [--sizes 10,100,1000,10000] [--save] [--compare]
+'''
@@ -0,0 +1,146 @@
+'''
+This file is part of Virtual Lab Manager.
+
+VM Lab Manager program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Copyright 2012 Harri Savolainen
+
+@author: hsavolai, epelo
+@license: GPLv3
+
+Measurement, statistics and baselines of the benchmarks
+'''
+import json
+import os
+import time
+from virtlab.metrics import percentile
+
+
+class TimedReporter(object):
+    '''
+    Reporter recording when each VM reported a message ending with
+    one of suffixes, for per VM latencies of launches and stops
+    '''
+
+    def __init__(self, suffixes):
+        self.__suffixes = suffixes
+        self.__started = time.time()
+        self.__latencies = []
+
+    def restart(self):
+        self.__started = time.time()
+        self.__latencies = []
+
+    def add_status_dialogbox(self, text):
+        for suffix in self.__suffixes:
+            if text.endswith(suffix):
+                self.__latencies.append(time.time() - self.__started)
+                return
+
+    def set_statusbar(self, value):
+        pass
+
+    def get_latencies(self):
+        return self.__latencies
+
+
+class Result(object):
+    '''
+    Outcome of one benchmark at one size. Latencies are seconds of
+    single operations, duration the wall time of all of them.
+    '''
+
+    def __init__(self, name, size, operations, duration, latencies, rpcs):
+        self.name = name
+        self.size = size
+        self.operations = operations
+        self.duration = duration
+        self.latencies = latencies
+        self.rpcs = rpcs
+
+    def get_key(self):
+        return "%s/%d" % (self.name, self.size)
+
+    def as_dict(self):
+        return {"throughput": self.operations / self.duration if self.duration > 0 else 0.0,
+                "p50": percentile(self.latencies, 0.50),
+                "p95": percentile(self.latencies, 0.95),
+                "p99": percentile(self.latencies, 0.99),
+                "rpcs": self.rpcs}
+
+    def __str__(self):
+        values = self.as_dict()
+        return "%-10s %6d %12.1f/s %9.4f s %9.4f s %9.4f s %8d" % (
+            self.name, self.size, values["throughput"], values["p50"],
+            values["p95"], values["p99"], values["rpcs"])
+
+    @staticmethod
+    def header():
+        return "%-10s %6s %14s %11s %11s %11s %8s" % (
+            "benchmark", "size", "throughput", "p50", "p95", "p99", "rpcs")
+
+
+class Baselines(object):
+    '''
+    Results of an accepted run stored as JSON, compared against later runs
+    '''
+
+    def __init__(self, path):
+        self.__path = path
+
+    def get_path(self):
+        return self.__path
+
+    def load(self):
+        if not os.path.isfile(self.__path):
+            return {}
+        baseline_file = open(self.__path, "r")
+        try:
+            return json.load(baseline_file)
+        finally:
+            baseline_file.close()
+
+    def save(self, results):
+        baseline = self.load()
+        for result in results:
+            baseline[result.get_key()] = result.as_dict()
+        baseline_file = open(self.__path, "w")
+        try:
+            json.dump(baseline, baseline_file, indent=2, sort_keys=True)
+        finally:
+            baseline_file.close()
+
+    def compare(self, results, tolerance):
+        '''
+        Returns list of regression descriptions: p95 latency or RPC
+        count more than tolerance (fraction) above the baseline, or
+        throughput more than tolerance below it
+        '''
+        baseline = self.load()
+        regressions = []
+        for result in results:
+            expected = baseline.get(result.get_key())
+            if expected is None:
+                continue
+            actual = result.as_dict()
+            if actual["p95"] > expected["p95"] * (1 + tolerance):
+                regressions.append("%s p95 %.4f s, baseline %.4f s" %
+                                   (result.get_key(), actual["p95"], expected["p95"]))
+            if actual["throughput"] < expected["throughput"] * (1 - tolerance):
+                regressions.append("%s throughput %.1f/s, baseline %.1f/s" %
+                                   (result.get_key(), actual["throughput"], expected["throughput"]))
+            if actual["rpcs"] > expected["rpcs"] * (1 + tolerance):
+                regressions.append("%s %d RPCs, baseline %d" %
+                                   (result.get_key(), actual["rpcs"], expected["rpcs"]))
+        return regressions
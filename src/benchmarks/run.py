@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+'''
+This file is part of Virtual Lab Manager.
+
+VM Lab Manager program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Copyright 2012 Harri Savolainen
+
+@author: hsavolai, epelo
+@license: GPLv3
+
+Benchmarks of catalog refresh, launch, stop and view population
+against simulated hypervisors, run from the src directory:
+
+    python -m benchmarks.run --sizes 10,100,1000 --save
+    python -m benchmarks.run --compare
+
+Exits with 1 if --compare finds a regression against the baselines.
+'''
+import argparse
+import os
+import sys
+import time
+from benchmarks.harness import Result, TimedReporter, Baselines
+from virtlab.virtual import VMCatalog
+from virtlab.simulator import SimulatedBackend
+from virtlab.vm import VMState
+
+BASELINES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+SIZES = [10, 100, 1000, 10000]
+
+
+def build_catalog(size, latency, running, reporter=None):
+    backend = SimulatedBackend(size, running=running, latency=latency, seed=size)
+    vm_catalog = VMCatalog(backend)
+    vm_catalog.set_view(reporter or TimedReporter(()))
+    vm_catalog.drain_changes()
+    backend.reset_rpc_counts()
+    return backend, vm_catalog
+
+
+def bench_refresh(size, latency, repeat):
+    backend, vm_catalog = build_catalog(size, latency, 0.5)
+    latencies = []
+    for num in range(repeat):
+        started = time.time()
+        vm_catalog.refresh_vms_list()
+        vm_catalog.drain_changes()
+        latencies.append(time.time() - started)
+    vm_catalog.close()
+    return Result("refresh", size, repeat, sum(latencies), latencies,
+                  backend.get_rpc_count() // repeat)
+
+
+def bench_launch(size, latency, repeat):
+    latencies = []
+    duration = 0
+    rpcs = 0
+    for num in range(repeat):
+        reporter = TimedReporter((" started.", " failed to start."))
+        backend, vm_catalog = build_catalog(size, latency, 0.0, reporter)
+        for vm_instance in vm_catalog.get_vms():
+            vm_instance.set_order(1)
+        backend.reset_rpc_counts()
+        reporter.restart()
+        started = time.time()
+        vm_catalog.scheduled_vm_launcher(True)
+        vm_catalog.get_launch().join()
+        duration += time.time() - started
+        latencies.extend(reporter.get_latencies())
+        rpcs += backend.get_rpc_count()
+        vm_catalog.close()
+    return Result("launch", size, size * repeat, duration, latencies, rpcs // repeat)
+
+
+def bench_stop(size, latency, repeat):
+    latencies = []
+    duration = 0
+    rpcs = 0
+    for num in range(repeat):
+        reporter = TimedReporter((" stopped.", " forced off.", " shut down cleanly.", " failed to stop."))
+        backend, vm_catalog = build_catalog(size, latency, 1.0, reporter)
+        reporter.restart()
+        started = time.time()
+        vm_catalog.stop_all_vms_once()
+        vm_catalog.get_shutdown().join()
+        duration += time.time() - started
+        latencies.extend(reporter.get_latencies())
+        rpcs += backend.get_rpc_count()
+        vm_catalog.close()
+    return Result("stop", size, size * repeat, duration, latencies, rpcs // repeat)
+
+
+def bench_populate(size, latency, repeat):
+    '''
+    Full population of the list view, then updates of 1 % of the rows.
+    Needs gtk and a display, returns None without them.
+    '''
+    try:
+        from vmlab import VirtLabView
+        backend, vm_catalog = build_catalog(size, 0, 0.5)
+        view = VirtLabView(vm_catalog)
+    except (Exception, SystemExit) as exception:
+        # kiwi exits when gtk is missing
+        sys.stderr.write("populate skipped: " + str(exception) + "\n")
+        return None
+    latencies = []
+    started = time.time()
+    view.populate_vmlist()
+    latencies.append(time.time() - started)
+    vm_instances = vm_catalog.get_vms()
+    changed = vm_instances[::100]
+    for num in range(repeat):
+        for vm_instance in changed:
+            vm_instance.apply_state(VMState.Stopped if vm_instance.get_state() is VMState.Running else VMState.Running)
+        started = time.time()
+        view.populate_vmlist(vm_catalog.drain_changes().get_changed())
+        latencies.append(time.time() - started)
+    vm_catalog.close()
+    return Result("populate", size, repeat + 1, sum(latencies), latencies, 0)
+
+
+BENCHMARKS = [
+    ("refresh", bench_refresh),
+    ("launch", bench_launch),
+    ("stop", bench_stop),
+    ("populate", bench_populate),
+]
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="benchmarks.run",
+                                     description="Virtual Lab Manager benchmarks")
+    parser.add_argument("--sizes", default=",".join(str(size) for size in SIZES),
+                        help="comma separated domain counts")
+    parser.add_argument("--benchmarks", default=",".join(name for name, bench in BENCHMARKS),
+                        help="comma separated benchmarks to run")
+    parser.add_argument("--latency", type=float, default=0.0005,
+                        help="simulated RPC latency in seconds")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--baselines", default=BASELINES_PATH)
+    parser.add_argument("--save", action="store_true", help="store results as baselines")
+    parser.add_argument("--compare", action="store_true", help="fail on regressions against baselines")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed regression as a fraction of the baseline")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    sizes = [int(size) for size in args.sizes.split(",")]
+    selected = args.benchmarks.split(",")
+
+    results = []
+    print(Result.header())
+    for name, bench in BENCHMARKS:
+        if name not in selected:
+            continue
+        for size in sizes:
+            result = bench(size, args.latency, max(1, args.repeat))
+            if result is None:
+                break
+            print(str(result))
+            sys.stdout.flush()
+            results.append(result)
+
+    baselines = Baselines(args.baselines)
+    exit_code = 0
+    if args.compare:
+        regressions = baselines.compare(results, args.tolerance)
+        for regression in regressions:
+            print("REGRESSION " + regression)
+        exit_code = 1 if len(regressions) > 0 else 0
+    if args.save:
+        baselines.save(results)
+        print("Baselines saved to " + baselines.get_path())
+    return exit_code
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+'''
+This file is part of Virtual Lab Manager.
+
+VM Lab Manager program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Copyright 2012 Harri Savolainen
+
+@author: hsavolai
+@license: GPLv3
+'''
+import unittest
+import threading
+from virtlab.asyncdao import Future, completed, when_all
+
+
+class Test(unittest.TestCase):
+
+    def testFutureResultFromAnotherThread(self):
+        future = Future()
+        threading.Timer(0.01, future.set_result, args=(42,)).start()
+        self.assertEqual(42, future.result(5))
+
+    def testFutureRaisesException(self):
+        future = Future()
+        future.set_exception(ValueError())
+        self.assertRaises(ValueError, future.result)
+
+    def testFutureTimeout(self):
+        self.assertRaises(RuntimeError, Future().result, 0.01)
+
+    def testThenAndWhenAll(self):
+        failed = Future()
+        failed.set_exception(ValueError())
+        combined = when_all([completed(1), failed]).then(
+                lambda future: [part.exception() is None for part in future.result()])
+        self.assertEqual([True, False], combined.result(5))
+        self.assertEqual([], when_all([]).result(5))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+'''
+This file is part of Virtual Lab Manager.
+
+VM Lab Manager program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Copyright 2012 Harri Savolainen
+
+@author: hsavolai
+@license: GPLv3
+'''
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from StringIO import StringIO
+from virtlab.virtual import VMCatalog
+from vmlabcli import main, parse_args
+
+
+class Test(unittest.TestCase):
+
+    def testOptionsBeforeProject(self):
+        args = parse_args(["stop", "-m", "graceful", "p.lab"])
+        self.assertEqual(("stop", "graceful", "p.lab"), (args.command, args.mode, args.project))
+        args = parse_args(["start", "-s", "5", "p.lab"])
+        self.assertEqual(("start", 5, "p.lab"), (args.command, args.simulate, args.project))
+        args = parse_args(["status", "-c", "qemu:///system", "p.lab"])
+        self.assertEqual(["qemu:///system"], args.connect)
+        self.assertEqual("p.lab", args.project)
+
+    def testOptionsAfterProject(self):
+        args = parse_args(["start", "p.lab", "-s", "5", "-q"])
+        self.assertEqual(("start", 5, "p.lab", True),
+                         (args.command, args.simulate, args.project, args.quiet))
+
+    def testProjectIsOptional(self):
+        args = parse_args(["status", "-a"])
+        self.assertEqual(None, args.project)
+        self.assertTrue(args.all)
+
+    def testCatalogClosedOnError(self):
+        closed = []
+        close = VMCatalog.close
+        VMCatalog.close = lambda catalog: closed.append(catalog)
+        stdout = sys.stdout
+        sys.stdout = StringIO()
+        directory = tempfile.mkdtemp()
+        try:
+            exit_code = main(["status", "-s", "2", "-q", "--log", os.path.join(directory, "launch.log"),
+                              os.path.join(directory, "missing.lab")])
+            output = sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+            VMCatalog.close = close
+            shutil.rmtree(directory)
+        self.assertNotEqual(0, exit_code)
+        self.assertEqual("PROJECT", json.loads(output)["error"])
+        self.assertEqual(1, len(closed))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+'''
+This file is part of Virtual Lab Manager.
+
+VM Lab Manager program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Copyright 2012 Harri Savolainen
+
+@author: hsavolai
+@license: GPLv3
+'''
+import threading
+import time
+import unittest
+import libvirt
+import virtlab.vm
+from virtlab.vm import LibVirtDao, VMState
+from virtlab.virtual import VMCatalog
+from virtlab.simulator import SimulatedBackend
+from virtlab.auxiliary import VMLabException
+from virtlab.metrics import get_registry
+
+
+class Connection(object):
+
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+        return 0
+
+
+class Domain(libvirt.virDomain):
+
+    def __init__(self, name):
+        self.domain_name = name
+
+    def name(self):
+        return self.domain_name
+
+    def UUIDString(self):
+        return "uuid-" + self.domain_name
+
+
+class ListingConnection(Connection):
+
+    def listAllDomains(self, flags):
+        if flags == libvirt.VIR_CONNECT_LIST_DOMAINS_ACTIVE:
+            return [Domain("vm1")]
+        return [Domain("vm2")]
+
+
+class Clock(object):
+    '''
+    Stands in for the time module of virtlab.vm, sleeps are recorded
+    and wait for gate if given
+    '''
+
+    def __init__(self, gate=None):
+        self.sleeps = []
+        self.gate = gate
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        if self.gate is not None:
+            self.gate.wait(5)
+
+    def time(self):
+        return time.time()
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.open = libvirt.open
+        self.time = virtlab.vm.time
+
+    def tearDown(self):
+        libvirt.open = self.open
+        virtlab.vm.time = self.time
+
+    def testReconnectWithBackoff(self):
+        lost = Connection()
+        reopened = Connection()
+        attempts = [lost, None, None, reopened]
+
+        def open_connection(hook):
+            conn = attempts.pop(0)
+            if conn is None:
+                raise libvirt.libvirtError("Connection refused")
+            return conn
+        libvirt.open = open_connection
+        gate = threading.Event()
+        clock = Clock(gate)
+        virtlab.vm.time = clock
+
+        dao = LibVirtDao("qemu+ssh://kvm1/system")
+        notified = []
+        reconnected = threading.Event()
+
+        def listener(changed_dao, connected):
+            notified.append((changed_dao, connected))
+            if connected:
+                reconnected.set()
+        dao.add_connection_listener(listener)
+        dao.connection_lost()
+        self.assertRaises(VMLabException, dao.get_conn)
+        gate.set()
+        self.assertTrue(reconnected.wait(5))
+
+        self.assertEqual([(dao, False), (dao, True)], notified)
+        self.assertTrue(lost.closed)
+        self.assertTrue(dao.is_connected())
+        self.assertEqual(2, dao.get_generation())
+        self.assertEqual([1, 2, 4], clock.sleeps)
+
+    def testResyncAfterReconnect(self):
+        primary = SimulatedBackend(1, "kvm1")
+        backend = SimulatedBackend(host="kvm2")
+        domain = backend.add_domain("vm1")
+        vm_catalog = VMCatalog([primary, backend])
+        # Like the GUI, a reconnect is followed by one bulk refresh
+        backend.add_connection_listener(
+                lambda dao, connected: connected and vm_catalog.refresh_vms_list())
+
+        backend.disconnect()
+        vm_catalog.refresh_vms_list()
+        self.assertEqual(set(["kvm2"]), vm_catalog.get_unreachable())
+        self.assertTrue(vm_catalog.get_vm("vm1@kvm2").is_stale())
+
+        domain.power_on(time.time())
+        backend.reset_rpc_counts()
+        backend.reconnect()
+        self.assertEqual({"listAllDomains": 2}, backend.get_rpc_counts())
+        self.assertEqual(set(), vm_catalog.get_unreachable())
+        vm_instance = vm_catalog.get_vm("vm1@kvm2")
+        self.assertFalse(vm_instance.is_stale())
+        self.assertEqual(VMState.Running, vm_instance.get_state())
+        vm_catalog.close()
+
+    def testUnreachableHostAtStartup(self):
+        attempts = {"qemu:///system": [Connection()],
+                    "qemu+ssh://kvm2/system": [None, Connection()]}
+
+        def open_connection(hook):
+            conn = attempts[hook].pop(0)
+            if conn is None:
+                raise libvirt.libvirtError("Connection refused")
+            return conn
+        libvirt.open = open_connection
+        gate = threading.Event()
+        virtlab.vm.time = Clock(gate)
+
+        vm_catalog = VMCatalog(["qemu:///system", "qemu+ssh://kvm2/system"], autoload=False)
+        vm_catalog.restore_snapshot([{"name": "TEST-VM@kvm2", "state": "Running"}])
+        dao = vm_catalog.connect()
+        reconnected = threading.Event()
+        vm_catalog.get_dao("kvm2").add_connection_listener(
+                lambda changed_dao, connected: connected and reconnected.set())
+        self.assertTrue(dao.is_connected())
+        self.assertEqual(set(["kvm2"]), vm_catalog.get_unreachable())
+        # The cached VM of the host stays, stale, until the host answers
+        vm_catalog.reconcile({})
+        self.assertTrue(vm_catalog.get_vm("TEST-VM@kvm2").is_stale())
+        gate.set()
+        self.assertTrue(reconnected.wait(5))
+        self.assertTrue(vm_catalog.get_dao("kvm2").is_connected())
+
+    def testEveryHostUnreachable(self):
+        def open_connection(hook):
+            raise libvirt.libvirtError("Connection refused")
+        libvirt.open = open_connection
+        vm_catalog = VMCatalog(["qemu:///system", "qemu+ssh://kvm2/system"], autoload=False)
+        self.assertRaises(VMLabException, vm_catalog.connect)
+
+    def testRpcsCountedPerLibvirtCall(self):
+        libvirt.open = lambda hook: ListingConnection()
+        dao = LibVirtDao("qemu+ssh://kvm1/system")
+        get_registry().reset()
+        self.assertEqual(["vm1", "vm2"], list(dao.get_domain_states().keys()))
+        # Names and UUIDs of the listed domains are not RPCs
+        self.assertEqual([("listAllDomains", 2)],
+                         [(labels["operation"], timing.count)
+                          for labels, timing in get_registry().get_timings("rpc")])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+'''
+This file is part of Virtual Lab Manager.
+
+VM Lab Manager program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Copyright 2012 Harri Savolainen
+
+@author: hsavolai
+@license: GPLv3
+'''
+import logging
+import unittest
+from virtlab.dispatch import UIDispatcher
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.scheduled = []
+        self.dispatcher = UIDispatcher(lambda interval, function: self.scheduled.append(function),
+                                       interval=100, batch=2)
+
+    def testDrainsInBatches(self):
+        calls = []
+        for num in range(5):
+            self.dispatcher.call(calls.append, num)
+        self.assertEqual(1, len(self.scheduled))
+        self.assertTrue(self.dispatcher.drain())
+        self.assertEqual([0, 1], calls)
+        self.assertTrue(self.dispatcher.drain())
+        self.assertFalse(self.dispatcher.drain())
+        self.assertEqual([0, 1, 2, 3, 4], calls)
+        self.dispatcher.call(calls.append, 5)
+        self.assertEqual(2, len(self.scheduled))
+
+    def testCoalescedRunOncePerDrain(self):
+        texts = []
+        self.dispatcher.coalesce("statusbar", texts.append, "Launch in progress.")
+        self.dispatcher.coalesce("statusbar", texts.append, "Launch completed.")
+        self.assertFalse(self.dispatcher.drain())
+        self.assertEqual(["Launch completed."], texts)
+        self.assertEqual(0, self.dispatcher.get_pending())
+
+    def testFailingCallKeepsBatch(self):
+        calls = []
+        self.dispatcher.call(lambda: 1 / 0)
+        self.dispatcher.call(calls.append, 1)
+        self.dispatcher.coalesce("statusbar", calls.append, 2)
+        logger = logging.getLogger("vmlab")
+        logger.disabled = True
+        try:
+            self.assertFalse(self.dispatcher.drain())
+        finally:
+            logger.disabled = False
+        self.assertEqual([1, 2], calls)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+'''
+This file is part of Virtual Lab Manager.
+
+VM Lab Manager program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Copyright 2012 Harri Savolainen
+
+@author: hsavolai
+@license: GPLv3
+'''
+import os
+import shutil
+import tempfile
+import unittest
+from virtlab.launchlog import LaunchLog
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def testKeepsLatestLines(self):
+        launch_log = LaunchLog(3)
+        for num in range(10):
+            launch_log.append("vm%d started." % num)
+        lines = launch_log.get_lines()
+        self.assertEqual(3, len(lines))
+        self.assertTrue(lines[0].endswith(" vm7 started."))
+        self.assertTrue(lines[2].endswith(" vm9 started."))
+
+    def testFileIsRotated(self):
+        path = os.path.join(self.directory, "launch.log")
+        launch_log = LaunchLog(10, path, max_bytes=256, backups=2)
+        for num in range(100):
+            launch_log.append("vm%d started." % num)
+        launch_log.close()
+        self.assertEqual(["launch.log", "launch.log.1", "launch.log.2"],
+                         sorted(os.listdir(self.directory)))
+        self.assertTrue(os.path.getsize(path) <= 256)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+'''
+This file is part of Virtual Lab Manager.
+
+VM Lab Manager program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Copyright 2012 Harri Savolainen
+
+@author: hsavolai
+@license: GPLv3
+'''
+import unittest
+from virtlab.vm import VMInstance, VMMetadata
+from virtlab.launcher import resolve_dependencies
+from virtlab.planner import plan_launch
+from virtlab.probe import parse_probe, DomainRunningProbe, TcpProbe, \
+                          GuestAgentProbe, ConsoleProbe
+from virtlab.auxiliary import VMLabException
+import virtlab.constant as c
+
+
+class Test(unittest.TestCase):
+
+    def buildVM(self, name, order=0, depends=None):
+        vm_instance = VMInstance(name, None)
+        vm_instance.set_metadataref(VMMetadata())
+        vm_instance.set_order(order)
+        if depends is not None:
+            vm_instance.set_depends(depends)
+        return vm_instance
+
+    def testOrderGroupsDependOnPreviousGroup(self):
+        vms = [self.buildVM("TEST-VM-3", 3), self.buildVM("TEST-VM-1A", 1),
+               self.buildVM("TEST-VM-1B", 1), self.buildVM("TEST-VM-2", 2)]
+
+        dependencies = resolve_dependencies(vms)
+
+        self.assertEqual(["TEST-VM-1A", "TEST-VM-1B", "TEST-VM-2",
+                          "TEST-VM-3"], list(dependencies.keys()))
+        self.assertEqual(set(), dependencies["TEST-VM-1A"])
+        self.assertEqual(set(), dependencies["TEST-VM-1B"])
+        self.assertEqual(set(["TEST-VM-1A", "TEST-VM-1B"]),
+                         dependencies["TEST-VM-2"])
+        self.assertEqual(set(["TEST-VM-2"]), dependencies["TEST-VM-3"])
+
+    def testExplicitDependenciesOverrideOrder(self):
+        vms = [self.buildVM("TEST-VM-1", 1), self.buildVM("TEST-VM-2", 2),
+               self.buildVM("TEST-VM-3", 3, ["TEST-VM-1", "TEST-VM-GONE"]),
+               self.buildVM("TEST-VM-4", 4, [c.DEPENDS_ORDER_PREFIX + "2"])]
+
+        dependencies = resolve_dependencies(vms)
+
+        self.assertEqual(set(["TEST-VM-1"]), dependencies["TEST-VM-3"])
+        self.assertEqual(set(["TEST-VM-2"]), dependencies["TEST-VM-4"])
+
+    def testUnorderedIgnoresOrderGroups(self):
+        vms = [self.buildVM("TEST-VM-1", 1), self.buildVM("TEST-VM-2", 2)]
+
+        dependencies = resolve_dependencies(vms, ordered=False)
+
+        self.assertEqual(set(), dependencies["TEST-VM-2"])
+
+    def testCycleIsRejected(self):
+        vms = [self.buildVM("TEST-VM-1", 1, ["TEST-VM-2"]),
+               self.buildVM("TEST-VM-2", 1, ["TEST-VM-1"])]
+
+        self.assertRaises(VMLabException, resolve_dependencies, vms)
+
+    def testPlanKeepsSettleDelayAndConcurrency(self):
+        vms = [self.buildVM("TEST-VM-1A", 1), self.buildVM("TEST-VM-1B", 1),
+               self.buildVM("TEST-VM-1C", 1), self.buildVM("TEST-VM-2", 2)]
+        vms[0].set_delay(1)
+        vms[1].set_probe("agent")
+
+        plan = plan_launch(vms, concurrency=2)
+
+        self.assertEqual([["TEST-VM-1A", "TEST-VM-1B", "TEST-VM-1C"], ["TEST-VM-2"]],
+                         plan.get_stages())
+        entries = dict((entry.get_name(), entry) for entry in plan.get_entries())
+        # 1A hands its worker to 1C at once, 1B keeps one busy while probing
+        self.assertEqual(0.0, entries["TEST-VM-1C"].get_start())
+        self.assertEqual(c.PLAN_DEFAULT_BOOT, entries["TEST-VM-1B"].get_ready())
+        self.assertEqual(60.0, entries["TEST-VM-2"].get_start())
+        self.assertEqual(60.0, plan.get_duration())
+
+    def testPlanRejectsCycle(self):
+        vms = [self.buildVM("TEST-VM-1", 1, ["TEST-VM-2"]),
+               self.buildVM("TEST-VM-2", 1, ["TEST-VM-1"])]
+
+        self.assertRaises(VMLabException, plan_launch, vms)
+
+    def testProbeNotation(self):
+        self.assertTrue(isinstance(parse_probe("running"), DomainRunningProbe))
+        self.assertTrue(isinstance(parse_probe("tcp:22"), TcpProbe))
+        self.assertTrue(isinstance(parse_probe("tcp:10.0.0.5:22"), TcpProbe))
+        self.assertTrue(isinstance(parse_probe("agent"), GuestAgentProbe))
+        self.assertTrue(isinstance(parse_probe("console:login: $"),
+                                   ConsoleProbe))
+        self.assertEqual(None, parse_probe(""))
+        self.assertEqual(None, parse_probe("tcp:ssh"))
+        self.assertEqual(None, parse_probe("console:("))
+        self.assertEqual(None, parse_probe("unknown"))
+
+
+if __name__ == "__main__":
+    #import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
@@ -0,0 +1,322 @@
+#!/usr/bin/env python
+'''
+This file is part of Virtual Lab Manager.
+
+VM Lab Manager program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Copyright 2012 Harri Savolainen
+
+@author: hsavolai
+@license: GPLv3
+'''
+import os
+import shutil
+import tempfile
+import unittest
+import libvirt
+from virtlab.virtual import VMCatalog
+from virtlab.simulator import SimulatedBackend
+from virtlab.launcher import LaunchEngine
+from virtlab.admission import AdmissionControl
+from virtlab.executor import ShutdownExecutor
+from virtlab.events import VMStateTracker
+from virtlab.auxiliary import VMLabException
+from virtlab.vm import VMInstance, VMState
+from virtlab.metrics import get_registry
+from virtlab.profiler import BootProfiler
+import virtlab.constant as c
+
+
+class Reporter(object):
+
+    def __init__(self):
+        self.messages = []
+
+    def add_status_dialogbox(self, text):
+        self.messages.append(text)
+
+    def set_statusbar(self, value):
+        pass
+
+
+class Test(unittest.TestCase):
+
+    def testRefreshIsTwoRpcsPerHost(self):
+        backend = SimulatedBackend(1000, running=0.5, seed=1)
+        vm_catalog = VMCatalog(backend)
+        self.assertEqual(1000, len(vm_catalog.get_vms()))
+        backend.reset_rpc_counts()
+        vm_catalog.refresh_vms_list()
+        self.assertEqual({"listAllDomains": 2}, backend.get_rpc_counts())
+
+    def testRefreshMetrics(self):
+        get_registry().reset()
+        vm_catalog = VMCatalog(SimulatedBackend(10, "kvm1"))
+        vm_catalog.refresh_vms_list()
+        host = get_registry().summary()["hosts"]["kvm1"]
+        self.assertEqual(2, host["refreshes"])
+        self.assertEqual(2.0, host["rpcs_per_refresh"])
+        self.assertEqual(0.0, host["error_rate"])
+        self.assertTrue('vmlab_rpc_seconds_count{host="kvm1",operation="listAllDomains",outcome="ok"} 4'
+                        in get_registry().to_prometheus())
+
+    def testChangeListenerOncePerDrain(self):
+        vm_catalog = VMCatalog(SimulatedBackend(10, running=1.0))
+        vm_catalog.set_view(Reporter())
+        vm_catalog.drain_changes()
+        notified = []
+        vm_catalog.set_change_listener(lambda: notified.append(True))
+        vm_catalog.stop_all_vms_once()
+        vm_catalog.get_shutdown().join()
+        vm_catalog.refresh_vms_list()
+        self.assertEqual(1, len(notified))
+        self.assertEqual(10, len(vm_catalog.drain_changes().get_changed()))
+        vm_catalog.close()
+
+    def testBootHistory(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "boot.json")
+            vm_catalog = VMCatalog(SimulatedBackend(2))
+            vm_catalog.set_view(Reporter())
+            vm_catalog.set_profiler(BootProfiler(path=path))
+            for vm_instance in vm_catalog.get_vms():
+                vm_instance.set_order(1)
+            vm_catalog.scheduled_vm_launcher(True)
+            self.assertTrue(vm_catalog.get_launch().join(10))
+            vm_catalog.close()
+
+            profiler = BootProfiler(path=path)
+            self.assertTrue(profiler.load())
+            launches = profiler.get_launches("sim-00001")
+            self.assertEqual(1, len(launches))
+            self.assertEqual(c.LAUNCH_DONE, launches[0][4])
+            self.assertEqual(1, profiler.get_stats("sim-00001")[0])
+        finally:
+            shutil.rmtree(directory)
+
+    def testDomainEventsUpdateOneVM(self):
+        backend = SimulatedBackend(3)
+        vm_catalog = VMCatalog(backend)
+        vm_catalog.drain_changes()
+        tracker = VMStateTracker(backend)
+        self.assertTrue(tracker.start(vm_catalog.apply_domain_event))
+        backend.reset_rpc_counts()
+
+        backend.start_domain(vm_catalog.get_vm("sim-00001"))
+        changes = vm_catalog.drain_changes()
+        self.assertEqual(set(["sim-00001"]), changes.get_state_changed())
+        self.assertEqual(set(["sim-00001"]), changes.get_changed())
+        self.assertEqual(VMState.Running, vm_catalog.get_vm("sim-00001").get_state())
+
+        backend.stop_domain(vm_catalog.get_vm("sim-00001"))
+        self.assertEqual(set(["sim-00001"]), vm_catalog.drain_changes().get_changed())
+        self.assertEqual(VMState.Stopped, vm_catalog.get_vm("sim-00001").get_state())
+
+        backend.remove_domain("sim-00002")
+        self.assertEqual(set(["sim-00002"]), vm_catalog.drain_changes().get_changed())
+        self.assertEqual(VMState.Gone, vm_catalog.get_vm("sim-00002").get_state())
+        # Events carry the state, only the start and stop calls were RPCs
+        self.assertEqual({"create": 1, "destroy": 1}, backend.get_rpc_counts())
+        tracker.stop()
+
+    def testUnknownDomainEventRequeries(self):
+        backend = SimulatedBackend(1)
+        vm_catalog = VMCatalog(backend)
+        vm_catalog.drain_changes()
+        tracker = VMStateTracker(backend)
+        tracker.start(vm_catalog.apply_domain_event)
+        backend.reset_rpc_counts()
+
+        # A defined event does not tell the state of the domain
+        backend.add_domain("vm1", active=True)
+        self.assertEqual({"lookupByName": 1}, backend.get_rpc_counts())
+        self.assertEqual(set(["vm1"]), vm_catalog.drain_changes().get_added())
+        self.assertEqual(VMState.Running, vm_catalog.get_vm("vm1").get_state())
+        tracker.stop()
+
+        # The GUI queries off the main loop and applies only the result
+        backend.stop_domain(vm_catalog.get_vm("vm1"))
+        self.assertEqual(VMState.Stopped, vm_catalog.query_domain_state_async("vm1").result(5))
+        self.assertTrue(vm_catalog.drain_changes().is_empty())
+        vm_catalog.close()
+
+    def testHeldUntilCapacityFrees(self):
+        backend = SimulatedBackend(host_memory=2 * c.SIMULATOR_DOMAIN_MEMORY)
+        backend.add_domain("vm1")
+        backend.add_domain("vm2")
+        backend.add_domain("vm3", active=True)
+        vm_catalog = VMCatalog(backend)
+        launch = LaunchEngine([vm_catalog.get_vm("vm1"), vm_catalog.get_vm("vm2")], Reporter(),
+                              concurrency=1, zero_delay=True,
+                              admission=AdmissionControl(memory_ratio=1.0, interval=0))
+        launch.start()
+        self.assertFalse(launch.join(1))
+        self.assertEqual([c.LAUNCH_DONE, c.LAUNCH_HELD],
+                         [node.get_status() for node in launch.get_nodes()])
+
+        backend.stop_domain(vm_catalog.get_vm("vm3"))
+        launch.resume_held()
+        self.assertTrue(launch.join(10))
+        self.assertEqual([c.LAUNCH_DONE, c.LAUNCH_DONE],
+                         [node.get_status() for node in launch.get_nodes()])
+
+    def testHeldUntilTimeout(self):
+        backend = SimulatedBackend(host_memory=c.SIMULATOR_DOMAIN_MEMORY)
+        backend.add_domain("vm1")
+        backend.add_domain("vm2")
+        backend.add_domain("vm3", active=True)
+        vm_catalog = VMCatalog(backend)
+        vm_catalog.get_vm("vm2").set_depends(["vm1"])
+        launch = LaunchEngine([vm_catalog.get_vm("vm1"), vm_catalog.get_vm("vm2")], Reporter(),
+                              concurrency=1, zero_delay=True,
+                              admission=AdmissionControl(memory_ratio=1.0, interval=0), hold_timeout=0.1)
+        launch.start()
+        self.assertFalse(launch.join(1))
+        self.assertEqual(c.LAUNCH_HELD, launch.get_node("vm1").get_status())
+
+        launch.resume_held()
+        self.assertTrue(launch.join(10))
+        self.assertEqual(c.LAUNCH_FAILED, launch.get_node("vm1").get_status())
+        self.assertEqual(c.LAUNCH_SKIPPED, launch.get_node("vm2").get_status())
+
+    def testLargerThanHostFails(self):
+        backend = SimulatedBackend(host_memory=c.SIMULATOR_DOMAIN_MEMORY // 2)
+        backend.add_domain("vm1")
+        vm_catalog = VMCatalog(backend)
+        reporter = Reporter()
+        launch = LaunchEngine(vm_catalog.get_vms(), reporter, zero_delay=True,
+                              admission=AdmissionControl(memory_ratio=1.0, interval=0))
+        launch.start()
+        self.assertTrue(launch.join(10))
+        self.assertEqual(c.LAUNCH_FAILED, launch.get_node("vm1").get_status())
+        self.assertTrue(any(text.startswith("vm1 not started") for text in reporter.messages))
+
+    def testDefaultAdmissionAllowsOvercommit(self):
+        backend = SimulatedBackend(host_memory=c.SIMULATOR_DOMAIN_MEMORY)
+        backend.add_domain("vm1")
+        backend.add_domain("vm2", active=True)
+        vm_catalog = VMCatalog(backend)
+        admission = AdmissionControl()
+        self.assertEqual(0, backend.get_host_capacity().free_memory)
+        self.assertEqual(None, admission.admit(vm_catalog.get_vm("vm1")))
+        self.assertEqual(None, admission.exceeds_host(vm_catalog.get_vm("vm1")))
+
+    def testWarmStartedVMsWaitForConnect(self):
+        backend = SimulatedBackend(1)
+        vm_catalog = VMCatalog(backend, autoload=False)
+        vm_catalog.set_view(Reporter())
+        vm_catalog.restore_snapshot([{"name": "sim-00000", "state": c.STATE_STOPPED, "order": 1},
+                                     {"name": "sim-00001", "state": c.STATE_RUNNING, "order": 1}])
+        self.assertEqual([], vm_catalog.get_startable())
+        vm_catalog.stop_all_vms_once()
+        self.assertEqual(None, vm_catalog.get_shutdown())
+
+        vm_catalog.connect()
+        self.assertEqual(["sim-00000"], [vm_instance.get_id() for vm_instance in vm_catalog.get_startable()])
+
+    def testReconcileWarmStart(self):
+        backend = SimulatedBackend(2, running=1.0)
+        vm_catalog = VMCatalog(backend, autoload=False)
+        vm_catalog.restore_snapshot([{"name": "sim-00000", "state": "Stopped", "desc": "Test"},
+                                     {"name": "sim-gone", "state": "Running"}])
+        vm_catalog.connect()
+        vm_catalog.drain_changes()
+        self.assertTrue(vm_catalog.reconcile(backend.get_domain_states()))
+
+        self.assertEqual(["sim-00000", "sim-00001"],
+                         [vm_instance.get_id() for vm_instance in vm_catalog.get_vms()])
+        self.assertEqual("Test", vm_catalog.get_vm("sim-00000").get_desc())
+        self.assertTrue(all(vm_instance.get_state() is VMState.Running and not vm_instance.is_stale()
+                            for vm_instance in vm_catalog.get_vms()))
+        changes = vm_catalog.drain_changes()
+        self.assertEqual(set(["sim-00001"]), changes.get_added())
+        self.assertEqual(set(["sim-gone"]), changes.get_removed())
+
+    def testUnknownDomainIsNotAConnectionError(self):
+        backend = SimulatedBackend(1)
+        vm_instance = VMInstance("sim-missing", backend)
+        try:
+            backend.start_domain(vm_instance)
+            self.fail("start of an unknown domain succeeded")
+        except libvirt.libvirtError as error:
+            self.assertEqual(libvirt.VIR_ERR_NO_DOMAIN, error.get_error_code())
+        self.assertTrue(backend.is_connected())
+
+    def testTwoHosts(self):
+        vm_catalog = VMCatalog([SimulatedBackend(3, "kvm1"),
+                                SimulatedBackend(3, "kvm2")])
+        self.assertEqual(6, len(vm_catalog.get_vms()))
+        self.assertEqual(("kvm2", "sim-00000"),
+                         vm_catalog.get_vm("sim-00000@kvm2").get_key())
+
+    def testLaunchAndStop(self):
+        vm_catalog = VMCatalog(SimulatedBackend(10))
+        vm_catalog.set_view(Reporter())
+        for vm_instance in vm_catalog.get_vms():
+            vm_instance.set_order(1)
+        vm_catalog.scheduled_vm_launcher(True)
+        self.assertTrue(vm_catalog.get_launch().join(10))
+        vm_catalog.refresh_vms_list()
+        self.assertTrue(all(vm_instance.get_state() is VMState.Running
+                            for vm_instance in vm_catalog.get_vms()))
+
+        vm_catalog.stop_all_vms_once()
+        vm_catalog.get_shutdown().join()
+        self.assertEqual(10, len(vm_catalog.get_shutdown().get_forced()))
+        vm_catalog.close()
+
+    def testStopEndsWhenStatesAreUnknown(self):
+        vm_catalog = VMCatalog(SimulatedBackend(2, running=1.0))
+
+        def unreachable(vm_instances):
+            raise VMLabException(c.EXCEPTION_LIBVIRT_002, c.EXCEPTION_LIBVIRT_002_DESC)
+        reporter = Reporter()
+        shutdown = ShutdownExecutor(vm_catalog.get_vms(), reporter, lambda vm_instance: True,
+                                    shutdown_worker=lambda vm_instance: True, running_query=unreachable,
+                                    graceful=["sim-00000", "sim-00001"], timeout=0.1)
+        shutdown.start()
+        shutdown.join()
+        self.assertFalse(shutdown.is_running())
+        self.assertEqual(["sim-00000", "sim-00001"], sorted(shutdown.get_forced()))
+        self.assertTrue(reporter.messages[0].startswith("Cannot check shutdown progress"))
+
+    def testStoppedWhileWaitingCountsAsClean(self):
+        backend = SimulatedBackend(2, running=1.0)
+        vm_catalog = VMCatalog(backend)
+        reporter = Reporter()
+        # Without a running query the VMs are checked only when forced
+        shutdown = ShutdownExecutor(vm_catalog.get_vms(), reporter, backend.stop_domain,
+                                    shutdown_worker=lambda vm_instance: True,
+                                    graceful=["sim-00000", "sim-00001"], timeout=0.1)
+        shutdown.start()
+        backend.stop_domain(vm_catalog.get_vm("sim-00000"))
+        shutdown.join()
+        self.assertEqual(["sim-00000"], shutdown.get_clean())
+        self.assertEqual(["sim-00001"], shutdown.get_forced())
+        self.assertEqual("Stop completed, 1 shut down cleanly, 1 forced.", reporter.messages[-1])
+
+    def testFailedStartSkipsDependents(self):
+        backend = SimulatedBackend(2, failure_rate=1.0)
+        vm_catalog = VMCatalog(backend)
+        vm_catalog.get_vm("sim-00000").set_order(1)
+        vm_catalog.get_vm("sim-00001").set_order(2)
+        launch = LaunchEngine(vm_catalog.get_vms(), Reporter())
+        launch.start()
+        self.assertTrue(launch.join(10))
+        self.assertEqual([c.LAUNCH_FAILED, c.LAUNCH_SKIPPED],
+                         [node.get_status() for node in launch.get_nodes()])
+
+if __name__ == "__main__":
+    unittest.main()
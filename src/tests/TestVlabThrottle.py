@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+'''
+This file is part of Virtual Lab Manager.
+
+VM Lab Manager program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Copyright 2012 Harri Savolainen
+
+@author: hsavolai
+@license: GPLv3
+'''
+import unittest
+from virtlab.backend import LoadSample
+from virtlab.throttle import AdaptiveThrottle, ConcurrencyLimit
+
+
+class SampledHost(object):
+
+    def __init__(self):
+        self.samples = []
+
+    def get_host(self):
+        return "kvm1"
+
+    def get_load_sample(self):
+        return self.samples.pop(0)
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.host = SampledHost()
+        self.throttle = AdaptiveThrottle([self.host], 4, maximum=8)
+        self.host.samples.append(LoadSample(0, 0))
+        self.throttle.sample()
+
+    def testAdditiveIncreaseWhileSlotsAreShort(self):
+        self.host.samples.append(LoadSample(10, 100))
+        self.assertEqual(5, self.throttle.evaluate(4, 10)[0])
+        # Slots are free, more would not help
+        self.host.samples.append(LoadSample(20, 200))
+        self.assertEqual(5, self.throttle.evaluate(3, 3)[0])
+
+    def testIncreaseWithFewerWaitingThanSlots(self):
+        # One VM waits while all four slots are busy
+        self.host.samples.append(LoadSample(10, 100))
+        self.assertEqual(5, self.throttle.evaluate(4, 1)[0])
+        self.host.samples.append(LoadSample(20, 200))
+        self.assertEqual(5, self.throttle.evaluate(5, 0)[0])
+
+    def testMultiplicativeDecreaseOnIowait(self):
+        self.host.samples.append(LoadSample(50, 100))
+        limit, reason, rate = self.throttle.evaluate(4, 10)
+        self.assertEqual(2, limit)
+        self.assertEqual("iowait 50% on kvm1", reason)
+        # The VMs started before the decrease are still booting
+        self.host.samples.append(LoadSample(100, 200))
+        self.assertEqual(2, self.throttle.evaluate(4, 10)[0])
+        self.host.samples.append(LoadSample(150, 300))
+        self.assertEqual(1, self.throttle.evaluate(2, 10)[0])
+        self.host.samples.append(LoadSample(200, 400))
+        self.assertEqual(1, self.throttle.evaluate(1, 10)[0])
+
+    def testBlockLatencyAndLoad(self):
+        self.host.samples.append(LoadSample(0, 100, 1000, 100 * 10 ** 9))
+        self.assertEqual("block I/O 100 ms on kvm1", self.throttle.evaluate(4, 10)[1])
+        self.host.samples.append(LoadSample(0, 200, 1000, 100 * 10 ** 9, load=3.0))
+        self.assertEqual("load 3.0 per CPU on kvm1", self.throttle.evaluate(2, 10)[1])
+
+    def testLimitChangesWhileHeld(self):
+        slots = ConcurrencyLimit(1)
+        self.assertTrue(slots.acquire())
+        slots.set_limit(2)
+        self.assertTrue(slots.acquire())
+        self.assertEqual(2, slots.get_active())
+        slots.release()
+        slots.close()
+        self.assertFalse(slots.acquire())
+
+if __name__ == "__main__":
+    unittest.main()
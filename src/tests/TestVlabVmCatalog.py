@@ -24,8 +24,13 @@ Created on Jun 7, 2012
 '''
 import unittest
 import mox
-from virtlab.virtual import VMLabException, LibVirtDao, VMCatalog, VMInstance
+import libvirt
+from virtlab.auxiliary import VMLabException
+from virtlab.virtual import LibVirtDao, VMCatalog, VMInstance
+from virtlab.virtual import VMChangeSet
 from libvirt import virConnect, virDomain
+from libvirt import VIR_CONNECT_LIST_DOMAINS_ACTIVE, \
+                    VIR_CONNECT_LIST_DOMAINS_INACTIVE
 import virtlab.constant as c
 
 
@@ -35,39 +40,43 @@ class Test(unittest.TestCase):
         self.mocker = mox.Mox()
         self.virConnectMock = self.mocker.CreateMock(virConnect)
         self.virDomainMock = self.mocker.CreateMock(virDomain)
+        self.get_libvirt = LibVirtDao.__dict__["get_libvirt"]
+        self.libvirt_open = libvirt.open
 
     def tearDown(self):
-        pass
+        LibVirtDao.get_libvirt = self.get_libvirt
+        libvirt.open = self.libvirt_open
 
     def setUpMVMock(self):
         static_stub = staticmethod(lambda *args, **kwargs: self.virConnectMock)
         LibVirtDao.get_libvirt = static_stub
 
-    def addRunningVMs(self, vm_name_prefix, amount=1):
-        self.virConnectMock.listDomainsID().AndReturn(range(amount))
+    def addDomains(self, flags, vm_name_prefix, amount):
+        # Both listings come before any per-domain call, the calls of one
+        # domain may come in either order
+        self.virConnectMock.listAllDomains(flags).AndReturn(\
+                                        [self.virDomainMock] * amount)
         for vm_num in range(0, amount):
-            self.virDomainMock.name().AndReturn(vm_name_prefix\
-                                             + "-" + str(vm_num))
-            self.virConnectMock.lookupByID(vm_num).AndReturn(\
-                                                self.virDomainMock)
-
-    def addStoppedVMs(self, vm_name_prefix, amount=1):
+            self.virDomainMock.UUIDString().InAnyOrder(vm_num).AndReturn(\
+                                vm_name_prefix + "-uuid-" + str(vm_num))
+            self.virDomainMock.name().InAnyOrder(vm_num).AndReturn(\
+                                vm_name_prefix + "-" + str(vm_num))
 
-        vm_list = []
-        for vm_num in range(0, amount):
-            vm_list.append(vm_name_prefix + "-" + str(vm_num))
+    def addRunningVMs(self, vm_name_prefix, amount=1):
+        self.addDomains(VIR_CONNECT_LIST_DOMAINS_ACTIVE, vm_name_prefix,
+                        amount)
 
-        self.virConnectMock.listDefinedDomains().AndReturn(vm_list)
+    def addStoppedVMs(self, vm_name_prefix, amount=1):
+        self.addDomains(VIR_CONNECT_LIST_DOMAINS_INACTIVE, vm_name_prefix,
+                        amount)
 
     def throw_ex(self):
         raise RuntimeError()
 
     def testExeptionLibVirtdConnectionNotFound(self):
-        static_stub = staticmethod(lambda *args, **kwargs: self.throw_ex())
-        LibVirtDao.get_libvirt = static_stub
-        vmcatalog = VMCatalog()
+        libvirt.open = lambda *args, **kwargs: self.throw_ex()
         # TODO: Add check exception should include vme_id with correct value
-        self.assertRaises(VMLabException, vmcatalog.get_conn)
+        self.assertRaises(VMLabException, VMCatalog)
 
     def testGetSingleStoppedVmInstance(self):
         # Setup
@@ -80,14 +89,12 @@ class Test(unittest.TestCase):
 
         #Test
         vm_catalog = VMCatalog()
-        vm_catalog.refesh()
         vms = vm_catalog.get_vms()
-        vm1 = vm_catalog.get_vm(run_vm_name + "-0")
         vm2 = vm_catalog.get_vm(stop_vm_name + "-0")
 
         #Assert
         self.assertEqual(1, len(vms))
-        self.assertFalse(vm1)
+        self.assertEqual([stop_vm_name + "-0"], [vm.get_name() for vm in vms])
         self.assertTrue(vm2)
         self.assertEqual(c.STATE_STOPPED, vm2.get_state().get_state_str())
 
@@ -102,14 +109,12 @@ class Test(unittest.TestCase):
 
         #Test
         vm_catalog = VMCatalog()
-        vm_catalog.refesh()
         vms = vm_catalog.get_vms()
         vm1 = vm_catalog.get_vm(run_vm_name + "-0")
-        vm2 = vm_catalog.get_vm(stop_vm_name + "-0")
 
         #Assert
         self.assertEqual(1, len(vms))
-        self.assertFalse(vm2)
+        self.assertEqual([run_vm_name + "-0"], [vm.get_name() for vm in vms])
         self.assertTrue(vm1)
         self.assertEqual(c.STATE_RUNNING, vm1.get_state().get_state_str())
 
@@ -124,7 +129,6 @@ class Test(unittest.TestCase):
 
         # Test
         vm_catalog = VMCatalog()
-        vm_catalog.refesh()
         vms = vm_catalog.get_vms()
         vm1 = vm_catalog.get_vm(stop_vm_name + "-0")
         vm2 = vm_catalog.get_vm(run_vm_name + "-0")
@@ -143,14 +147,17 @@ class Test(unittest.TestCase):
         stop_vm_name = "TEST-VM-STOP"
         self.addRunningVMs(run_vm_name, 1)
         self.addStoppedVMs(stop_vm_name, 1)
+        self.addRunningVMs(run_vm_name, 1)
+        self.addStoppedVMs(stop_vm_name, 1)
         mox.Replay(self.virConnectMock, self.virDomainMock)
 
         #Test
         vm_catalog = VMCatalog()
-        history_changed = vm_catalog.refesh()
+        history_changed = vm_catalog.refresh_vms_list()
 
         #Assert
         self.assertEqual(True, history_changed)
+        vm_catalog.reset_change_notify()
 
         #Setup
         mox.Reset(self.virConnectMock, self.virDomainMock)
@@ -159,7 +166,7 @@ class Test(unittest.TestCase):
         mox.Replay(self.virConnectMock, self.virDomainMock)
 
         #Test
-        history_changed = vm_catalog.refesh()
+        history_changed = vm_catalog.refresh_vms_list()
 
         #Assert
         self.assertEqual(False, history_changed)
@@ -171,14 +178,17 @@ class Test(unittest.TestCase):
         stop_vm_name = "TEST-VM-STOP"
         self.addRunningVMs(run_vm_name, 1)
         self.addStoppedVMs(stop_vm_name, 1)
+        self.addRunningVMs(run_vm_name, 1)
+        self.addStoppedVMs(stop_vm_name, 1)
         mox.Replay(self.virConnectMock, self.virDomainMock)
 
         #Test
         vm_catalog = VMCatalog()
-        history_changed = vm_catalog.refesh()
+        history_changed = vm_catalog.refresh_vms_list()
 
         #Assert
         self.assertEqual(True, history_changed)
+        vm_catalog.reset_change_notify()
 
         #Setup
         mox.Reset(self.virConnectMock, self.virDomainMock)
@@ -187,7 +197,7 @@ class Test(unittest.TestCase):
         mox.Replay(self.virConnectMock, self.virDomainMock)
 
         #Test
-        history_changed = vm_catalog.refesh()
+        history_changed = vm_catalog.refresh_vms_list()
 
         #Assert
         self.assertEqual(True, history_changed)
@@ -204,7 +214,6 @@ class Test(unittest.TestCase):
         #Test
         vm_catalog = VMCatalog()
         assert isinstance(vm_catalog, VMCatalog)
-        vm_catalog.refesh()
 
         vm = vm_catalog.get_vm(run_vm_name + "-0")
         assert isinstance(vm, VMInstance)
@@ -217,7 +226,7 @@ class Test(unittest.TestCase):
         self.addStoppedVMs(stop_vm_name, 0)
         mox.Replay(self.virConnectMock, self.virDomainMock)
 
-        vm_catalog.refesh()
+        vm_catalog.refresh_vms_list()
         vm = vm_catalog.get_vm(run_vm_name + "-0")
         #Assert
         self.assertEqual(desc, vm.get_desc())
@@ -234,7 +243,6 @@ class Test(unittest.TestCase):
         #Test
         vm_catalog = VMCatalog()
         assert isinstance(vm_catalog, VMCatalog)
-        vm_catalog.refesh()
 
         vm = vm_catalog.get_vm(run_vm_name + "-0")
         assert isinstance(vm, VMInstance)
@@ -247,7 +255,7 @@ class Test(unittest.TestCase):
         self.addStoppedVMs(stop_vm_name, 0)
         mox.Replay(self.virConnectMock, self.virDomainMock)
 
-        vm_catalog.refesh()
+        vm_catalog.refresh_vms_list()
         vm = vm_catalog.get_vm(run_vm_name + "-0")
         #Assert
         self.assertEqual(order, vm.get_order())
@@ -256,18 +264,23 @@ class Test(unittest.TestCase):
     def testGetMixedVmInstancesOrderAttached(self):
         self.setUpMVMock()
         # Setup running instance
-        self.virConnectMock.listDomainsID().AndReturn([1])
         run_vm_name = "TEST-VM-RUN"
-        self.virDomainMock.name().AndReturn(run_vm_name)
-        self.virConnectMock.lookupByID(1).AndReturn(self.virDomainMock)
+        self.virConnectMock.listAllDomains(\
+            VIR_CONNECT_LIST_DOMAINS_ACTIVE).AndReturn([self.virDomainMock])
 
         # Setup stopped instance
         stop_vm_name = "TEST-VM-STOP"
-        self.virConnectMock.listDefinedDomains().AndReturn([stop_vm_name])
+        self.virConnectMock.listAllDomains(\
+            VIR_CONNECT_LIST_DOMAINS_INACTIVE).AndReturn([self.virDomainMock])
+
+        # Domains are read after both listings
+        self.virDomainMock.name().InAnyOrder("run").AndReturn(run_vm_name)
+        self.virDomainMock.UUIDString().InAnyOrder("run").AndReturn("uuid-run")
+        self.virDomainMock.name().InAnyOrder("stop").AndReturn(stop_vm_name)
+        self.virDomainMock.UUIDString().InAnyOrder("stop").AndReturn("uuid-stop")
 
         mox.Replay(self.virConnectMock, self.virDomainMock)
         vm_catalog = VMCatalog()
-        vm_catalog.refesh()
         vm_catalog.get_vm(run_vm_name).set_order(1)
         vms = vm_catalog.get_vms()
 
@@ -289,6 +302,101 @@ class Test(unittest.TestCase):
         self.assertEqual(1, vms[0].get_order(), \
                 "VM should have order / " + str(vms[0].get_order()))
 
+    def testBulkSnapshotIsSingleRoundTrip(self):
+        # Setup
+        self.setUpMVMock()
+        run_vm_name = "TEST-VM-RUN"
+        stop_vm_name = "TEST-VM-STOP"
+        self.addRunningVMs(run_vm_name, 3)
+        self.addStoppedVMs(stop_vm_name, 2)
+        mox.Replay(self.virConnectMock, self.virDomainMock)
+
+        #Test
+        vm_catalog = VMCatalog()
+
+        #Assert (no per-VM lookups are recorded, so any would fail)
+        mox.Verify(self.virConnectMock, self.virDomainMock)
+        self.assertEqual(5, len(vm_catalog.get_vms()))
+        vm = vm_catalog.get_vm(run_vm_name + "-2")
+        self.assertEqual(c.STATE_RUNNING, vm.get_state().get_state_str())
+        self.assertEqual(run_vm_name + "-uuid-2", vm.get_uuid())
+        vm = vm_catalog.get_vm(stop_vm_name + "-1")
+        self.assertEqual(c.STATE_STOPPED, vm.get_state().get_state_str())
+
+    def testLookupByNameInstanceAndUuid(self):
+        # Setup
+        self.setUpMVMock()
+        run_vm_name = "TEST-VM-RUN"
+        stop_vm_name = "TEST-VM-STOP"
+        self.addRunningVMs(run_vm_name, 2)
+        self.addStoppedVMs(stop_vm_name, 2)
+        mox.Replay(self.virConnectMock, self.virDomainMock)
+
+        #Test
+        vm_catalog = VMCatalog()
+        vm = vm_catalog.get_vm(stop_vm_name + "-1")
+
+        #Assert
+        mox.Verify(self.virConnectMock, self.virDomainMock)
+        self.assertTrue(vm is vm_catalog.get_vm(vm))
+        self.assertTrue(vm is vm_catalog.get_vm_by_uuid(stop_vm_name\
+                                                            + "-uuid-1"))
+        self.assertEqual(None, vm_catalog.get_vm("TEST-VM-MISSING"))
+        self.assertEqual([run_vm_name + "-0", run_vm_name + "-1",
+                          stop_vm_name + "-0", stop_vm_name + "-1"],
+                         [vm.get_name() for vm in vm_catalog.get_vms()])
+
+    def testChangeSetDrainedOnce(self):
+        # Setup
+        self.setUpMVMock()
+        run_vm_name = "TEST-VM-RUN"
+        stop_vm_name = "TEST-VM-STOP"
+        self.addRunningVMs(run_vm_name, 1)
+        self.addStoppedVMs(stop_vm_name, 1)
+        mox.Replay(self.virConnectMock, self.virDomainMock)
+
+        #Test
+        vm_catalog = VMCatalog()
+        mox.Verify(self.virConnectMock, self.virDomainMock)
+        changes = vm_catalog.drain_changes()
+        vm_catalog.get_vm(run_vm_name + "-0").set_desc("Test")
+        metadata_changes = vm_catalog.drain_changes()
+
+        #Assert
+        self.assertEqual(set([run_vm_name + "-0", stop_vm_name + "-0"]),
+                         changes.get_added())
+        self.assertEqual(set([run_vm_name + "-0"]),
+                         metadata_changes.get_metadata_changed())
+        self.assertTrue(vm_catalog.drain_changes().is_empty())
+
+    def testChangeSetCoalescing(self):
+        changes = VMChangeSet()
+        changes.mark_added("TEST-VM-1")
+        changes.mark_state("TEST-VM-1")
+        changes.mark_removed("TEST-VM-1")
+        self.assertTrue(changes.is_empty())
+
+        changes.mark_removed("TEST-VM-2")
+        changes.mark_added("TEST-VM-2")
+        self.assertEqual(set(), changes.get_removed())
+        self.assertEqual(set(["TEST-VM-2"]), changes.get_state_changed())
+        self.assertEqual(set(["TEST-VM-2"]), changes.get_changed())
+
+    def testHostQualifiedIds(self):
+        vm_catalog = VMCatalog(["qemu:///system", "qemu+ssh://kvm2/system"],
+                               autoload=False)
+        vm_catalog.restore_snapshot([{"name": "TEST-VM"},
+                                     {"name": "TEST-VM@kvm2"}])
+
+        self.assertEqual(["localhost", "kvm2"], vm_catalog.get_hosts())
+        self.assertEqual("TEST-VM@kvm2", vm_catalog.vm_id("kvm2", "TEST-VM"))
+        self.assertEqual(("localhost", "TEST-VM"),
+                         vm_catalog.get_vm("TEST-VM").get_key())
+        self.assertEqual(("kvm2", "TEST-VM"),
+                         vm_catalog.get_vm("TEST-VM@kvm2").get_key())
+        self.assertEqual(("localhost", "TEST-VM@unknown"),
+                         vm_catalog.parse_id("TEST-VM@unknown"))
+
 if __name__ == "__main__":
     #import sys;sys.argv = ['', 'Test.testName']
     unittest.main()
@@ -0,0 +1,164 @@
+'''
+This file is part of Virtual Lab Manager.
+
+VM Lab Manager program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Copyright 2012 Harri Savolainen
+
+@author: hsavolai, epelo
+@license: GPLv3
+
+Host capacity based admission control of launches
+'''
+import threading
+import time
+import virtlab.constant as c
+from virtlab.auxiliary import VMLabException
+
+
+class AdmissionControl(object):
+    '''
+    Decides whether a VM may be started now. On the host of the VM, the
+    configured memory and vCPUs of the running domains, of VMs admitted
+    but not yet seen running and of the VM itself must stay within
+    memory_ratio and cpu_ratio times the host memory and CPUs, and at
+    least min_free KiB of memory must stay free. 0 disables a check, so
+    by default every VM is admitted. Host capacity is read at most every
+    interval seconds, unknown capacity or resources admit the VM.
+    '''
+
+    def __init__(self, memory_ratio=c.ADMISSION_MEMORY_RATIO, cpu_ratio=c.ADMISSION_CPU_RATIO,
+                 min_free=c.ADMISSION_MIN_FREE, interval=c.ADMISSION_INTERVAL):
+        self.__memory_ratio = memory_ratio
+        self.__cpu_ratio = cpu_ratio
+        self.__min_free = min_free
+        self.__interval = interval
+        self.__lock = threading.Lock()
+        self.__capacities = {}
+        self.__resources = {}
+        # VM id -> [host, memory, vcpus, time the start call returned]
+        self.__reservations = {}
+
+    def get_resources(self, vm_instance):
+        '''
+        Configured (memory, vcpus) of the VM, read once
+        '''
+        if vm_instance.get_id() not in self.__resources:
+            try:
+                resources = vm_instance.get_daoref().get_domain_resources(vm_instance)
+            except VMLabException:
+                resources = None
+            self.__resources[vm_instance.get_id()] = resources
+        return self.__resources[vm_instance.get_id()]
+
+    def get_capacity(self, dao):
+        '''
+        HostCapacity of dao, cached for interval seconds. Caller holds
+        the lock.
+        '''
+        host = dao.get_host()
+        read_at, capacity = self.__capacities.get(host, (None, None))
+        now = time.time()
+        if read_at is not None and now - read_at < self.__interval:
+            return capacity
+        try:
+            capacity = dao.get_host_capacity()
+        except VMLabException:
+            capacity = None
+        # VMs started before the read are counted by the host itself
+        for vm_instance_name, (reserved_host, memory, vcpus, started_at) in list(self.__reservations.items()):
+            if reserved_host == host and started_at is not None and started_at <= now:
+                del self.__reservations[vm_instance_name]
+        self.__capacities[host] = (now, capacity)
+        return capacity
+
+    def admit(self, vm_instance):
+        '''
+        Returns None and reserves the resources of vm_instance if it may
+        start, otherwise the reason it has to wait
+        '''
+        with self.__lock:
+            if self.get_capacity(vm_instance.get_daoref()) is None:
+                return None
+        # Only hosts reporting capacity cost a domain lookup
+        resources = self.get_resources(vm_instance)
+        if resources is None:
+            return None
+        memory, vcpus = resources
+        host = vm_instance.get_host()
+        with self.__lock:
+            capacity = self.get_capacity(vm_instance.get_daoref())
+            if capacity is None:
+                return None
+            reservations = [reservation for reservation in self.__reservations.values()
+                            if reservation[0] == host]
+            reserved_memory = sum(reservation[1] for reservation in reservations)
+            reserved_vcpus = sum(reservation[2] for reservation in reservations)
+
+            committed_memory = capacity.committed_memory + reserved_memory + memory
+            if self.__memory_ratio > 0 and committed_memory > capacity.memory * self.__memory_ratio:
+                return "%s would commit %d of %d MiB memory" % (
+                    host, committed_memory // 1024, capacity.memory * self.__memory_ratio // 1024)
+            # Free memory excludes the page cache, only a floor asked for is kept
+            if self.__min_free > 0 and capacity.free_memory - reserved_memory - memory < self.__min_free:
+                return "%s has %d MiB memory free, %d MiB needed and %d MiB kept free" % (
+                    host, max(0, capacity.free_memory - reserved_memory) // 1024, memory // 1024,
+                    self.__min_free // 1024)
+            committed_vcpus = capacity.committed_vcpus + reserved_vcpus + vcpus
+            if self.__cpu_ratio > 0 and committed_vcpus > capacity.cpus * self.__cpu_ratio:
+                return "%s would commit %d vCPUs on %d CPUs" % (host, committed_vcpus, capacity.cpus)
+
+            self.__reservations[vm_instance.get_id()] = [host, memory, vcpus, None]
+            return None
+
+    def exceeds_host(self, vm_instance):
+        '''
+        Returns why vm_instance could not start on its host even with no
+        other domain running, None if it could or that is not known
+        '''
+        resources = self.get_resources(vm_instance)
+        if resources is None:
+            return None
+        memory, vcpus = resources
+        host = vm_instance.get_host()
+        with self.__lock:
+            capacity = self.get_capacity(vm_instance.get_daoref())
+        if capacity is None:
+            return None
+        if self.__memory_ratio > 0 and memory > capacity.memory * self.__memory_ratio:
+            return "%s allows %d MiB memory, %d MiB configured" % (
+                host, capacity.memory * self.__memory_ratio // 1024, memory // 1024)
+        if self.__min_free > 0 and memory > capacity.memory - self.__min_free:
+            return "%s has %d MiB memory and keeps %d MiB free, %d MiB configured" % (
+                host, capacity.memory // 1024, self.__min_free // 1024, memory // 1024)
+        if self.__cpu_ratio > 0 and vcpus > capacity.cpus * self.__cpu_ratio:
+            return "%s allows %d vCPUs, %d configured" % (host, capacity.cpus * self.__cpu_ratio, vcpus)
+        return None
+
+    def started(self, vm_instance):
+        '''
+        The start call of an admitted VM returned, its reservation ends
+        with the next capacity read
+        '''
+        with self.__lock:
+            reservation = self.__reservations.get(vm_instance.get_id())
+            if reservation is not None:
+                reservation[3] = time.time()
+
+    def release(self, vm_instance):
+        '''
+        An admitted VM did not start
+        '''
+        with self.__lock:
+            self.__reservations.pop(vm_instance.get_id(), None)
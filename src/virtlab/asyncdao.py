@@ -0,0 +1,239 @@
+'''
+This file is part of Virtual Lab Manager.
+
+VM Lab Manager program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Copyright 2012 Harri Savolainen
+
+@author: hsavolai, epelo
+@license: GPLv3
+
+Non-blocking access to a hypervisor. Blocking libvirt calls run on a
+bounded pool and return futures, so many RPCs can be in flight at once.
+'''
+import threading
+import time
+import Queue
+import virtlab.constant as c
+from virtlab.executor import TaskPool
+from virtlab.events import VMStateTracker
+
+
+class Future(object):
+    '''
+    Result of an operation running on another thread
+    '''
+
+    def __init__(self):
+        self.__condition = threading.Condition()
+        self.__done = False
+        self.__result = None
+        self.__exception = None
+        self.__callbacks = []
+
+    def done(self):
+        return self.__done
+
+    def result(self, timeout=None):
+        '''
+        Wait for the operation, raises its exception if it failed.
+        Raises RuntimeError if timeout seconds pass first.
+        '''
+        self.wait(timeout)
+        if self.__exception is not None:
+            raise self.__exception
+        return self.__result
+
+    def exception(self, timeout=None):
+        self.wait(timeout)
+        return self.__exception
+
+    def wait(self, timeout=None):
+        deadline = time.time() + timeout if timeout is not None else None
+        with self.__condition:
+            while not self.__done:
+                remaining = deadline - time.time() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    raise RuntimeError("Operation did not complete in time")
+                self.__condition.wait(remaining)
+
+    def set_result(self, result):
+        self.finish(result, None)
+
+    def set_exception(self, exception):
+        self.finish(None, exception)
+
+    def finish(self, result, exception):
+        with self.__condition:
+            self.__result = result
+            self.__exception = exception
+            self.__done = True
+            callbacks = self.__callbacks
+            self.__callbacks = []
+            self.__condition.notify_all()
+        for callback in callbacks:
+            callback(self)
+
+    def add_done_callback(self, callback):
+        '''
+        callback(future) is called from the thread completing the
+        operation, or at once if it is already complete
+        '''
+        with self.__condition:
+            if not self.__done:
+                self.__callbacks.append(callback)
+                return
+        callback(self)
+
+    def then(self, function):
+        '''
+        Returns a future of function(self) run once this one completes
+        '''
+        chained = Future()
+
+        def run(future):
+            try:
+                chained.set_result(function(future))
+            except Exception as exception:
+                chained.set_exception(exception)
+        self.add_done_callback(run)
+        return chained
+
+
+def completed(result):
+    future = Future()
+    future.set_result(result)
+    return future
+
+
+def when_all(futures):
+    '''
+    Returns a future completing with the list of futures once all of
+    them are complete, failed ones included
+    '''
+    futures = list(futures)
+    combined = Future()
+    pending = [len(futures)]
+    lock = threading.Lock()
+
+    def done(future):
+        with lock:
+            pending[0] -= 1
+            last = pending[0] == 0
+        if last:
+            combined.set_result(futures)
+
+    if len(futures) == 0:
+        combined.set_result(futures)
+    for future in futures:
+        future.add_done_callback(done)
+    return combined
+
+
+class AsyncDao(object):
+    '''
+    Runs the calls of a LibVirtDao on at most max_workers threads.
+    libvirt connections are thread safe, calls on one connection are
+    pipelined by libvirt.
+    '''
+
+    def __init__(self, dao, max_workers=c.ASYNC_WORKERS):
+        self.__dao = dao
+        self.__pool = TaskPool(max_workers, None, "rpc-" + dao.get_host())
+
+    def get_dao(self):
+        return self.__dao
+
+    def submit(self, function, *args):
+        '''
+        Run function(*args) on the pool, returns its future
+        '''
+        future = Future()
+
+        def task():
+            try:
+                future.set_result(function(*args))
+            except Exception as exception:
+                future.set_exception(exception)
+        self.__pool.submit(task)
+        return future
+
+    def start_domain(self, vm_instance):
+        return self.submit(self.__dao.start_domain, vm_instance)
+
+    def stop_domain(self, vm_instance):
+        return self.submit(self.__dao.stop_domain, vm_instance)
+
+    def shutdown_domain(self, vm_instance):
+        return self.submit(self.__dao.shutdown_domain, vm_instance)
+
+    def is_domain_active(self, vm_instance):
+        return self.submit(self.__dao.is_domain_active, vm_instance)
+
+    def get_domain_states(self):
+        return self.submit(self.__dao.get_domain_states)
+
+    def events(self):
+        '''
+        Stream of lifecycle events of the hypervisor
+        '''
+        return EventStream(self.__dao)
+
+    def close(self):
+        '''
+        Finish the calls submitted so far and stop the workers
+        '''
+        self.__pool.close()
+        self.__pool.join()
+
+
+class EventStream(object):
+    '''
+    Lifecycle events as (vm_instance_name, uuid, state) tuples, state
+    None when the event does not tell it. Iterating blocks until the
+    next event, get() takes a timeout.
+    '''
+
+    def __init__(self, dao):
+        self.__events = Queue.Queue()
+        self.__tracker = VMStateTracker(dao)
+        self.__active = self.__tracker.start(self.put)
+
+    def is_active(self):
+        '''
+        False if the connection does not deliver events
+        '''
+        return self.__active
+
+    def put(self, vm_instance_name, uuid, state):
+        self.__events.put((vm_instance_name, uuid, state))
+
+    def get(self, timeout=None):
+        '''
+        Next event, None if there is none in timeout seconds
+        '''
+        try:
+            return self.__events.get(True, timeout)
+        except Queue.Empty:
+            return None
+
+    def close(self):
+        self.__tracker.stop()
+        self.__active = False
+
+    def __iter__(self):
+        while self.__active:
+            event = self.get(c.POLL_INTERVAL)
+            if event is not None:
+                yield event
@@ -21,6 +21,8 @@ Copyright 2012 Harri Savolainen
 
 Auxiliary classes for Virtual Lab Manager
 '''
+import time
+from collections import OrderedDict
 
 
 class VMLabException(Exception):
@@ -30,3 +32,23 @@ class VMLabException(Exception):
         self.vme_id = vme_id
         self.msg = msg
 
+
+
+class Stopwatch(object):
+    '''
+    Records elapsed time of named milestones since creation
+    '''
+
+    def __init__(self):
+        self.__start = time.time()
+        self.__laps = OrderedDict()
+
+    def lap(self, name):
+        self.__laps[name] = time.time() - self.__start
+        return self.__laps[name]
+
+    def get_laps(self):
+        return self.__laps
+
+    def __str__(self):
+        return ", ".join("%s %.2f s" % (name, elapsed) for name, elapsed in self.__laps.items())
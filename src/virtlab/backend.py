@@ -0,0 +1,179 @@
+'''
+This file is part of Virtual Lab Manager.
+
+VM Lab Manager program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Copyright 2012 Harri Savolainen
+
+@author: hsavolai, epelo
+@license: GPLv3
+
+Hypervisor backend interface
+'''
+
+
+class HypervisorBackend(object):
+    '''
+    One hypervisor as seen by the catalog, the launch engine and the
+    stop executor. LibVirtDao talks to libvirtd, SimulatedBackend keeps
+    domains in memory.
+    Calls fail with VMLabException(EXCEPTION_LIBVIRT_002) while the
+    hypervisor is not reachable.
+    '''
+
+    def get_hook(self):
+        '''
+        URI of the hypervisor
+        '''
+        raise NotImplementedError()
+
+    def get_host(self):
+        '''
+        Short host name used in catalog ids
+        '''
+        raise NotImplementedError()
+
+    def is_connected(self):
+        return True
+
+    def add_connection_listener(self, listener):
+        '''
+        listener(backend, connected) is called when the connection is
+        lost and when it is back
+        '''
+        pass
+
+    def remove_connection_listener(self, listener):
+        pass
+
+    # Enumeration and state
+
+    def get_domain_list(self):
+        return list(self.get_domain_states().keys())
+
+    def get_domain_states(self):
+        '''
+        Bulk snapshot, OrderedDict of domain name -> (uuid, VMState)
+        '''
+        raise NotImplementedError()
+
+    def update_domain_state(self, vm_instance):
+        '''
+        Query the state of one domain into vm_instance
+        '''
+        raise NotImplementedError()
+
+    def is_domain_active(self, vm_instance):
+        raise NotImplementedError()
+
+    # Operations, return True on success
+
+    def start_domain(self, vm_instance):
+        raise NotImplementedError()
+
+    def shutdown_domain(self, vm_instance):
+        '''
+        Request guest shutdown, does not wait for the guest to power off
+        '''
+        raise NotImplementedError()
+
+    def stop_domain(self, vm_instance):
+        raise NotImplementedError()
+
+    # Guest details used by readiness probes
+
+    def get_domain_addresses(self, vm_instance):
+        return []
+
+    def ping_guest_agent(self, vm_instance):
+        return False
+
+    def get_console_log_path(self, vm_instance):
+        return None
+
+    # Capacity used by launch admission control
+
+    def get_host_capacity(self):
+        '''
+        HostCapacity of the hypervisor, None if unknown
+        '''
+        return None
+
+    def get_domain_resources(self, vm_instance):
+        '''
+        Configured (memory in KiB, vCPUs) of the domain, None if unknown
+        '''
+        return None
+
+    def get_load_sample(self):
+        '''
+        LoadSample of the host for launch throttling, None if unknown
+        '''
+        return None
+
+    # Events
+
+    def requires_event_loop(self):
+        '''
+        True if lifecycle callbacks need the libvirt event loop
+        '''
+        return False
+
+    def register_lifecycle_callback(self, callback):
+        '''
+        Subscribe callback(conn, domain, event, detail, opaque) to domain
+        lifecycle events, event is a libvirt VIR_DOMAIN_EVENT_* value and
+        domain has name() and UUIDString(). Returns a callback id, -1 if
+        events are not supported.
+        '''
+        return -1
+
+    def deregister_lifecycle_callback(self, callback_id):
+        pass
+
+    def vm_build(self, vm_instance_name=None, vm_id=None):
+        '''
+        New VMInstance of a domain of this hypervisor
+        '''
+        raise NotImplementedError()
+
+
+class HostCapacity(object):
+    '''
+    Memory (KiB) and CPUs of a host, and what its running domains are
+    configured with
+    '''
+
+    def __init__(self, memory, free_memory, cpus, committed_memory, committed_vcpus):
+        self.memory = memory
+        self.free_memory = free_memory
+        self.cpus = cpus
+        self.committed_memory = committed_memory
+        self.committed_vcpus = committed_vcpus
+
+
+class LoadSample(object):
+    '''
+    Cumulative counters of a host, compared between two samples:
+    CPU time spent in iowait and in total, requests and nanoseconds of
+    block I/O of the running domains. load is the 1 minute load
+    average per CPU, None if not known.
+    '''
+
+    def __init__(self, iowait, cpu_total, io_requests=0, io_time=0, load=None):
+        self.iowait = iowait
+        self.cpu_total = cpu_total
+        self.io_requests = io_requests
+        self.io_time = io_time
+        self.load = load
@@ -0,0 +1,94 @@
+'''
+This file is part of Virtual Lab Manager.
+
+VM Lab Manager program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Copyright 2012 Harri Savolainen
+
+@author: hsavolai, epelo
+@license: GPLv3
+
+Local snapshot cache of the VM catalog for warm starts
+'''
+import json
+import os
+import re
+import virtlab.constant as c
+
+
+def cache_dir():
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, c.CACHE_DIR_NAME)
+
+
+class CatalogCache(object):
+    '''
+    Last known domains, states and metadata of one hypervisor URI,
+    or of a list of them, stored as JSON
+    '''
+
+    def __init__(self, hook=c.LIBVIRT_URI, path=None):
+        if path is None:
+            if not isinstance(hook, basestring):
+                hook = "+".join(hook)
+            path = os.path.join(cache_dir(), "catalog-" + re.sub(r"[^A-Za-z0-9]+", "_", hook).strip("_") + ".json")
+        self.__path = path
+
+    def get_path(self):
+        return self.__path
+
+    def load(self):
+        '''
+        Returns list of VM records, empty if there is no usable cache
+        '''
+        try:
+            cache_file = open(self.__path, "r")
+            try:
+                snapshot = json.load(cache_file)
+            finally:
+                cache_file.close()
+        except (IOError, ValueError):
+            return []
+        if not isinstance(snapshot, dict) or snapshot.get("version") != c.CACHE_VERSION:
+            return []
+        return snapshot.get("vms", [])
+
+    def save(self, vm_instances):
+        records = []
+        for vm_instance in vm_instances:
+            records.append({"name": vm_instance.get_id(),
+                            "host": vm_instance.get_host(),
+                            "uuid": vm_instance.get_uuid(),
+                            "state": str(vm_instance.get_state()),
+                            "order": vm_instance.get_order(),
+                            "delay": vm_instance.get_delay(),
+                            "desc": vm_instance.get_desc(),
+                            "depends": vm_instance.get_depends(),
+                            "probe": vm_instance.get_probe(),
+                            "stop_mode": vm_instance.get_stop_mode()})
+        directory = os.path.dirname(self.__path)
+        try:
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            # Write and rename so a crash never leaves half a cache behind
+            temp_path = self.__path + ".tmp"
+            cache_file = open(temp_path, "w")
+            try:
+                json.dump({"version": c.CACHE_VERSION, "vms": records}, cache_file)
+            finally:
+                cache_file.close()
+            os.rename(temp_path, self.__path)
+        except (IOError, OSError):
+            return False
+        return True
@@ -26,18 +26,147 @@ Created on Jun 7, 2012
 
 EXCEPTION_LIBVIRT_001 = "LIBVIRT-001"
 EXCEPTION_LIBVIRT_001_DESC = "Failed to connect libvirtd"
+EXCEPTION_LIBVIRT_002 = "LIBVIRT-002"
+EXCEPTION_LIBVIRT_002_DESC = "Connection to libvirtd lost, reconnecting"
+EXCEPTION_LAUNCH_001 = "LAUNCH-001"
+EXCEPTION_LAUNCH_001_DESC = "Launch dependencies form a cycle"
 STATE_RUNNING = "RUNNING"
 STATE_STOPPED = "STOPPED"
 STATE_GONE = "GONE"
 WINDOW_TITLE = "Virtual Lab Manager"
+LIBVIRT_URI = "qemu:///system"
+HOST_SEPARATOR = "@"
+
+#State refresh intervals (seconds)
+POLL_INTERVAL = 1
+RECONCILE_INTERVAL = 30
+
+#Connection supervision, keepalive probes every KEEPALIVE_INTERVAL seconds
+#and KEEPALIVE_COUNT unanswered probes close the connection. Reconnect
+#delay doubles from RECONNECT_DELAY up to RECONNECT_DELAY_MAX seconds
+KEEPALIVE_INTERVAL = 5
+KEEPALIVE_COUNT = 3
+RECONNECT_DELAY = 1
+RECONNECT_DELAY_MAX = 60
+
+#Concurrent RPCs per hypervisor of the non-blocking DAO
+ASYNC_WORKERS = 16
+
+#Metrics, histogram bucket bounds in seconds, samples kept for quantiles
+#and seconds between metrics file writes
+METRICS_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+METRICS_WINDOW = 1024
+METRICS_INTERVAL = 10
+METRICS_OUTCOME_OK = "ok"
+METRICS_OUTCOME_ERROR = "error"
+METRICS_OUTCOME_DISCONNECTED = "disconnected"
+DIAGNOSTICS_INTERVAL = 2
+
+#VMs added to the view per main loop iteration while loading
+LOAD_CHUNK = 50
+
+#Catalog snapshot cache
+CACHE_DIR_NAME = "vmlab"
+CACHE_VERSION = 1
+CACHE_SAVE_DELAY = 5
 
 #Configuration file keys
 CONFIGFILE_KEY_PROJECT = "Project"
 CONFIGFILE_PROJECT_NAME = "name"
+CONFIGFILE_PROJECT_CONCURRENCY = "concurrency"
+CONFIGFILE_PROJECT_STOP_PARALLELISM = "stop_parallelism"
+CONFIGFILE_PROJECT_STOP_RATE = "stop_rate"
+CONFIGFILE_PROJECT_STOP_MODE = "stop_mode"
+CONFIGFILE_PROJECT_STOP_TIMEOUT = "stop_timeout"
+CONFIGFILE_PROJECT_MEMORY_OVERCOMMIT = "memory_overcommit"
+CONFIGFILE_PROJECT_CPU_OVERCOMMIT = "cpu_overcommit"
+CONFIGFILE_PROJECT_MAX_CONCURRENCY = "max_concurrency"
 CONFIGFILE_KEY_INSTANCES = "VMInstances"
 CONFIGFILE_VM_DELAY = "delay"
 CONFIGFILE_VM_DESC = "desc"
 CONFIGFILE_VM_ORDER = "order"
+CONFIGFILE_VM_DEPENDS = "depends"
+CONFIGFILE_VM_PROBE = "probe"
+CONFIGFILE_VM_STOP_MODE = "stop_mode"
+
+#Launch engine
+LAUNCH_CONCURRENCY = 4
+DEPENDS_ORDER_PREFIX = "order:"
+LAUNCH_PENDING = "PENDING"
+LAUNCH_READY = "READY"
+LAUNCH_STARTING = "STARTING"
+LAUNCH_SETTLING = "SETTLING"
+LAUNCH_PROBING = "PROBING"
+LAUNCH_DONE = "DONE"
+LAUNCH_FAILED = "FAILED"
+LAUNCH_SKIPPED = "SKIPPED"
+LAUNCH_CANCELLED = "CANCELLED"
+LAUNCH_HELD = "HELD"
+
+#Admission control, overcommit ratios of configured memory and vCPUs
+#to host memory and CPUs and free memory floor in KiB, all off unless
+#the project sets them (0 disables),
+#seconds between host capacity reads and between retries of held VMs,
+#seconds a VM may be held before it counts as failed (0 holds it until
+#the launch is cancelled)
+ADMISSION_MEMORY_RATIO = 0
+ADMISSION_CPU_RATIO = 0
+ADMISSION_MIN_FREE = 0
+ADMISSION_INTERVAL = 2
+ADMISSION_RETRY_INTERVAL = 5
+ADMISSION_HOLD_TIMEOUT = 300
+SIMULATOR_DOMAIN_MEMORY = 1024 * 1024
+
+#Adaptive launch concurrency: seconds between host samples, limits,
+#additive increase and multiplicative decrease of the limit, host
+#iowait share, load average per CPU, mean block I/O latency in seconds
+#and boot time over history p50 that count as congestion
+THROTTLE_INTERVAL = 5
+THROTTLE_MIN_CONCURRENCY = 1
+THROTTLE_MAX_CONCURRENCY = 32
+THROTTLE_INCREASE = 1
+THROTTLE_DECREASE = 0.5
+THROTTLE_IOWAIT = 0.25
+THROTTLE_LOAD = 1.5
+THROTTLE_IO_LATENCY = 0.05
+THROTTLE_SLOWDOWN = 1.5
+
+#Launch planner, seconds assumed for a probed VM without boot history
+PLAN_DEFAULT_BOOT = 30
+
+#Boot profiler, transitions recorded besides launch statuses
+BOOT_RUNNING = "running"
+BOOT_READY = "ready"
+BOOT_HISTORY_LENGTH = 50
+BOOT_HISTORY_VERSION = 1
+
+#UI dispatch queue, milliseconds between drains and calls per drain
+UI_DISPATCH_INTERVAL = 100
+UI_DISPATCH_BATCH = 50
+
+#Launch log, lines kept in the view and rotation of the optional file
+LAUNCH_LOG_LINES = 5000
+LAUNCH_LOG_MAX_BYTES = 1024 * 1024
+LAUNCH_LOG_BACKUPS = 3
 
 #File params 
 SAVE_FILE_SUFFIX=".lab"
+
+#Shutdown executor, rate is VMs per second and 0 is unlimited
+STOP_PARALLELISM = 8
+STOP_RATE = 0
+STOP_MODE_DESTROY = "destroy"
+STOP_MODE_GRACEFUL = "graceful"
+STOP_TIMEOUT = 120
+STOP_POLL_INTERVAL = 2
+
+#Readiness probes
+PROBE_RUNNING = "running"
+PROBE_TCP = "tcp"
+PROBE_AGENT = "agent"
+PROBE_CONSOLE = "console"
+PROBE_INTERVAL = 2
+PROBE_TIMEOUT = 300
+PROBE_CONNECT_TIMEOUT = 2
+PROBE_AGENT_TIMEOUT = 2
+PROBE_CONSOLE_TAIL = 256
@@ -0,0 +1,91 @@
+'''
+This file is part of Virtual Lab Manager.
+
+VM Lab Manager program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Copyright 2012 Harri Savolainen
+
+@author: hsavolai, epelo
+@license: GPLv3
+
+Queue of calls from worker threads to the UI main loop
+'''
+import logging
+import threading
+from collections import deque, OrderedDict
+import virtlab.constant as c
+
+
+class UIDispatcher(object):
+    '''
+    Worker threads queue calls with call() and coalesce(), the main loop
+    runs them in drain(). Drains are scheduled with
+    schedule(interval_ms, function), e.g. gobject.timeout_add, at most
+    every interval milliseconds and run at most batch queued calls
+    each. Coalesced calls run once per drain after the queued calls
+    with the latest arguments given for their key, e.g. one redraw
+    for any number of queued state changes. A call that raises is
+    logged and the drain goes on with the next one.
+    '''
+
+    def __init__(self, schedule, interval=c.UI_DISPATCH_INTERVAL, batch=c.UI_DISPATCH_BATCH):
+        self.__schedule = schedule
+        self.__interval = interval
+        self.__batch = batch
+        self.__lock = threading.Lock()
+        self.__calls = deque()
+        self.__coalesced = OrderedDict()
+        self.__scheduled = False
+
+    def call(self, function, *args):
+        with self.__lock:
+            self.__calls.append((function, args))
+            self.wakeup()
+
+    def coalesce(self, key, function, *args):
+        with self.__lock:
+            self.__coalesced.pop(key, None)
+            self.__coalesced[key] = (function, args)
+            self.wakeup()
+
+    def wakeup(self):
+        # Caller holds the lock
+        if not self.__scheduled:
+            self.__scheduled = True
+            self.__schedule(self.__interval, self.drain)
+
+    def get_pending(self):
+        with self.__lock:
+            return len(self.__calls) + len(self.__coalesced)
+
+    def drain(self):
+        '''
+        Run queued calls in the main loop. Returns True while calls are
+        left, so a timeout source keeps draining at the bounded rate.
+        '''
+        with self.__lock:
+            calls = [self.__calls.popleft() for num in range(min(self.__batch, len(self.__calls)))]
+            calls.extend(self.__coalesced.values())
+            self.__coalesced.clear()
+        for function, args in calls:
+            # One failing call must not drop the rest of the batch
+            try:
+                function(*args)
+            except Exception:
+                logging.getLogger("vmlab").exception("UI call %s failed", getattr(function, "__name__", function))
+        with self.__lock:
+            if len(self.__calls) == 0 and len(self.__coalesced) == 0:
+                self.__scheduled = False
+                return False
+            return True
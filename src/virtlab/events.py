@@ -0,0 +1,113 @@
+'''
+This file is part of Virtual Lab Manager.
+
+VM Lab Manager program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Copyright 2012 Harri Savolainen
+
+@author: hsavolai, epelo
+@license: GPLv3
+
+Event driven VM state tracking for Virtual Lab Manager
+'''
+import threading
+import libvirt
+from libvirt import libvirtError
+from virtlab.vm import VMState, LibVirtDao
+from virtlab.auxiliary import VMLabException
+
+
+class VMStateTracker(object):
+    '''
+    Follows libvirt domain lifecycle events and passes them to a listener
+    as listener(vm_instance_name, uuid, state). State is None when the
+    event alone does not tell the resulting state.
+    The listener is called from the libvirt event loop thread.
+    '''
+
+    EVENT_STATES = {
+        libvirt.VIR_DOMAIN_EVENT_DEFINED: None,
+        libvirt.VIR_DOMAIN_EVENT_UNDEFINED: VMState.Gone,
+        libvirt.VIR_DOMAIN_EVENT_STARTED: VMState.Running,
+        libvirt.VIR_DOMAIN_EVENT_RESUMED: VMState.Running,
+        libvirt.VIR_DOMAIN_EVENT_STOPPED: VMState.Stopped,
+        libvirt.VIR_DOMAIN_EVENT_CRASHED: None,
+    }
+
+    __event_loop = None
+
+    def __init__(self, daoref):
+        self.__daoref = daoref
+        self.__listener = None
+        self.__callback_id = None
+
+    @classmethod
+    def register_event_loop(cls):
+        '''
+        Register and run the default libvirt event loop in a daemon thread.
+        Must be called before the libvirt connection is opened.
+        Returns True if the event loop is running
+        '''
+        if cls.__event_loop is None:
+            try:
+                libvirt.virEventRegisterDefaultImpl()
+            except (AttributeError, libvirtError):
+                return False
+            cls.__event_loop = threading.Thread(target=cls.run_event_loop,
+                                                name="libvirt-events")
+            cls.__event_loop.setDaemon(True)
+            cls.__event_loop.start()
+            LibVirtDao.event_loop = True
+        return True
+
+    @staticmethod
+    def run_event_loop():
+        while True:
+            libvirt.virEventRunDefaultImpl()
+
+    def get_daoref(self):
+        return self.__daoref
+
+    def start(self, listener):
+        '''
+        Subscribe to lifecycle events.
+        Returns False if the hypervisor connection does not deliver events
+        '''
+        if self.__event_loop is None and self.__daoref.requires_event_loop():
+            return False
+        self.__listener = listener
+        try:
+            self.__callback_id = self.__daoref.register_lifecycle_callback(
+                                                        self.lifecycle_event)
+        except (AttributeError, libvirtError, VMLabException):
+            self.__callback_id = None
+        return self.is_active()
+
+    def stop(self):
+        if self.is_active():
+            try:
+                self.__daoref.deregister_lifecycle_callback(self.__callback_id)
+            except (libvirtError, VMLabException):
+                pass
+            self.__callback_id = None
+
+    def is_active(self):
+        return self.__callback_id is not None and self.__callback_id >= 0
+
+    # pylint: disable=W0613
+    def lifecycle_event(self, conn, domain, event, detail, opaque):
+        if event not in self.EVENT_STATES:
+            return
+        self.__listener(domain.name(), domain.UUIDString(),
+                        self.EVENT_STATES[event])
@@ -0,0 +1,298 @@
+'''
+This file is part of Virtual Lab Manager.
+
+VM Lab Manager program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Copyright 2012 Harri Savolainen
+
+@author: hsavolai, epelo
+@license: GPLv3
+
+Bounded worker pools for mass VM operations
+'''
+import threading
+import time
+import Queue
+import virtlab.constant as c
+from virtlab.auxiliary import VMLabException
+
+
+def run_parallel(function, items):
+    '''
+    Run function for every item on a thread of its own and wait for all
+    of them, so the total time is that of the slowest item.
+    Returns list of (item, result, exception) in the order of items
+    '''
+    results = [(item, None, None) for item in items]
+
+    def task(index, item):
+        try:
+            results[index] = (item, function(item), None)
+        except Exception as exception:
+            results[index] = (item, None, exception)
+
+    threads = []
+    for index, item in enumerate(results):
+        thread = threading.Thread(target=task, args=(index, item[0]), name="parallel-%d" % index)
+        thread.setDaemon(True)
+        threads.append(thread)
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+class RateLimiter(object):
+    '''
+    Spaces calls of acquire() to at most rate per second.
+    Rate None or 0 means unlimited.
+    '''
+
+    def __init__(self, rate=None):
+        self.__interval = 1.0 / rate if rate else 0
+        self.__next = 0
+        self.__lock = threading.Lock()
+
+    def acquire(self):
+        if self.__interval == 0:
+            return
+        with self.__lock:
+            now = time.time()
+            wait = self.__next - now
+            self.__next = max(now, self.__next) + self.__interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+class TaskPool(object):
+    '''
+    Runs submitted tasks on at most max_workers daemon threads.
+    Threads are created on demand.
+    '''
+
+    def __init__(self, max_workers, rate=None, name="task"):
+        self.__max_workers = max(1, max_workers)
+        self.__limiter = RateLimiter(rate)
+        self.__name = name
+        self.__tasks = Queue.Queue()
+        self.__workers = []
+        self.__lock = threading.Lock()
+
+    def submit(self, function, *args):
+        with self.__lock:
+            if len(self.__workers) < self.__max_workers:
+                worker = threading.Thread(target=self.work, name="%s-%d" % (self.__name, len(self.__workers)))
+                worker.setDaemon(True)
+                self.__workers.append(worker)
+                worker.start()
+        self.__tasks.put((function, args))
+
+    def close(self):
+        '''
+        Workers exit after the tasks submitted so far
+        '''
+        with self.__lock:
+            for worker in self.__workers:
+                self.__tasks.put(None)
+
+    def join(self):
+        for worker in list(self.__workers):
+            worker.join()
+
+    def map(self, function, items):
+        '''
+        Run function for every item in the pool and wait until all are done
+        '''
+        items = list(items)
+        if len(items) == 0:
+            return
+        finished = threading.Event()
+        pending = [len(items)]
+        lock = threading.Lock()
+
+        def task(item):
+            try:
+                function(item)
+            finally:
+                with lock:
+                    pending[0] -= 1
+                    if pending[0] == 0:
+                        finished.set()
+
+        for item in items:
+            self.submit(task, item)
+        finished.wait()
+
+    def work(self):
+        while True:
+            task = self.__tasks.get()
+            if task is None:
+                return
+            function, args = task
+            self.__limiter.acquire()
+            function(*args)
+
+
+class ShutdownExecutor(object):
+    '''
+    Stops VMs in parallel, at most parallelism at a time and at most rate
+    per second. VMs named in graceful get an ACPI shutdown with
+    shutdown_worker(vm_instance) first. They are waited for until
+    timeout seconds have passed and only the stragglers are destroyed
+    with stop_worker(vm_instance). running_query(vm_instances) returns
+    ids of the VMs still running, without it graceful VMs are waited
+    for until the timeout. A straggler found off by stop_worker, which
+    returns None then, counts as shut down cleanly. Progress and failures are reported
+    per VM to reporter.add_status_dialogbox() and reporter.set_statusbar().
+    '''
+
+    def __init__(self, vm_instances, reporter, stop_worker, parallelism=c.STOP_PARALLELISM, rate=c.STOP_RATE,
+                 shutdown_worker=None, running_query=None, graceful=(), timeout=c.STOP_TIMEOUT):
+        self.__vm_instances = list(vm_instances)
+        self.__reporter = reporter
+        self.__stop_worker = stop_worker
+        self.__shutdown_worker = shutdown_worker
+        self.__running_query = running_query
+        self.__graceful = set(graceful) if shutdown_worker is not None else set()
+        self.__timeout = timeout
+        self.__pool = TaskPool(parallelism, rate, "stop-worker")
+        self.__lock = threading.Lock()
+        self.__thread = None
+        self.__clean = []
+        self.__forced = []
+        self.__failed = []
+        self.__running = False
+
+    def start(self):
+        self.__running = True
+        self.__reporter.set_statusbar("Stopping " + str(len(self.__vm_instances)) + " VMs.")
+        self.__thread = threading.Thread(target=self.run, name="stop-coordinator")
+        self.__thread.setDaemon(True)
+        self.__thread.start()
+
+    def join(self):
+        if self.__thread is not None:
+            self.__thread.join()
+
+    def is_running(self):
+        return self.__running
+
+    def get_stopped(self):
+        return self.__clean + self.__forced
+
+    def get_clean(self):
+        return self.__clean
+
+    def get_forced(self):
+        return self.__forced
+
+    def get_failed(self):
+        return self.__failed
+
+    def run(self):
+        try:
+            self.stop_all()
+        except Exception:
+            self.__reporter.add_status_dialogbox("Stop aborted, " + str(len(self.get_stopped())) + " VMs stopped.")
+            self.__reporter.set_statusbar("Stop aborted.")
+            raise
+        finally:
+            # A stuck flag would make the catalog drop every later stop
+            self.__running = False
+            self.__pool.close()
+
+    def stop_all(self):
+        graceful = [vm_instance for vm_instance in self.__vm_instances if vm_instance.get_id() in self.__graceful]
+        forced = [vm_instance for vm_instance in self.__vm_instances if vm_instance.get_id() not in self.__graceful]
+
+        # ACPI shutdown to all graceful VMs at once, the rest are destroyed
+        self.__pool.map(self.shutdown, graceful)
+        self.__pool.map(self.stop, forced)
+
+        stragglers = self.wait_shutdown([vm_instance for vm_instance in graceful
+                                         if vm_instance.get_id() not in self.__failed])
+        if len(stragglers) > 0:
+            self.__reporter.add_status_dialogbox(str(len(stragglers)) + " VMs did not shut down in " + str(int(self.__timeout)) + " seconds, forcing off.")
+        self.__pool.map(self.stop, stragglers)
+
+        summary = "Stop completed, " + str(len(self.__clean)) + " shut down cleanly, " + str(len(self.__forced)) + " forced"
+        if len(self.__failed) > 0:
+            summary += ", " + str(len(self.__failed)) + " failed"
+        self.__running = False
+        self.__reporter.add_status_dialogbox(summary + ".")
+        self.__reporter.set_statusbar(summary + ".")
+
+    def shutdown(self, vm_instance):
+        try:
+            requested = self.__shutdown_worker(vm_instance) is not False
+        except Exception:
+            requested = False
+        if not requested:
+            self.done(vm_instance, self.__failed, " failed to shut down.")
+
+    def wait_shutdown(self, vm_instances):
+        '''
+        Wait until vm_instances are off or timeout is reached, the last
+        check is made at the timeout. Returns VMs still running.
+        '''
+        deadline = time.time() + self.__timeout
+        pending = vm_instances
+        reported = False
+        while len(pending) > 0:
+            try:
+                running = self.query_running(pending)
+            except VMLabException as exception:
+                # Unknown states count as running until the timeout
+                if not reported:
+                    reported = True
+                    self.__reporter.add_status_dialogbox("Cannot check shutdown progress: " + exception.msg)
+                running = set(vm_instance.get_id() for vm_instance in pending)
+            for vm_instance in pending:
+                if vm_instance.get_id() not in running:
+                    self.done(vm_instance, self.__clean, " shut down cleanly.")
+            pending = [vm_instance for vm_instance in pending if vm_instance.get_id() in running]
+            remaining = deadline - time.time()
+            if len(pending) == 0 or remaining <= 0:
+                break
+            time.sleep(min(c.STOP_POLL_INTERVAL, remaining))
+        return pending
+
+    def query_running(self, vm_instances):
+        if self.__running_query is None:
+            # Unknown states count as running until the timeout
+            return set(vm_instance.get_id() for vm_instance in vm_instances)
+        return self.__running_query(vm_instances)
+
+    def stop(self, vm_instance):
+        try:
+            result = self.__stop_worker(vm_instance)
+        except Exception:
+            result = False
+
+        if result is False:
+            self.done(vm_instance, self.__failed, " failed to stop.")
+        elif vm_instance.get_id() in self.__graceful and result is None:
+            # Went off after the last check, before it was forced
+            self.done(vm_instance, self.__clean, " shut down cleanly.")
+        elif vm_instance.get_id() in self.__graceful:
+            self.done(vm_instance, self.__forced, " forced off.")
+        else:
+            self.done(vm_instance, self.__forced, " stopped.")
+
+    def done(self, vm_instance, result, text):
+        with self.__lock:
+            result.append(vm_instance.get_id())
+            self.__reporter.add_status_dialogbox(vm_instance.get_id() + text)
+            done = len(self.__clean) + len(self.__forced) + len(self.__failed)
+            self.__reporter.set_statusbar("Stopping, " + str(done) + "/" + str(len(self.__vm_instances)) + " done.")
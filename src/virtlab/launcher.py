@@ -0,0 +1,519 @@
+'''
+This file is part of Virtual Lab Manager.
+
+VM Lab Manager program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Copyright 2012 Harri Savolainen
+
+@author: hsavolai, epelo
+@license: GPLv3
+
+Dependency based launch engine for Virtual Lab Manager
+'''
+import threading
+import time
+import Queue
+from collections import OrderedDict
+import virtlab.constant as c
+from virtlab.auxiliary import VMLabException
+from virtlab.probe import parse_probe
+from virtlab.throttle import ConcurrencyLimit
+
+
+def resolve_dependencies(vm_instances, ordered=True, check=True):
+    '''
+    Resolve launch dependencies of vm_instances.
+    Explicit dependencies name another VM by its catalog id or an order group
+    ("order:N"). VMs without explicit dependencies depend on the
+    preceding order group when ordered is True.
+    Dependencies on VMs outside vm_instances are ignored. Cycles raise
+    VMLabException unless check is False.
+    Returns OrderedDict of VM id -> set of VM ids, in launch order
+    '''
+    groups = OrderedDict()
+    for vm_instance in sorted(vm_instances, key=lambda x: x.get_order()):
+        groups.setdefault(vm_instance.get_order(), []).append(vm_instance.get_id())
+    orders = list(groups.keys())
+
+    dependencies = OrderedDict()
+    for order in orders:
+        for vm_instance_name in groups[order]:
+            dependencies[vm_instance_name] = set()
+
+    for vm_instance in vm_instances:
+        depends = dependencies[vm_instance.get_id()]
+        if len(vm_instance.get_depends()) > 0:
+            for depend in vm_instance.get_depends():
+                if depend.startswith(c.DEPENDS_ORDER_PREFIX):
+                    try:
+                        order = int(depend[len(c.DEPENDS_ORDER_PREFIX):])
+                    except ValueError:
+                        continue
+                    depends.update(groups.get(order, []))
+                elif depend in dependencies:
+                    depends.add(depend)
+        elif ordered:
+            position = orders.index(vm_instance.get_order())
+            if position > 0:
+                depends.update(groups[orders[position - 1]])
+        depends.discard(vm_instance.get_id())
+
+    if check:
+        check_cycles(dependencies)
+    return dependencies
+
+
+def check_cycles(dependencies):
+    '''
+    Raises VMLabException if the dependency graph is not acyclic
+    '''
+    waiting = dict((name, len(depends)) for name, depends in dependencies.items())
+    dependents = dict((name, []) for name in dependencies)
+    for name, depends in dependencies.items():
+        for depend in depends:
+            dependents[depend].append(name)
+
+    ready = [name for name in waiting if waiting[name] == 0]
+    resolved = 0
+    while len(ready) > 0:
+        name = ready.pop()
+        resolved += 1
+        for dependent in dependents[name]:
+            waiting[dependent] -= 1
+            if waiting[dependent] == 0:
+                ready.append(dependent)
+
+    if resolved != len(dependencies):
+        raise VMLabException(c.EXCEPTION_LAUNCH_001,
+                             c.EXCEPTION_LAUNCH_001_DESC)
+
+
+class LaunchNode(object):
+
+    def __init__(self, vm_instance, depends):
+        self.__vm_instance = vm_instance
+        self.__depends = set(depends)
+        self.__waiting = set(depends)
+        self.__dependents = []
+        self.__status = c.LAUNCH_PENDING
+        self.__transitions = {}
+
+    def get_vm_instance(self):
+        return self.__vm_instance
+
+    def get_name(self):
+        return self.__vm_instance.get_id()
+
+    def get_depends(self):
+        return self.__depends
+
+    def get_waiting(self):
+        return self.__waiting
+
+    def get_dependents(self):
+        return self.__dependents
+
+    def get_status(self):
+        return self.__status
+
+    def set_status(self, value):
+        self.__status = value
+        self.mark(value)
+
+    def mark(self, transition):
+        '''
+        Timestamp a transition, statuses are marked when set
+        '''
+        self.__transitions[transition] = time.time()
+
+    def get_transitions(self):
+        return dict(self.__transitions)
+
+    def is_finished(self):
+        return self.__status in (c.LAUNCH_DONE, c.LAUNCH_FAILED,
+                                 c.LAUNCH_SKIPPED, c.LAUNCH_CANCELLED)
+
+    name = property(get_name, None, None, "Virtual machine catalog id")
+    status = property(get_status, set_status, None, "Launch status")
+
+
+class LaunchEngine(object):
+    '''
+    Starts VMs once their dependencies are up. Independent VMs are
+    started in parallel by at most concurrency workers. A VM with a
+    readiness probe lets its dependents start as soon as the probe
+    passes, its delay is then only the timeout. Without a probe the delay
+    is kept as settle time before its dependents may start.
+    Progress is reported to reporter.add_status_dialogbox() and
+    reporter.set_statusbar(). The transitions of every VM are recorded
+    to profiler, if given, when the launch ends. With admission
+    (AdmissionControl) VMs the host has no capacity for are held and
+    retried every ADMISSION_RETRY_INTERVAL seconds and when a start fails.
+    A VM held for hold_timeout seconds, or larger than its host, fails.
+    With throttle (AdaptiveThrottle) the number of VMs starting or
+    probing at once follows the load of the hosts instead of concurrency.
+    '''
+
+    def __init__(self, vm_instances, reporter, concurrency=c.LAUNCH_CONCURRENCY, zero_delay=False,
+                 profiler=None, admission=None, throttle=None, hold_timeout=c.ADMISSION_HOLD_TIMEOUT):
+        self.__reporter = reporter
+        self.__profiler = profiler
+        self.__admission = admission
+        self.__hold_timeout = hold_timeout
+        self.__held = []
+        self.__held_since = {}
+        self.__held_reported = set()
+        self.__retry = None
+        self.__concurrency = max(1, concurrency)
+        self.__throttle = throttle
+        if throttle is not None:
+            self.__slots = ConcurrencyLimit(throttle.get_limit())
+        else:
+            self.__slots = ConcurrencyLimit(self.__concurrency)
+        self.__zero_delay = zero_delay
+        self.__lock = threading.RLock()
+        self.__ready = Queue.Queue()
+        self.__workers = []
+        self.__timers = []
+        self.__stopped = threading.Event()
+        self.__running = False
+
+        self.__nodes = OrderedDict()
+        vm_instances = dict((vm_instance.get_id(), vm_instance) for vm_instance in vm_instances)
+        dependencies = resolve_dependencies(list(vm_instances.values()), not zero_delay)
+        for name, depends in dependencies.items():
+            self.__nodes[name] = LaunchNode(vm_instances[name], depends)
+        for node in self.__nodes.values():
+            for depend in node.get_depends():
+                self.__nodes[depend].get_dependents().append(node)
+
+    def get_nodes(self):
+        return list(self.__nodes.values())
+
+    def get_node(self, vm_instance_name):
+        return self.__nodes.get(vm_instance_name)
+
+    def get_concurrency(self):
+        return self.__concurrency
+
+    def get_limit(self):
+        '''
+        VMs that may be starting or probing at once now
+        '''
+        return self.__slots.get_limit()
+
+    def is_running(self):
+        return self.__running
+
+    def join(self, timeout=None):
+        '''
+        Wait until the launch is completed or cancelled
+        '''
+        deadline = time.time() + timeout if timeout is not None else None
+        while not self.__stopped.is_set():
+            if deadline is not None and time.time() >= deadline:
+                return False
+            # Short waits keep the caller interruptible
+            self.__stopped.wait(1)
+        for worker in self.__workers:
+            worker.join()
+        return True
+
+    def start(self):
+        with self.__lock:
+            if self.__running:
+                return
+            self.__running = True
+            for node in self.__nodes.values():
+                if len(node.get_waiting()) == 0:
+                    self.enqueue(node)
+                else:
+                    self.report(node.get_name() + " waits for " + ", ".join(sorted(node.get_waiting())) + ".")
+            workers = self.__concurrency
+            if self.__throttle is not None:
+                workers = self.__throttle.get_maximum()
+                regulator = threading.Thread(target=self.regulate, name="launch-throttle")
+                regulator.setDaemon(True)
+                regulator.start()
+                self.report("Starting %d VMs at once, adapting between %d and %d to host load." % (
+                    self.__throttle.get_limit(), self.__throttle.get_minimum(), workers))
+            for num in range(workers):
+                worker = threading.Thread(target=self.work, name="launch-worker-%d" % num)
+                worker.setDaemon(True)
+                self.__workers.append(worker)
+                worker.start()
+            self.__reporter.set_statusbar("Launch in progress.")
+
+    def cancel(self):
+        with self.__lock:
+            if not self.__running:
+                return
+            for timer in self.__timers:
+                timer.cancel()
+            for node in self.__nodes.values():
+                if node.get_status() in (c.LAUNCH_PENDING, c.LAUNCH_READY, c.LAUNCH_SETTLING,
+                                         c.LAUNCH_PROBING, c.LAUNCH_HELD):
+                    node.set_status(c.LAUNCH_CANCELLED)
+            self.finish()
+
+    def enqueue(self, node):
+        node.set_status(c.LAUNCH_READY)
+        self.__ready.put(node)
+
+    def work(self):
+        while True:
+            node = self.__ready.get()
+            if node is None:
+                return
+            with self.__lock:
+                if node.get_status() != c.LAUNCH_READY:
+                    continue
+            if not self.__slots.acquire():
+                return
+            try:
+                self.run(node)
+            finally:
+                self.__slots.release()
+
+    def run(self, node):
+        # Capacity is read outside the lock, the node stays READY
+        reason = self.admit(node)
+        unfit = self.exceeds_host(node) if reason is not None else None
+        with self.__lock:
+            if node.get_status() != c.LAUNCH_READY:
+                if reason is None and self.__admission is not None:
+                    self.__admission.release(node.get_vm_instance())
+                return
+            if unfit is not None:
+                self.report(node.get_name() + " not started, " + unfit + ".")
+                self.fail(node)
+                return
+            if reason is not None:
+                self.hold(node, reason)
+                return
+            node.set_status(c.LAUNCH_STARTING)
+        self.launch(node)
+
+    def admit(self, node):
+        '''
+        Returns None if node may start, else why it is held
+        '''
+        if self.__admission is None:
+            return None
+        try:
+            return self.__admission.admit(node.get_vm_instance())
+        except Exception:
+            return None
+
+    def exceeds_host(self, node):
+        '''
+        Returns why node can never start on its host, else None
+        '''
+        try:
+            return self.__admission.exceeds_host(node.get_vm_instance())
+        except Exception:
+            return None
+
+    def regulate(self):
+        '''
+        Apply the throttle limit every interval while the launch runs
+        '''
+        # The first sample is the baseline of the host counters
+        self.__throttle.sample()
+        while not self.__stopped.wait(self.__throttle.get_interval()):
+            try:
+                limit, reason, rate = self.__throttle.evaluate(
+                    self.__slots.get_active(), self.__slots.get_waiting() + self.__ready.qsize())
+            except Exception:
+                continue
+            previous = self.__slots.get_limit()
+            if limit == previous:
+                continue
+            self.__slots.set_limit(limit)
+            text = "Starting %d VMs at once instead of %d" % (limit, previous)
+            if reason is not None:
+                text += ", " + reason
+            self.report(text + " (%.1f VMs ready per minute)." % rate)
+
+    def hold(self, node, reason):
+        held_since = self.__held_since.setdefault(node.get_name(), time.time())
+        if self.__hold_timeout > 0 and time.time() - held_since >= self.__hold_timeout:
+            self.report(node.get_name() + " not started, held for " + str(int(time.time() - held_since)) +
+                        " seconds, " + reason + ".")
+            self.fail(node)
+            return
+        node.set_status(c.LAUNCH_HELD)
+        self.__held.append(node)
+        if node.get_name() not in self.__held_reported:
+            self.__held_reported.add(node.get_name())
+            self.report(node.get_name() + " held, " + reason + ".")
+        if self.__retry is None:
+            self.__retry = threading.Timer(c.ADMISSION_RETRY_INTERVAL, self.resume_held)
+            self.__retry.setDaemon(True)
+            self.__retry.start()
+
+    def resume_held(self):
+        '''
+        Queue held VMs again, those still without capacity are held anew
+        '''
+        with self.__lock:
+            if self.__retry is not None:
+                self.__retry.cancel()
+                self.__retry = None
+            if not self.__running:
+                return
+            held = self.__held
+            self.__held = []
+            for node in held:
+                if node.get_status() == c.LAUNCH_HELD:
+                    self.enqueue(node)
+
+    def launch(self, node):
+        vm_instance = node.get_vm_instance()
+        probe = parse_probe(vm_instance.get_probe())
+        try:
+            if probe is not None:
+                probe.prepare(vm_instance)
+            started = vm_instance.start() is not False
+        except Exception:
+            started = False
+
+        if not started:
+            self.report(node.get_name() + " failed to start.")
+            if self.__admission is not None:
+                self.__admission.release(vm_instance)
+            self.fail(node)
+            # Capacity reserved for it is free again
+            if len(self.__held) > 0:
+                self.resume_held()
+            return
+
+        if self.__admission is not None:
+            self.__admission.started(vm_instance)
+
+        node.mark(c.BOOT_RUNNING)
+        if probe is None:
+            self.observe_boot(node)
+        self.report(node.get_name() + " started.")
+        delay = vm_instance.get_delay()
+        if probe is not None:
+            with self.__lock:
+                if node.get_status() != c.LAUNCH_STARTING:
+                    return
+                node.set_status(c.LAUNCH_PROBING)
+            # Delay is only the upper bound when the VM has a probe
+            timeout = delay * 60 if delay > 0 else c.PROBE_TIMEOUT
+            if self.wait_ready(node, probe, timeout):
+                node.mark(c.BOOT_READY)
+                self.observe_boot(node)
+                self.report(node.get_name() + " is ready (" + str(probe) + ").")
+            elif node.get_status() == c.LAUNCH_PROBING:
+                self.report(node.get_name() + " not ready in " + str(int(timeout)) + " seconds (" + str(probe) + "), continuing.")
+            self.complete(node)
+            return
+
+        with self.__lock:
+            if node.get_status() != c.LAUNCH_STARTING:
+                return
+            if delay > 0 and not self.__zero_delay and len(node.get_dependents()) > 0:
+                node.set_status(c.LAUNCH_SETTLING)
+                timer = threading.Timer(delay * 60, self.complete, args=(node,))
+                self.__timers.append(timer)
+                timer.start()
+            else:
+                self.complete(node)
+
+    def observe_boot(self, node):
+        if self.__throttle is None:
+            return
+        transitions = node.get_transitions()
+        booted = transitions.get(c.BOOT_READY, transitions.get(c.BOOT_RUNNING))
+        self.__throttle.observe_boot(node.get_name(), booted - transitions[c.LAUNCH_STARTING])
+
+    def wait_ready(self, node, probe, timeout):
+        '''
+        Check probe until it passes, timeout seconds pass or the launch
+        is cancelled. Occupies the worker, so probing VMs count against
+        the concurrency limit.
+        '''
+        deadline = time.time() + timeout
+        while not self.__stopped.is_set():
+            try:
+                if probe.check(node.get_vm_instance()):
+                    return True
+            except Exception:
+                pass
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return False
+            self.__stopped.wait(min(c.PROBE_INTERVAL, remaining))
+        return False
+
+    def complete(self, node):
+        with self.__lock:
+            if node.get_status() not in (c.LAUNCH_STARTING, c.LAUNCH_SETTLING, c.LAUNCH_PROBING):
+                return
+            node.set_status(c.LAUNCH_DONE)
+            for dependent in node.get_dependents():
+                dependent.get_waiting().discard(node.get_name())
+                if len(dependent.get_waiting()) == 0 and dependent.get_status() == c.LAUNCH_PENDING:
+                    self.enqueue(dependent)
+            self.check_finished()
+
+    def fail(self, node):
+        with self.__lock:
+            node.set_status(c.LAUNCH_FAILED)
+            skipped = list(node.get_dependents())
+            while len(skipped) > 0:
+                dependent = skipped.pop()
+                if dependent.get_status() == c.LAUNCH_PENDING:
+                    dependent.set_status(c.LAUNCH_SKIPPED)
+                    self.report(dependent.get_name() + " skipped, " + node.get_name() + " did not start.")
+                    skipped.extend(dependent.get_dependents())
+            self.check_finished()
+
+    def check_finished(self):
+        if not self.__running:
+            return
+        for node in self.__nodes.values():
+            if not node.is_finished():
+                return
+        self.finish()
+        failed = len([node for node in self.__nodes.values() if node.get_status() != c.LAUNCH_DONE])
+        if failed > 0:
+            self.report("Launch completed, " + str(failed) + " VMs not started.")
+        else:
+            self.report("Launch completed.")
+        self.__reporter.set_statusbar("Launch completed.")
+
+    def finish(self):
+        if not self.__running:
+            return
+        self.__running = False
+        self.__stopped.set()
+        self.__slots.close()
+        if self.__retry is not None:
+            self.__retry.cancel()
+        for worker in self.__workers:
+            self.__ready.put(None)
+        if self.__profiler is not None:
+            self.__profiler.record_launch(self.__nodes.values())
+            self.__profiler.save()
+            # Boot times are shown with the VMs, let their rows update
+            for node in self.__nodes.values():
+                if c.LAUNCH_STARTING in node.get_transitions():
+                    node.get_vm_instance().notify_metadata_change()
+
+    def report(self, text):
+        self.__reporter.add_status_dialogbox(text)
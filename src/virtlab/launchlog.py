@@ -0,0 +1,76 @@
+'''
+This file is part of Virtual Lab Manager.
+
+VM Lab Manager program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Copyright 2012 Harri Savolainen
+
+@author: hsavolai, epelo
+@license: GPLv3
+
+Bounded log of launch and stop events, optionally spilled to a
+rotating file
+'''
+import logging
+import threading
+from collections import deque
+from logging.handlers import RotatingFileHandler
+from time import strftime, localtime
+import virtlab.constant as c
+
+
+class LaunchLog(object):
+    '''
+    Keeps the latest capacity lines in memory. With a path every line
+    is also written to a file rotated at max_bytes, keeping backups
+    older files (path.1, path.2, ...).
+    '''
+
+    def __init__(self, capacity=c.LAUNCH_LOG_LINES, path=None,
+                 max_bytes=c.LAUNCH_LOG_MAX_BYTES, backups=c.LAUNCH_LOG_BACKUPS):
+        self.__lines = deque(maxlen=capacity)
+        self.__lock = threading.Lock()
+        self.__handler = None
+        if path is not None:
+            self.__handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups)
+            self.__handler.setFormatter(logging.Formatter("%(message)s"))
+
+    def get_capacity(self):
+        return self.__lines.maxlen
+
+    def append(self, text):
+        '''
+        Timestamps and stores text, returns the stored line
+        '''
+        line = strftime("%d %b %Y %H:%M:%S", localtime()) + " " + text
+        with self.__lock:
+            self.__lines.append(line)
+        if self.__handler is not None:
+            self.__handler.handle(logging.makeLogRecord({"msg": line}))
+        return line
+
+    def get_lines(self):
+        with self.__lock:
+            return list(self.__lines)
+
+    def clear(self):
+        '''
+        Clears the lines in memory, the file is kept
+        '''
+        with self.__lock:
+            self.__lines.clear()
+
+    def close(self):
+        if self.__handler is not None:
+            self.__handler.close()
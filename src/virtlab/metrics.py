@@ -0,0 +1,268 @@
+'''
+This file is part of Virtual Lab Manager.
+
+VM Lab Manager program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Copyright 2012 Harri Savolainen
+
+@author: hsavolai, epelo
+@license: GPLv3
+
+Timings and counters of hypervisor RPCs and UI work, exported as
+Prometheus text or JSON
+'''
+import json
+import os
+import threading
+import time
+from collections import deque
+import virtlab.constant as c
+
+
+def percentile(values, fraction):
+    '''
+    Nearest rank percentile of values, fraction in 0..1
+    '''
+    if len(values) == 0:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[int(round(fraction * (len(ordered) - 1)))]
+
+
+class Timing(object):
+    '''
+    Count, sum and histogram buckets of durations, quantiles from the
+    latest METRICS_WINDOW samples
+    '''
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.buckets = [0] * len(c.METRICS_BUCKETS)
+        self.recent = deque(maxlen=c.METRICS_WINDOW)
+
+    def observe(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.recent.append(seconds)
+        for index, bound in enumerate(c.METRICS_BUCKETS):
+            if seconds <= bound:
+                self.buckets[index] += 1
+                break
+
+    def copy(self):
+        timing = Timing()
+        timing.count = self.count
+        timing.total = self.total
+        timing.buckets = list(self.buckets)
+        timing.recent = deque(self.recent, maxlen=c.METRICS_WINDOW)
+        return timing
+
+
+class MetricsRegistry(object):
+    '''
+    Timings are kept per family and labels, e.g. family "rpc" with
+    operation, host and outcome labels. Counters likewise.
+    '''
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__timings = {}
+        self.__counters = {}
+
+    def observe(self, family, seconds, **labels):
+        key = (family, tuple(sorted(labels.items())))
+        with self.__lock:
+            timing = self.__timings.get(key)
+            if timing is None:
+                timing = self.__timings[key] = Timing()
+            timing.observe(seconds)
+
+    def increment(self, family, **labels):
+        key = (family, tuple(sorted(labels.items())))
+        with self.__lock:
+            self.__counters[key] = self.__counters.get(key, 0) + 1
+
+    def reset(self):
+        with self.__lock:
+            self.__timings.clear()
+            self.__counters.clear()
+
+    def get_timings(self, family):
+        '''
+        List of (labels dictionary, copy of Timing) of family
+        '''
+        with self.__lock:
+            return [(dict(labels), timing.copy()) for (timing_family, labels), timing
+                    in sorted(self.__timings.items()) if timing_family == family]
+
+    def get_counters(self, family):
+        with self.__lock:
+            return [(dict(labels), value) for (counter_family, labels), value
+                    in sorted(self.__counters.items()) if counter_family == family]
+
+    def summary(self):
+        '''
+        RPC statistics per host: calls, errors, error rate, RPCs per
+        refresh, p50 and p99, plus per operation rows of RPCs and UI work
+        '''
+        hosts = {}
+        for labels, timing in self.get_timings("rpc"):
+            host = hosts.setdefault(labels["host"], {"rpcs": 0, "errors": 0, "seconds": 0.0,
+                                                     "samples": [], "refreshes": 0})
+            host["rpcs"] += timing.count
+            host["seconds"] += timing.total
+            host["samples"].extend(timing.recent)
+            if labels["outcome"] != c.METRICS_OUTCOME_OK:
+                host["errors"] += timing.count
+        for labels, value in self.get_counters("refresh"):
+            if labels["host"] in hosts:
+                hosts[labels["host"]]["refreshes"] = value
+        for host in hosts.values():
+            samples = host.pop("samples")
+            host["p50"] = percentile(samples, 0.50)
+            host["p99"] = percentile(samples, 0.99)
+            host["error_rate"] = float(host["errors"]) / host["rpcs"] if host["rpcs"] else 0.0
+            host["rpcs_per_refresh"] = float(host["rpcs"]) / host["refreshes"] if host["refreshes"] else 0.0
+
+        def rows(family):
+            result = []
+            for labels, timing in self.get_timings(family):
+                row = dict(labels)
+                row.update({"count": timing.count, "seconds": timing.total,
+                            "p50": percentile(timing.recent, 0.50),
+                            "p99": percentile(timing.recent, 0.99)})
+                result.append(row)
+            return result
+
+        return {"hosts": hosts, "rpc": rows("rpc"), "ui": rows("ui")}
+
+    def to_json(self):
+        return json.dumps(self.summary(), indent=2, sort_keys=True)
+
+    def to_prometheus(self):
+        lines = []
+        for family, help_text in (("rpc", "Hypervisor RPC duration"),
+                                  ("ui", "UI work duration")):
+            name = "vmlab_" + family + "_seconds"
+            lines.append("# HELP " + name + " " + help_text + " in seconds")
+            lines.append("# TYPE " + name + " histogram")
+            for labels, timing in self.get_timings(family):
+                cumulative = 0
+                for bound, count in zip(c.METRICS_BUCKETS, timing.buckets):
+                    cumulative += count
+                    lines.append(name + "_bucket" + format_labels(labels, le=repr(bound)) + " " + str(cumulative))
+                lines.append(name + "_bucket" + format_labels(labels, le="+Inf") + " " + str(timing.count))
+                lines.append(name + "_sum" + format_labels(labels) + " " + repr(timing.total))
+                lines.append(name + "_count" + format_labels(labels) + " " + str(timing.count))
+        lines.append("# HELP vmlab_refresh_total Catalog state collections")
+        lines.append("# TYPE vmlab_refresh_total counter")
+        for labels, value in self.get_counters("refresh"):
+            lines.append("vmlab_refresh_total" + format_labels(labels) + " " + str(value))
+        return "\n".join(lines) + "\n"
+
+
+def format_labels(labels, **extra):
+    items = sorted(labels.items()) + sorted(extra.items())
+    if len(items) == 0:
+        return ""
+    return "{" + ",".join('%s="%s"' % (key, str(value).replace('"', '\\"')) for key, value in items) + "}"
+
+
+REGISTRY = MetricsRegistry()
+
+
+def get_registry():
+    return REGISTRY
+
+
+class TimedBlock(object):
+    '''
+    with-block timing a piece of work into the registry,
+    the outcome label is set from the exception leaving the block
+    '''
+
+    def __init__(self, family, **labels):
+        self.__family = family
+        self.__labels = labels
+        self.__started = None
+
+    def __enter__(self):
+        self.__started = time.time()
+        return self
+
+    def __exit__(self, exception_type, exception, traceback):
+        labels = dict(self.__labels)
+        if self.__family == "rpc":
+            labels["outcome"] = outcome(exception)
+        REGISTRY.observe(self.__family, time.time() - self.__started, **labels)
+        return False
+
+
+def outcome(exception):
+    if exception is None:
+        return c.METRICS_OUTCOME_OK
+    if getattr(exception, "vme_id", None) == c.EXCEPTION_LIBVIRT_002:
+        return c.METRICS_OUTCOME_DISCONNECTED
+    return c.METRICS_OUTCOME_ERROR
+
+
+def write_metrics(path):
+    '''
+    Write the registry to path atomically, JSON for .json files and
+    Prometheus text otherwise
+    '''
+    text = REGISTRY.to_json() if path.endswith(".json") else REGISTRY.to_prometheus()
+    temp_path = path + ".tmp"
+    metrics_file = open(temp_path, "w")
+    try:
+        metrics_file.write(text)
+    finally:
+        metrics_file.close()
+    os.rename(temp_path, path)
+
+
+class MetricsWriter(object):
+    '''
+    Rewrites a metrics file every interval seconds, e.g. for the
+    node exporter textfile collector
+    '''
+
+    def __init__(self, path, interval=c.METRICS_INTERVAL):
+        self.__path = path
+        self.__interval = interval
+        self.__stopped = threading.Event()
+        self.__thread = None
+
+    def start(self):
+        self.__thread = threading.Thread(target=self.run, name="metrics-writer")
+        self.__thread.setDaemon(True)
+        self.__thread.start()
+
+    def run(self):
+        while not self.__stopped.is_set():
+            self.write()
+            self.__stopped.wait(self.__interval)
+
+    def write(self):
+        try:
+            write_metrics(self.__path)
+        except (IOError, OSError):
+            pass
+
+    def stop(self):
+        self.__stopped.set()
+        if self.__thread is not None:
+            self.__thread.join()
+        self.write()
@@ -0,0 +1,235 @@
+'''
+This file is part of Virtual Lab Manager.
+
+VM Lab Manager program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Copyright 2012 Harri Savolainen
+
+@author: hsavolai, epelo
+@license: GPLv3
+
+Launch plans: what the launch engine would do, without starting anything
+'''
+import heapq
+from collections import deque
+import virtlab.constant as c
+from virtlab.auxiliary import VMLabException
+from virtlab.launcher import resolve_dependencies
+
+
+class PlanEntry(object):
+    '''
+    One VM of a plan. Times are predicted seconds from the launch start:
+    start of the VM, ready (probe passed or start call returned) and
+    complete (ready plus settle time, dependents may start).
+    '''
+
+    def __init__(self, vm_instance_name, depends, boot, settle, estimated):
+        self.__name = vm_instance_name
+        self.__stage = 0
+        self.__depends = depends
+        self.__boot = boot
+        self.__settle = settle
+        self.__estimated = estimated
+        self.__start = None
+
+    def get_name(self):
+        return self.__name
+
+    def get_stage(self):
+        return self.__stage
+
+    def set_stage(self, value):
+        self.__stage = value
+
+    def get_depends(self):
+        return self.__depends
+
+    def get_boot(self):
+        return self.__boot
+
+    def get_settle(self):
+        return self.__settle
+
+    def is_estimated(self):
+        '''
+        True if the boot time is a default, not from boot history
+        '''
+        return self.__estimated
+
+    def get_start(self):
+        return self.__start
+
+    def set_start(self, value):
+        self.__start = value
+
+    def get_ready(self):
+        return self.__start + self.__boot
+
+    def get_complete(self):
+        return self.get_ready() + self.__settle
+
+    def as_dict(self):
+        return {"name": self.__name,
+                "stage": self.__stage,
+                "depends": sorted(self.__depends),
+                "start": self.get_start(),
+                "ready": self.get_ready(),
+                "complete": self.get_complete(),
+                "estimated": self.__estimated}
+
+
+class LaunchPlan(object):
+    '''
+    Entries in predicted start order. Stages are the dependency levels,
+    VMs of one stage may run in parallel.
+    '''
+
+    def __init__(self, entries, concurrency):
+        self.__entries = entries
+        self.__concurrency = concurrency
+
+    def get_entries(self):
+        return self.__entries
+
+    def get_concurrency(self):
+        return self.__concurrency
+
+    def get_stages(self):
+        stages = []
+        for entry in self.__entries:
+            while len(stages) <= entry.get_stage():
+                stages.append([])
+            stages[entry.get_stage()].append(entry.get_name())
+        return stages
+
+    def get_duration(self):
+        '''
+        Predicted seconds until the launch is completed
+        '''
+        if len(self.__entries) == 0:
+            return 0.0
+        return max(entry.get_complete() for entry in self.__entries)
+
+    def as_dict(self):
+        return {"concurrency": self.__concurrency,
+                "duration": self.get_duration(),
+                "stages": self.get_stages(),
+                "vms": [entry.as_dict() for entry in self.__entries]}
+
+
+def predict_boot(vm_instance, profiler):
+    '''
+    Returns (seconds a launch worker is busy with the VM, estimated).
+    Boot history p50 if there is any, else PLAN_DEFAULT_BOOT for VMs
+    with a probe and nothing for the others. Capped at the probe timeout.
+    '''
+    stats = profiler.get_stats(vm_instance.get_id()) if profiler is not None else None
+    if stats is not None:
+        boot, estimated = stats[1], False
+    elif len(vm_instance.get_probe()) > 0:
+        boot, estimated = c.PLAN_DEFAULT_BOOT, True
+    else:
+        boot, estimated = 0.0, True
+    if len(vm_instance.get_probe()) > 0:
+        delay = vm_instance.get_delay()
+        boot = min(boot, delay * 60 if delay > 0 else c.PROBE_TIMEOUT)
+    return boot, estimated
+
+
+def plan_launch(vm_instances, concurrency=c.LAUNCH_CONCURRENCY, zero_delay=False, profiler=None):
+    '''
+    Plan a launch of vm_instances the way LaunchEngine runs it:
+    dependencies resolved alike, at most concurrency VMs starting or
+    probing at once, settle delays kept before dependents start.
+    Boot times come from profiler (BootProfiler) when given.
+    Raises VMLabException if dependencies form a cycle.
+    '''
+    concurrency = max(1, concurrency)
+    # The simulation below finds cycles too, VMs in one are never planned
+    dependencies = resolve_dependencies(vm_instances, not zero_delay, check=False)
+    vm_instances = dict((vm_instance.get_id(), vm_instance) for vm_instance in vm_instances)
+    dependents = dict((name, []) for name in dependencies)
+    for name, depends in dependencies.items():
+        for depend in depends:
+            dependents[depend].append(name)
+
+    entries = {}
+    waiting = {}
+    stages = {}
+    ready = deque()
+    for name, depends in dependencies.items():
+        waiting[name] = len(depends)
+        stages[name] = 0
+        if len(depends) == 0:
+            ready.append(name)
+    for name in dependencies:
+        vm_instance = vm_instances[name]
+        boot, estimated = predict_boot(vm_instance, profiler)
+        settle = 0.0
+        delay = vm_instance.get_delay()
+        if len(vm_instance.get_probe()) == 0 and delay > 0 and not zero_delay and len(dependents[name]) > 0:
+            settle = delay * 60
+        entries[name] = PlanEntry(name, dependencies[name], boot, settle, estimated)
+
+    # Event simulation: workers are busy for the boot time, dependents
+    # become ready once everything they wait for is complete
+    order = []
+    events = []
+    sequence = 0
+    idle = concurrency
+    now = 0.0
+    while len(ready) > 0 or len(events) > 0:
+        while idle > 0 and len(ready) > 0:
+            entry = entries[ready.popleft()]
+            entry.set_start(now)
+            entry.set_stage(stages[entry.get_name()])
+            order.append(entry)
+            idle -= 1
+            heapq.heappush(events, (entry.get_ready(), sequence, False, entry.get_name()))
+            heapq.heappush(events, (entry.get_complete(), sequence + 1, True, entry.get_name()))
+            sequence += 2
+        now, num, complete, name = heapq.heappop(events)
+        if not complete:
+            idle += 1
+            continue
+        # Plain dictionaries, this loop runs once per dependency edge
+        stage = stages[name] + 1
+        for dependent in dependents[name]:
+            if stages[dependent] < stage:
+                stages[dependent] = stage
+            waiting[dependent] -= 1
+            if waiting[dependent] == 0:
+                ready.append(dependent)
+    if len(order) != len(dependencies):
+        raise VMLabException(c.EXCEPTION_LAUNCH_001,
+                             c.EXCEPTION_LAUNCH_001_DESC)
+    return LaunchPlan(order, concurrency)
+
+
+def format_plan(plan):
+    '''
+    Plan as a text table
+    '''
+    lines = ["%-5s %-28s %9s %9s %9s  %s" % ("stage", "vm", "start s", "ready s", "done s", "after")]
+    for entry in plan.get_entries():
+        lines.append("%-5d %-28s %9.1f %9.1f%s %9.1f  %s" % (
+            entry.get_stage() + 1, entry.get_name(), entry.get_start(), entry.get_ready(),
+            "*" if entry.is_estimated() else " ", entry.get_complete(),
+            ", ".join(sorted(entry.get_depends()))))
+    lines.append("")
+    lines.append("%d VMs in %d stages, %d at a time, done in about %.1f s." % (
+        len(plan.get_entries()), len(plan.get_stages()), plan.get_concurrency(), plan.get_duration()))
+    lines.append("* no boot history, estimated")
+    return "\n".join(lines)
@@ -0,0 +1,163 @@
+'''
+This file is part of Virtual Lab Manager.
+
+VM Lab Manager program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Copyright 2012 Harri Savolainen
+
+@author: hsavolai, epelo
+@license: GPLv3
+
+Readiness probes for launched VMs
+'''
+import os
+import re
+import socket
+import virtlab.constant as c
+
+
+def parse_probe(spec):
+    '''
+    Build a probe from its project file notation:
+    "running", "tcp:PORT", "tcp:HOST:PORT", "agent" or "console:REGEX".
+    Returns None for an empty or unknown spec
+    '''
+    if spec is None or len(spec) == 0:
+        return None
+    kind, _, argument = spec.partition(":")
+    if kind == c.PROBE_RUNNING:
+        return DomainRunningProbe()
+    if kind == c.PROBE_TCP:
+        host, _, port = argument.rpartition(":")
+        try:
+            return TcpProbe(int(port), host or None)
+        except ValueError:
+            return None
+    if kind == c.PROBE_AGENT:
+        return GuestAgentProbe()
+    if kind == c.PROBE_CONSOLE and len(argument) > 0:
+        try:
+            return ConsoleProbe(argument)
+        except re.error:
+            return None
+    return None
+
+
+class ReadinessProbe(object):
+    '''
+    Probes are checked repeatedly after the domain is started until
+    check() returns True or the launch engine gives up.
+    '''
+
+    def prepare(self, vm_instance):
+        '''
+        Called before the domain is started
+        '''
+        pass
+
+    def check(self, vm_instance):
+        raise NotImplementedError()
+
+    def __str__(self):
+        return self.__class__.__name__
+
+
+class DomainRunningProbe(ReadinessProbe):
+
+    def check(self, vm_instance):
+        return vm_instance.get_daoref().is_domain_active(vm_instance)
+
+    def __str__(self):
+        return "domain running"
+
+
+class TcpProbe(ReadinessProbe):
+    '''
+    Guest accepts TCP connections on port. Without a host the guest
+    addresses are asked from the hypervisor.
+    '''
+
+    def __init__(self, port, host=None):
+        self.__port = port
+        self.__host = host
+
+    def check(self, vm_instance):
+        if self.__host is not None:
+            hosts = [self.__host]
+        else:
+            hosts = vm_instance.get_daoref().get_domain_addresses(vm_instance)
+        for host in hosts:
+            try:
+                connection = socket.create_connection((host, self.__port),
+                                                      c.PROBE_CONNECT_TIMEOUT)
+                connection.close()
+                return True
+            except (socket.error, socket.timeout):
+                pass
+        return False
+
+    def __str__(self):
+        return "tcp port " + str(self.__port)
+
+
+class GuestAgentProbe(ReadinessProbe):
+
+    def check(self, vm_instance):
+        return vm_instance.get_daoref().ping_guest_agent(vm_instance)
+
+    def __str__(self):
+        return "guest agent"
+
+
+class ConsoleProbe(ReadinessProbe):
+    '''
+    Serial console output matches a regular expression. The domain has
+    to log its serial console to a file.
+    '''
+
+    def __init__(self, pattern):
+        self.__pattern = re.compile(pattern)
+        self.__offset = 0
+        self.__tail = ""
+
+    def prepare(self, vm_instance):
+        # Output of previous boots is not looked at
+        path = vm_instance.get_daoref().get_console_log_path(vm_instance)
+        self.__tail = ""
+        try:
+            self.__offset = os.path.getsize(path) if path is not None else 0
+        except OSError:
+            self.__offset = 0
+
+    def check(self, vm_instance):
+        path = vm_instance.get_daoref().get_console_log_path(vm_instance)
+        if path is None:
+            return False
+        try:
+            log = open(path, "r")
+            try:
+                log.seek(self.__offset)
+                text = log.read()
+                self.__offset = log.tell()
+            finally:
+                log.close()
+        except IOError:
+            return False
+        # Keep the end of the previous read so lines split between reads match
+        text = self.__tail + text
+        self.__tail = text[-c.PROBE_CONSOLE_TAIL:]
+        return self.__pattern.search(text) is not None
+
+    def __str__(self):
+        return "console " + self.__pattern.pattern
@@ -0,0 +1,145 @@
+'''
+This file is part of Virtual Lab Manager.
+
+VM Lab Manager program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Copyright 2012 Harri Savolainen
+
+@author: hsavolai, epelo
+@license: GPLv3
+
+Boot time history of VMs, kept next to the snapshot cache
+'''
+import json
+import os
+import re
+import threading
+from collections import deque
+import virtlab.constant as c
+from virtlab.cache import cache_dir
+from virtlab.metrics import percentile
+
+
+class BootProfiler(object):
+    '''
+    Latest BOOT_HISTORY_LENGTH launches of every VM. A launch is stored
+    compactly as [started, running, ready, done, status]: started is the
+    epoch time the start was requested, the others are seconds from it
+    to the start call returning, the readiness probe passing and the
+    launch node completing, None if not reached.
+    '''
+
+    def __init__(self, hook=c.LIBVIRT_URI, path=None):
+        if path is None:
+            if not isinstance(hook, basestring):
+                hook = "+".join(hook)
+            path = os.path.join(cache_dir(), "boot-" + re.sub(r"[^A-Za-z0-9]+", "_", hook).strip("_") + ".json")
+        self.__path = path
+        self.__lock = threading.Lock()
+        self.__history = {}
+
+    def get_path(self):
+        return self.__path
+
+    def record(self, vm_instance_name, transitions, status):
+        '''
+        Add a launch from transitions, a dictionary of LAUNCH_STARTING,
+        BOOT_RUNNING, BOOT_READY and LAUNCH_DONE -> epoch time
+        '''
+        started = transitions.get(c.LAUNCH_STARTING)
+        if started is None:
+            return
+
+        def offset(transition):
+            if transition not in transitions:
+                return None
+            return round(transitions[transition] - started, 3)
+
+        launch = [round(started, 3), offset(c.BOOT_RUNNING), offset(c.BOOT_READY),
+                  offset(c.LAUNCH_DONE), status]
+        with self.__lock:
+            self.__history.setdefault(vm_instance_name, deque(maxlen=c.BOOT_HISTORY_LENGTH)).append(launch)
+
+    def record_launch(self, nodes):
+        for node in nodes:
+            self.record(node.get_name(), node.get_transitions(), node.get_status())
+
+    def get_launches(self, vm_instance_name):
+        with self.__lock:
+            return list(self.__history.get(vm_instance_name, []))
+
+    def get_boot_times(self, vm_instance_name):
+        '''
+        Seconds from start to ready, or to running without a probe, of
+        the successful launches of the VM
+        '''
+        times = []
+        for started, running, ready, done, status in self.get_launches(vm_instance_name):
+            if ready is not None:
+                times.append(ready)
+            elif running is not None and status == c.LAUNCH_DONE:
+                times.append(running)
+        return times
+
+    def get_stats(self, vm_instance_name):
+        '''
+        Returns (launches, p50, p95) of the boot times, None without history
+        '''
+        times = self.get_boot_times(vm_instance_name)
+        if len(times) == 0:
+            return None
+        return len(times), percentile(times, 0.50), percentile(times, 0.95)
+
+    def load(self):
+        try:
+            history_file = open(self.__path, "r")
+            try:
+                history = json.load(history_file)
+            finally:
+                history_file.close()
+        except (IOError, ValueError):
+            return False
+        if not isinstance(history, dict) or history.get("version") != c.BOOT_HISTORY_VERSION:
+            return False
+        with self.__lock:
+            self.__history = dict((vm_instance_name, deque(launches, maxlen=c.BOOT_HISTORY_LENGTH))
+                                  for vm_instance_name, launches in history.get("vms", {}).items())
+        return True
+
+    def save(self):
+        with self.__lock:
+            history = dict((vm_instance_name, list(launches))
+                           for vm_instance_name, launches in self.__history.items())
+        directory = os.path.dirname(self.__path)
+        try:
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+            temp_path = self.__path + ".tmp"
+            history_file = open(temp_path, "w")
+            try:
+                json.dump({"version": c.BOOT_HISTORY_VERSION, "vms": history}, history_file,
+                          separators=(",", ":"))
+            finally:
+                history_file.close()
+            os.rename(temp_path, self.__path)
+        except (IOError, OSError):
+            return False
+        return True
+
+
+def format_boot_stats(stats):
+    if stats is None:
+        return ""
+    launches, p50, p95 = stats
+    return "%.1f / %.1f s" % (p50, p95)
@@ -38,11 +38,22 @@ class ProjectDao(object):
         project = Project()
         project.set_project_file(pfile)
         project.set_project_name(config[c.CONFIGFILE_KEY_PROJECT][c.CONFIGFILE_PROJECT_NAME])
+        project.set_concurrency(int(config[c.CONFIGFILE_KEY_PROJECT].get(c.CONFIGFILE_PROJECT_CONCURRENCY, c.LAUNCH_CONCURRENCY)))
+        project.set_stop_parallelism(int(config[c.CONFIGFILE_KEY_PROJECT].get(c.CONFIGFILE_PROJECT_STOP_PARALLELISM, c.STOP_PARALLELISM)))
+        project.set_stop_rate(float(config[c.CONFIGFILE_KEY_PROJECT].get(c.CONFIGFILE_PROJECT_STOP_RATE, c.STOP_RATE)))
+        project.set_stop_mode(config[c.CONFIGFILE_KEY_PROJECT].get(c.CONFIGFILE_PROJECT_STOP_MODE, c.STOP_MODE_DESTROY))
+        project.set_stop_timeout(float(config[c.CONFIGFILE_KEY_PROJECT].get(c.CONFIGFILE_PROJECT_STOP_TIMEOUT, c.STOP_TIMEOUT)))
+        project.set_memory_overcommit(float(config[c.CONFIGFILE_KEY_PROJECT].get(c.CONFIGFILE_PROJECT_MEMORY_OVERCOMMIT, c.ADMISSION_MEMORY_RATIO)))
+        project.set_cpu_overcommit(float(config[c.CONFIGFILE_KEY_PROJECT].get(c.CONFIGFILE_PROJECT_CPU_OVERCOMMIT, c.ADMISSION_CPU_RATIO)))
+        project.set_max_concurrency(int(config[c.CONFIGFILE_KEY_PROJECT].get(c.CONFIGFILE_PROJECT_MAX_CONCURRENCY, 0)))
         for vm_name in config[c.CONFIGFILE_KEY_INSTANCES]:
             metadata = VMMetadata()
             metadata.set_delay(float(config[c.CONFIGFILE_KEY_INSTANCES][vm_name][c.CONFIGFILE_VM_DELAY]))
             metadata.set_desc(config[c.CONFIGFILE_KEY_INSTANCES][vm_name][c.CONFIGFILE_VM_DESC])
             metadata.set_order(int(config[c.CONFIGFILE_KEY_INSTANCES][vm_name][c.CONFIGFILE_VM_ORDER]))
+            metadata.set_depends(ProjectDao.as_list(config[c.CONFIGFILE_KEY_INSTANCES][vm_name].get(c.CONFIGFILE_VM_DEPENDS, [])))
+            metadata.set_probe(config[c.CONFIGFILE_KEY_INSTANCES][vm_name].get(c.CONFIGFILE_VM_PROBE, ""))
+            metadata.set_stop_mode(config[c.CONFIGFILE_KEY_INSTANCES][vm_name].get(c.CONFIGFILE_VM_STOP_MODE, ""))
             vms_metadata[vm_name] = metadata
         project.set_metadata(vms_metadata)
         return project
@@ -55,6 +66,14 @@ class ProjectDao(object):
         config.filename = pfile
         config[c.CONFIGFILE_KEY_PROJECT] = {}
         config[c.CONFIGFILE_KEY_PROJECT][c.CONFIGFILE_PROJECT_NAME] = project.get_project_name()
+        config[c.CONFIGFILE_KEY_PROJECT][c.CONFIGFILE_PROJECT_CONCURRENCY] = project.get_concurrency()
+        config[c.CONFIGFILE_KEY_PROJECT][c.CONFIGFILE_PROJECT_STOP_PARALLELISM] = project.get_stop_parallelism()
+        config[c.CONFIGFILE_KEY_PROJECT][c.CONFIGFILE_PROJECT_STOP_RATE] = project.get_stop_rate()
+        config[c.CONFIGFILE_KEY_PROJECT][c.CONFIGFILE_PROJECT_STOP_MODE] = project.get_stop_mode()
+        config[c.CONFIGFILE_KEY_PROJECT][c.CONFIGFILE_PROJECT_STOP_TIMEOUT] = project.get_stop_timeout()
+        config[c.CONFIGFILE_KEY_PROJECT][c.CONFIGFILE_PROJECT_MEMORY_OVERCOMMIT] = project.get_memory_overcommit()
+        config[c.CONFIGFILE_KEY_PROJECT][c.CONFIGFILE_PROJECT_CPU_OVERCOMMIT] = project.get_cpu_overcommit()
+        config[c.CONFIGFILE_KEY_PROJECT][c.CONFIGFILE_PROJECT_MAX_CONCURRENCY] = project.get_max_concurrency()
 
         config[c.CONFIGFILE_KEY_INSTANCES] = {}
         for vm_name in project.get_metadata():
@@ -63,10 +82,22 @@ class ProjectDao(object):
             config[c.CONFIGFILE_KEY_INSTANCES][vm_name][c.CONFIGFILE_VM_DESC] = vm_meta.get_desc()
             config[c.CONFIGFILE_KEY_INSTANCES][vm_name][c.CONFIGFILE_VM_DELAY] = vm_meta.get_delay()
             config[c.CONFIGFILE_KEY_INSTANCES][vm_name][c.CONFIGFILE_VM_ORDER] = vm_meta.get_order()
+            config[c.CONFIGFILE_KEY_INSTANCES][vm_name][c.CONFIGFILE_VM_DEPENDS] = vm_meta.get_depends()
+            config[c.CONFIGFILE_KEY_INSTANCES][vm_name][c.CONFIGFILE_VM_PROBE] = vm_meta.get_probe()
+            config[c.CONFIGFILE_KEY_INSTANCES][vm_name][c.CONFIGFILE_VM_STOP_MODE] = vm_meta.get_stop_mode()
 
         config.write()
         project.set_project_file(pfile)
 
+    @staticmethod
+    def as_list(value):
+        '''
+        ConfigObj returns a plain string for single value lists
+        '''
+        if isinstance(value, basestring):
+            return [value] if len(value) > 0 else []
+        return list(value)
+
 
 class Project(object):
 
@@ -78,6 +109,14 @@ class Project(object):
         self.__project_name = ""
         self.__config = {}
         self.__metadata = {}
+        self.__concurrency = c.LAUNCH_CONCURRENCY
+        self.__stop_parallelism = c.STOP_PARALLELISM
+        self.__stop_rate = c.STOP_RATE
+        self.__stop_mode = c.STOP_MODE_DESTROY
+        self.__stop_timeout = c.STOP_TIMEOUT
+        self.__memory_overcommit = c.ADMISSION_MEMORY_RATIO
+        self.__cpu_overcommit = c.ADMISSION_CPU_RATIO
+        self.__max_concurrency = 0
 
     def get_project_file(self):
         return self.__project_file
@@ -91,6 +130,43 @@ class Project(object):
     def get_metadata(self):
         return self.__metadata
 
+    def get_concurrency(self):
+        return self.__concurrency
+
+    def get_stop_parallelism(self):
+        return self.__stop_parallelism
+
+    def get_stop_rate(self):
+        return self.__stop_rate
+
+    def get_stop_mode(self):
+        return self.__stop_mode
+
+    def get_stop_timeout(self):
+        return self.__stop_timeout
+
+    def get_memory_overcommit(self):
+        return self.__memory_overcommit
+
+    def get_cpu_overcommit(self):
+        return self.__cpu_overcommit
+
+    def get_max_concurrency(self):
+        '''
+        Upper bound of the adaptive launch concurrency, launches keep
+        concurrency if it is not above it
+        '''
+        return self.__max_concurrency
+
+    def is_adaptive(self):
+        return self.__max_concurrency > self.__concurrency
+
+    def has_admission(self):
+        '''
+        True if launches hold VMs beyond the overcommit ratios
+        '''
+        return self.__memory_overcommit > 0 or self.__cpu_overcommit > 0
+
     def set_project_file(self, value):
         self.__project_file = value
 
@@ -103,6 +179,30 @@ class Project(object):
     def set_metadata(self, value):
         self.__metadata = value
 
+    def set_concurrency(self, value):
+        self.__concurrency = value
+
+    def set_stop_parallelism(self, value):
+        self.__stop_parallelism = value
+
+    def set_stop_rate(self, value):
+        self.__stop_rate = value
+
+    def set_stop_mode(self, value):
+        self.__stop_mode = value
+
+    def set_stop_timeout(self, value):
+        self.__stop_timeout = value
+
+    def set_memory_overcommit(self, value):
+        self.__memory_overcommit = value
+
+    def set_cpu_overcommit(self, value):
+        self.__cpu_overcommit = value
+
+    def set_max_concurrency(self, value):
+        self.__max_concurrency = value
+
     def del_project_file(self):
         del self.__project_file
 
@@ -0,0 +1,362 @@
+'''
+This file is part of Virtual Lab Manager.
+
+VM Lab Manager program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Copyright 2012 Harri Savolainen
+
+@author: hsavolai, epelo
+@license: GPLv3
+
+In-process simulated hypervisor for tests and load testing without
+libvirtd
+'''
+import random
+import threading
+import time
+import uuid as uuidlib
+from collections import OrderedDict
+import libvirt
+import virtlab.constant as c
+from virtlab.auxiliary import VMLabException
+from virtlab.backend import HypervisorBackend, HostCapacity, LoadSample
+from virtlab.metrics import TimedBlock
+from virtlab.vm import VMInstance, VMState
+
+
+class DomainNotFound(libvirt.libvirtError):
+    '''
+    The libvirt error LibVirtDao lets through for an unknown domain
+    '''
+
+    def get_error_code(self):
+        return libvirt.VIR_ERR_NO_DOMAIN
+
+
+class SimulatedDomain(object):
+    '''
+    Domain of the simulator, also passed to lifecycle callbacks
+    '''
+
+    def __init__(self, name, active=False, memory=c.SIMULATOR_DOMAIN_MEMORY, vcpus=1):
+        self.__name = name
+        self.__memory = memory
+        self.__vcpus = vcpus
+        self.__uuid = str(uuidlib.uuid5(uuidlib.NAMESPACE_DNS, name))
+        self.__active = active
+        self.__ready_at = 0
+        self.__off_at = None
+
+    def name(self):
+        return self.__name
+
+    def UUIDString(self):
+        return self.__uuid
+
+    def get_memory(self):
+        return self.__memory
+
+    def get_vcpus(self):
+        return self.__vcpus
+
+    def is_active(self, now):
+        if self.__off_at is not None and now >= self.__off_at:
+            self.__active = False
+            self.__off_at = None
+        return self.__active
+
+    def is_booted(self, now):
+        return self.is_active(now) and now >= self.__ready_at
+
+    def is_booting(self, now):
+        return self.is_active(now) and now < self.__ready_at
+
+    def power_on(self, ready_at):
+        self.__active = True
+        self.__ready_at = ready_at
+        self.__off_at = None
+
+    def power_off(self, off_at=None):
+        if off_at is None:
+            self.__active = False
+            self.__off_at = None
+        elif self.__off_at is None:
+            self.__off_at = off_at
+
+    def get_off_at(self):
+        return self.__off_at
+
+
+class SimulatedBackend(HypervisorBackend):
+    '''
+    Hypervisor kept in memory. Every call counts as one RPC and takes
+    latency seconds. Guests are ready (agent, addresses) boot_time
+    seconds after start and power off shutdown_time seconds after an
+    ACPI shutdown. Times are numbers or (min, max) ranges. Starts and
+    stops fail with probability failure_rate. With host_memory (KiB)
+    the host reports its capacity, domains take domain_memory KiB.
+    With io_capacity the disk sustains that many booting guests: boot
+    times stretch by booting / io_capacity beyond it and the extra share
+    of booting guests shows as host iowait.
+    '''
+
+    def __init__(self, domains=0, host="simulator", running=0.0, boot_time=0,
+                 shutdown_time=0, failure_rate=0.0, latency=0, seed=None,
+                 host_memory=None, host_cpus=8, domain_memory=c.SIMULATOR_DOMAIN_MEMORY,
+                 io_capacity=None):
+        self.__host = host
+        self.__io_capacity = io_capacity
+        self.__cpu_total = 0.0
+        self.__cpu_iowait = 0.0
+        self.__sampled_at = time.time()
+        self.__host_memory = host_memory
+        self.__host_cpus = host_cpus
+        self.__domain_memory = domain_memory
+        self.__boot_time = boot_time
+        self.__shutdown_time = shutdown_time
+        self.__failure_rate = failure_rate
+        self.__latency = latency
+        self.__random = random.Random(seed)
+        self.__lock = threading.Lock()
+        self.__domains = OrderedDict()
+        self.__callbacks = {}
+        self.__callback_id = 0
+        self.__listeners = []
+        self.__connected = True
+        self.__rpc_counts = {}
+        for num in range(domains):
+            self.add_domain("sim-%05d" % num, self.__random.random() < running)
+
+    def get_hook(self):
+        return "sim://" + self.__host + "/"
+
+    def get_host(self):
+        return self.__host
+
+    def is_connected(self):
+        return self.__connected
+
+    def add_connection_listener(self, listener):
+        self.__listeners.append(listener)
+
+    def remove_connection_listener(self, listener):
+        if listener in self.__listeners:
+            self.__listeners.remove(listener)
+
+    def disconnect(self):
+        '''
+        Simulate a lost connection, calls fail until reconnect()
+        '''
+        self.__connected = False
+        for listener in list(self.__listeners):
+            listener(self, False)
+
+    def reconnect(self):
+        self.__connected = True
+        for listener in list(self.__listeners):
+            listener(self, True)
+
+    def get_rpc_counts(self):
+        '''
+        Dictionary of operation -> number of simulated RPCs
+        '''
+        return dict(self.__rpc_counts)
+
+    def get_rpc_count(self):
+        return sum(self.__rpc_counts.values())
+
+    def reset_rpc_counts(self):
+        self.__rpc_counts = {}
+
+    def rpc(self, operation):
+        with TimedBlock("rpc", operation=operation, host=self.__host):
+            if not self.__connected:
+                raise VMLabException(c.EXCEPTION_LIBVIRT_002,
+                                     c.EXCEPTION_LIBVIRT_002_DESC)
+            with self.__lock:
+                self.__rpc_counts[operation] = self.__rpc_counts.get(operation, 0) + 1
+            latency = self.duration(self.__latency)
+            if latency > 0:
+                time.sleep(latency)
+
+    def duration(self, value):
+        if isinstance(value, tuple):
+            return self.__random.uniform(value[0], value[1])
+        return value
+
+    def fails(self):
+        return self.__failure_rate > 0 and self.__random.random() < self.__failure_rate
+
+    def add_domain(self, name, active=False, memory=None, vcpus=1):
+        domain = SimulatedDomain(name, active, memory or self.__domain_memory, vcpus)
+        with self.__lock:
+            self.__domains[name] = domain
+        self.emit(domain, libvirt.VIR_DOMAIN_EVENT_DEFINED)
+        return domain
+
+    def remove_domain(self, name):
+        with self.__lock:
+            domain = self.__domains.pop(name, None)
+        if domain is not None:
+            self.emit(domain, libvirt.VIR_DOMAIN_EVENT_UNDEFINED)
+
+    def get_domain(self, vm_instance):
+        domain = self.__domains.get(vm_instance.get_name())
+        if domain is None:
+            raise DomainNotFound("Domain not found: " + vm_instance.get_name())
+        return domain
+
+    def get_domain_states(self):
+        # Active and inactive listing, like virConnectListAllDomains twice
+        self.rpc("listAllDomains")
+        self.rpc("listAllDomains")
+        now = time.time()
+        snapshot = OrderedDict()
+        with self.__lock:
+            domains = list(self.__domains.values())
+        for domain in domains:
+            state = VMState.Running if domain.is_active(now) else VMState.Stopped
+            snapshot[domain.name()] = (domain.UUIDString(), state)
+        return snapshot
+
+    def update_domain_state(self, vm_instance):
+        self.rpc("lookupByName")
+        domain = self.__domains.get(vm_instance.get_name())
+        if domain is None:
+            vm_instance.set_state(VMState.Gone)
+        elif domain.is_active(time.time()):
+            vm_instance.set_state(VMState.Running)
+        else:
+            vm_instance.set_state(VMState.Stopped)
+
+    def is_domain_active(self, vm_instance):
+        self.rpc("isActive")
+        domain = self.__domains.get(vm_instance.get_name())
+        return domain is not None and domain.is_active(time.time())
+
+    def start_domain(self, vm_instance):
+        self.rpc("create")
+        domain = self.get_domain(vm_instance)
+        now = time.time()
+        if domain.is_active(now):
+            return None
+        if self.fails():
+            return False
+        boot_time = self.duration(self.__boot_time)
+        if self.__io_capacity is not None:
+            boot_time *= max(1.0, float(self.get_booting(now) + 1) / self.__io_capacity)
+        domain.power_on(now + boot_time)
+        self.emit(domain, libvirt.VIR_DOMAIN_EVENT_STARTED)
+        return True
+
+    def shutdown_domain(self, vm_instance):
+        self.rpc("shutdown")
+        domain = self.get_domain(vm_instance)
+        now = time.time()
+        if not domain.is_active(now):
+            return None
+        if self.fails():
+            return False
+        delay = self.duration(self.__shutdown_time)
+        if delay <= 0:
+            domain.power_off()
+            self.emit(domain, libvirt.VIR_DOMAIN_EVENT_STOPPED)
+        elif domain.get_off_at() is None:
+            domain.power_off(now + delay)
+            if len(self.__callbacks) > 0:
+                timer = threading.Timer(delay, self.emit,
+                                        args=(domain, libvirt.VIR_DOMAIN_EVENT_STOPPED))
+                timer.setDaemon(True)
+                timer.start()
+        return True
+
+    def stop_domain(self, vm_instance):
+        self.rpc("destroy")
+        domain = self.get_domain(vm_instance)
+        if not domain.is_active(time.time()):
+            return None
+        if self.fails():
+            return False
+        domain.power_off()
+        self.emit(domain, libvirt.VIR_DOMAIN_EVENT_STOPPED)
+        return True
+
+    def get_domain_addresses(self, vm_instance):
+        self.rpc("interfaceAddresses")
+        domain = self.__domains.get(vm_instance.get_name())
+        if domain is None or not domain.is_booted(time.time()):
+            return []
+        # Loopback, so TCP probes of a simulated guest need a local listener
+        return ["127.0.0.1"]
+
+    def ping_guest_agent(self, vm_instance):
+        self.rpc("qemuAgentCommand")
+        domain = self.__domains.get(vm_instance.get_name())
+        return domain is not None and domain.is_booted(time.time())
+
+    def get_host_capacity(self):
+        if self.__host_memory is None:
+            return None
+        self.rpc("getInfo")
+        self.rpc("getFreeMemory")
+        self.rpc("getAllDomainStats")
+        now = time.time()
+        with self.__lock:
+            active = [domain for domain in self.__domains.values() if domain.is_active(now)]
+        committed_memory = sum(domain.get_memory() for domain in active)
+        return HostCapacity(self.__host_memory, max(0, self.__host_memory - committed_memory),
+                            self.__host_cpus, committed_memory,
+                            sum(domain.get_vcpus() for domain in active))
+
+    def get_booting(self, now):
+        with self.__lock:
+            return sum(1 for domain in self.__domains.values() if domain.is_booting(now))
+
+    def get_load_sample(self):
+        if self.__io_capacity is None:
+            return None
+        self.rpc("getCPUStats")
+        now = time.time()
+        booting = self.get_booting(now)
+        iowait = max(0.0, 1.0 - float(self.__io_capacity) / booting) if booting > 0 else 0.0
+        with self.__lock:
+            elapsed = now - self.__sampled_at
+            self.__sampled_at = now
+            self.__cpu_total += elapsed
+            self.__cpu_iowait += elapsed * iowait
+            return LoadSample(self.__cpu_iowait, self.__cpu_total)
+
+    def get_domain_resources(self, vm_instance):
+        self.rpc("info")
+        domain = self.__domains.get(vm_instance.get_name())
+        if domain is None:
+            return None
+        return domain.get_memory(), domain.get_vcpus()
+
+    def register_lifecycle_callback(self, callback):
+        with self.__lock:
+            self.__callback_id += 1
+            self.__callbacks[self.__callback_id] = callback
+            return self.__callback_id
+
+    def deregister_lifecycle_callback(self, callback_id):
+        with self.__lock:
+            self.__callbacks.pop(callback_id, None)
+
+    def emit(self, domain, event):
+        for callback in list(self.__callbacks.values()):
+            callback(None, domain, event, 0, None)
+
+    def vm_build(self, vm_instance_name=None, vm_id=None):
+        return VMInstance(vm_instance_name, self, vm_id, self.get_host())
@@ -0,0 +1,221 @@
+'''
+This file is part of Virtual Lab Manager.
+
+VM Lab Manager program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Copyright 2012 Harri Savolainen
+
+@author: hsavolai, epelo
+@license: GPLv3
+
+Launch concurrency adapted to the load of the hypervisor hosts
+'''
+import threading
+import time
+import virtlab.constant as c
+from virtlab.auxiliary import VMLabException
+from virtlab.metrics import percentile
+
+
+class ConcurrencyLimit(object):
+    '''
+    Counting semaphore with a limit that may change while it is held.
+    acquire() waits while limit slots are taken and returns False once
+    the limit is closed.
+    '''
+
+    def __init__(self, limit):
+        self.__limit = limit
+        self.__active = 0
+        self.__waiting = 0
+        self.__closed = False
+        self.__condition = threading.Condition()
+
+    def acquire(self):
+        with self.__condition:
+            self.__waiting += 1
+            try:
+                while self.__active >= self.__limit and not self.__closed:
+                    self.__condition.wait()
+            finally:
+                self.__waiting -= 1
+            if self.__closed:
+                return False
+            self.__active += 1
+            return True
+
+    def release(self):
+        with self.__condition:
+            self.__active -= 1
+            self.__condition.notify()
+
+    def close(self):
+        with self.__condition:
+            self.__closed = True
+            self.__condition.notify_all()
+
+    def get_limit(self):
+        return self.__limit
+
+    def set_limit(self, value):
+        with self.__condition:
+            self.__limit = value
+            self.__condition.notify_all()
+
+    def get_active(self):
+        return self.__active
+
+    def get_waiting(self):
+        return self.__waiting
+
+
+class AdaptiveThrottle(object):
+    '''
+    AIMD control of the launch concurrency, between minimum and maximum
+    starting from initial. The hosts of daos are sampled every interval
+    seconds. A host over the iowait share, load per CPU or mean block
+    I/O latency (seconds) of its domains, or boots taking slowdown times
+    their history p50 in profiler, halve the limit. Otherwise the limit
+    grows by one while VMs wait and every slot is busy.
+    A signal a host does not report is not checked, 0 disables one.
+    '''
+
+    def __init__(self, daos, initial, maximum=c.THROTTLE_MAX_CONCURRENCY,
+                 minimum=c.THROTTLE_MIN_CONCURRENCY, profiler=None, interval=c.THROTTLE_INTERVAL,
+                 iowait=c.THROTTLE_IOWAIT, load=c.THROTTLE_LOAD, io_latency=c.THROTTLE_IO_LATENCY,
+                 slowdown=c.THROTTLE_SLOWDOWN):
+        self.__daos = daos
+        self.__minimum = max(1, minimum)
+        self.__maximum = max(self.__minimum, maximum)
+        self.__limit = min(self.__maximum, max(self.__minimum, initial))
+        self.__profiler = profiler
+        self.__interval = interval
+        self.__thresholds = {"iowait": iowait, "load": load,
+                             "io_latency": io_latency, "slowdown": slowdown}
+        self.__lock = threading.Lock()
+        self.__samples = {}
+        self.__slowdowns = []
+        self.__booted = 0
+        self.__evaluated_at = time.time()
+
+    def get_limit(self):
+        return self.__limit
+
+    def get_minimum(self):
+        return self.__minimum
+
+    def get_maximum(self):
+        return self.__maximum
+
+    def get_interval(self):
+        return self.__interval
+
+    def observe_boot(self, vm_instance_name, seconds):
+        '''
+        A VM of the launch booted in seconds
+        '''
+        stats = self.__profiler.get_stats(vm_instance_name) if self.__profiler is not None else None
+        with self.__lock:
+            self.__booted += 1
+            if stats is not None and stats[1] > 0:
+                self.__slowdowns.append(seconds / stats[1])
+
+    def sample(self):
+        '''
+        Returns signal -> (worst value, host) over the hosts, from their
+        counters since the previous sample
+        '''
+        signals = {}
+
+        def worst(signal, value, host):
+            if signal not in signals or value > signals[signal][0]:
+                signals[signal] = (value, host)
+
+        for dao in self.__daos:
+            try:
+                current = dao.get_load_sample()
+            except VMLabException:
+                continue
+            if current is None:
+                continue
+            host = dao.get_host()
+            if current.load is not None:
+                worst("load", current.load, host)
+            previous = self.__samples.get(host)
+            self.__samples[host] = current
+            if previous is None:
+                continue
+            cpu_total = current.cpu_total - previous.cpu_total
+            if cpu_total > 0:
+                worst("iowait", max(0, current.iowait - previous.iowait) / float(cpu_total), host)
+            # Domains stopping in between take their counters with them
+            io_requests = current.io_requests - previous.io_requests
+            io_time = current.io_time - previous.io_time
+            if io_requests > 0 and io_time >= 0:
+                worst("io_latency", io_time / 1e9 / io_requests, host)
+        return signals
+
+    def congestion(self, signals):
+        '''
+        Description of the first signal over its threshold, None if none is
+        '''
+        for signal in ("iowait", "load", "io_latency", "slowdown"):
+            threshold = self.__thresholds[signal]
+            if signal in signals and threshold > 0 and signals[signal][0] > threshold:
+                return format_signal(signal, *signals[signal])
+        return None
+
+    def evaluate(self, active, demand):
+        '''
+        Adjust the limit, active VMs hold a slot and demand VMs are
+        waiting for a slot or queued. Returns (limit, reason the
+        limit was lowered or None, VMs ready per minute since the last
+        evaluation).
+        '''
+        signals = self.sample()
+        now = time.time()
+        with self.__lock:
+            slowdowns = self.__slowdowns
+            self.__slowdowns = []
+            booted = self.__booted
+            self.__booted = 0
+            elapsed = now - self.__evaluated_at
+            self.__evaluated_at = now
+        if len(slowdowns) > 0:
+            signals["slowdown"] = (percentile(slowdowns, 0.50), None)
+        rate = booted * 60.0 / elapsed if elapsed > 0 else 0.0
+
+        reason = self.congestion(signals)
+        if reason is not None:
+            # VMs started before the last decrease still load the host,
+            # back off again only once they are below the limit
+            if active <= self.__limit:
+                self.__limit = max(self.__minimum, int(self.__limit * c.THROTTLE_DECREASE))
+        elif demand > 0 and active >= self.__limit:
+            self.__limit = min(self.__maximum, self.__limit + c.THROTTLE_INCREASE)
+        return self.__limit, reason, rate
+
+
+def format_signal(signal, value, host=None):
+    if signal == "iowait":
+        text = "iowait %d%%" % (value * 100)
+    elif signal == "load":
+        text = "load %.1f per CPU" % value
+    elif signal == "io_latency":
+        text = "block I/O %.0f ms" % (value * 1000)
+    else:
+        text = "boots %.1fx slower than usual" % value
+    if host is not None:
+        text += " on " + host
+    return text
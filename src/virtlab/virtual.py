@@ -25,22 +25,188 @@ Created on May 20, 2012
 #import threading
 import time
 import threading
-from vm import LibVirtDao, VMInstance
+from collections import OrderedDict
+from vm import LibVirtDao, VMInstance, host_label
 from virtlab.project import Project
 from virtlab.vm import VMMetadata, VMState
+from virtlab.launcher import LaunchEngine
+from virtlab.planner import plan_launch
+from virtlab.admission import AdmissionControl
+from virtlab.throttle import AdaptiveThrottle
+from virtlab.executor import ShutdownExecutor, run_parallel
+from virtlab.asyncdao import AsyncDao, completed, when_all
+from virtlab.backend import HypervisorBackend
+from virtlab.metrics import get_registry
+from virtlab.auxiliary import VMLabException
+import virtlab.constant as c
 
 
 class VMCatalog(object):
-
-    def __init__(self):
+    '''
+    Catalog of the VMs of one or more hypervisors. VMs are identified
+    by (host, name). The catalog id of a VM on the primary (first)
+    hypervisor is its name, on the others "name@host".
+    Hypervisors are given as libvirt URIs or HypervisorBackend objects.
+    The catalog is shared by the main loop, launch, stop and event
+    threads, VMs and changes are guarded by one reentrant lock that is
+    not held over hypervisor calls.
+    '''
+
+    def __init__(self, hook=c.LIBVIRT_URI, autoload=True):
+        self.__lock = threading.RLock()
         self.__view = None
-        self.__vms = []
+        self.__vms = OrderedDict()
+        self.__uuids = {}
         self.__project = Project()
-        self.libvirtdao = LibVirtDao()
-        self.__reload_flag = False
-        self.__threads = []
-        #Initialize catalog state
-        self.refresh_vms_list()
+        if isinstance(hook, (basestring, HypervisorBackend)):
+            hook = [hook]
+        self.__hosts = OrderedDict()
+        for vm_hook in hook:
+            if isinstance(vm_hook, HypervisorBackend):
+                self.__hosts[vm_hook.get_host()] = vm_hook
+            else:
+                self.__hosts[host_label(vm_hook)] = vm_hook
+        self.__daos = OrderedDict()
+        self.__async_daos = OrderedDict()
+        self.__unreachable = set()
+        self.libvirtdao = None
+        self.__changes = VMChangeSet()
+        self.__change_listener = None
+        self.__profiler = None
+        self.__launch = None
+        self.__shutdown = None
+        #Initialize catalog state, without autoload the owner calls
+        #connect() and fills the catalog later
+        if autoload:
+            self.connect()
+            self.refresh_vms_list()
+
+    def connect(self):
+        '''
+        Connect all hypervisors in parallel. Returns the DAO of the
+        primary hypervisor. Hosts that do not answer are recorded as
+        unreachable and connected in the background, only if none
+        answers the connection error is raised.
+        '''
+        if self.libvirtdao is None:
+            results = run_parallel(self.open_backend, self.__hosts.values())
+            failures = [exception for vm_hook, dao, exception in results if exception is not None]
+            if len(failures) == len(results) and len(failures) > 0:
+                raise failures[0]
+            daos = OrderedDict()
+            for vm_hook, dao, exception in results:
+                if exception is not None:
+                    dao = LibVirtDao(vm_hook, connect=False)
+                    self.__unreachable.add(dao.get_host())
+                daos[dao.get_host()] = dao
+            self.__daos = daos
+            self.__async_daos = OrderedDict((host, AsyncDao(dao)) for host, dao in daos.items())
+            self.libvirtdao = list(daos.values())[0]
+            for vm_instance in self.get_vms():
+                vm_instance.set_daoref(self.get_dao(vm_instance.get_host()))
+        return self.libvirtdao
+
+    def close(self):
+        for async_dao in self.__async_daos.values():
+            async_dao.close()
+        self.__async_daos.clear()
+
+    @staticmethod
+    def open_backend(hook):
+        if isinstance(hook, HypervisorBackend):
+            return hook
+        return LibVirtDao(hook)
+
+    def get_hook(self):
+        return self.get_hooks()[0]
+
+    def get_hooks(self):
+        return [vm_hook.get_hook() if isinstance(vm_hook, HypervisorBackend) else vm_hook
+                for vm_hook in self.__hosts.values()]
+
+    def get_hosts(self):
+        return list(self.__hosts.keys())
+
+    def get_primary_host(self):
+        return self.get_hosts()[0]
+
+    def get_dao(self, host):
+        return self.__daos.get(host)
+
+    def get_daos(self):
+        return list(self.__daos.values())
+
+    def get_async_dao(self, host):
+        '''
+        Non-blocking access to host, shares the connection of its DAO
+        '''
+        return self.__async_daos.get(host)
+
+    def get_unreachable(self):
+        '''
+        Hosts that did not answer the latest state collection
+        '''
+        return self.__unreachable
+
+    def is_connected(self):
+        return self.libvirtdao is not None
+
+    def vm_id(self, host, vm_instance_name):
+        if host == self.get_primary_host():
+            return vm_instance_name
+        return vm_instance_name + c.HOST_SEPARATOR + host
+
+    def parse_id(self, vm_instance_id):
+        '''
+        Returns (host, name) of a catalog id
+        '''
+        name, separator, host = vm_instance_id.rpartition(c.HOST_SEPARATOR)
+        if separator and host in self.__hosts:
+            return host, name
+        return self.get_primary_host(), vm_instance_id
+
+    def collect_states(self, callback=None):
+        '''
+        Bulk snapshot of all hypervisors, collected in parallel.
+        callback(partial) is called from the collecting thread with the
+        snapshot of each host as soon as it arrives.
+        Returns OrderedDict of VM id -> (uuid, state). Hosts that fail
+        are left out and recorded as unreachable.
+        '''
+        return self.collect_states_async(callback).result()
+
+    def collect_states_async(self, callback=None):
+        '''
+        Non-blocking collect_states(), returns a future of the snapshot
+        '''
+        def collect(dao):
+            host = dao.get_host()
+            get_registry().increment("refresh", host=host)
+            partial = OrderedDict()
+            for vm_instance_name, value in dao.get_domain_states().items():
+                partial[self.vm_id(host, vm_instance_name)] = value
+            if callback is not None:
+                callback(partial)
+            return partial
+
+        def merge(combined):
+            snapshot = OrderedDict()
+            unreachable = set()
+            failure = None
+            for host, future in zip(self.__async_daos.keys(), combined.result()):
+                if future.exception() is not None:
+                    unreachable.add(host)
+                    failure = future.exception()
+                else:
+                    snapshot.update(future.result())
+            self.__unreachable = unreachable
+            if len(unreachable) == len(self.__async_daos) and failure is not None:
+                raise failure
+            return snapshot
+
+        futures = [async_dao.submit(collect, async_dao.get_dao())
+                   for async_dao in self.__async_daos.values()]
+        return when_all(futures).then(merge)
 
     def get_project(self):
         return self.__project
@@ -50,11 +216,56 @@ class VMCatalog(object):
         for vm_instance_name in self.__project.get_metadata():
             self.set_vms_metadata(self.__project.get_metadata()[vm_instance_name], vm_instance_name)
 
-    def notify_change(self):
-        self.__reload_flag = True
+    def notify_change(self, vm_instance=None, metadata=False):
+        '''
+        Record a change. Without vm_instance the whole catalog is
+        considered changed.
+        '''
+        if vm_instance is None:
+            self.record_change("mark_reload")
+        elif metadata:
+            self.record_change("mark_metadata", vm_instance.get_id())
+        else:
+            self.record_change("mark_state", vm_instance.get_id())
+
+    def record_change(self, mark, *args):
+        '''
+        Call method mark of the current change set, the listener is told
+        about the first change after a drain
+        '''
+        with self.__lock:
+            was_empty = self.__changes.is_empty()
+            getattr(self.__changes, mark)(*args)
+        if was_empty:
+            self.changed()
+
+    def set_change_listener(self, listener):
+        '''
+        listener() is called, from the thread making the change, when
+        the first change after a drain is recorded
+        '''
+        self.__change_listener = listener
+
+    def changed(self):
+        if self.__change_listener is not None:
+            self.__change_listener()
 
     def reset_change_notify(self):
-        self.__reload_flag = False
+        self.drain_changes()
+
+    def is_changed(self):
+        with self.__lock:
+            return not self.__changes.is_empty()
+
+    def drain_changes(self):
+        '''
+        Returns changes recorded since the previous drain and starts a
+        new change set
+        '''
+        with self.__lock:
+            changes = self.__changes
+            self.__changes = VMChangeSet()
+        return changes
 
 #    def empty(self):
 #        del self.__vms[:]
@@ -63,42 +274,92 @@ class VMCatalog(object):
         self.scheduled_vm_launcher(True)
 
     def stop_all_related_vms_once(self):
-        delay = 0
-        for vm_instance in self.__vms:
-            if vm_instance.has_defined_role():
-                t = threading.Timer(delay, VMLaunchworker.stop_worker, args=(VMLaunchworker(), vm_instance),)
-                t.start()
-                delay += 2
+        self.stop_vms([vm_instance for vm_instance in self.get_vms() if vm_instance.has_defined_role()])
 
     def stop_all_vms_once(self):
-        delay = 0
-        for vm_instance in self.__vms:
-            t = threading.Timer(delay, VMLaunchworker.stop_worker, args=(VMLaunchworker(), vm_instance),)
-            t.start()
-            delay += 2
+        self.stop_vms(self.get_vms())
+
+    def stop_vms(self, vm_instances):
+        # Do not start another stop while one is running
+        if self.__shutdown is not None and self.__shutdown.is_running():
+            return
+
+        # VMs restored from the snapshot cache have no DAO before connect()
+        running = [vm_instance for vm_instance in vm_instances
+                   if vm_instance.get_state() is VMState.Running and vm_instance.get_daoref() is not None]
+        if len(running) == 0:
+            self.__view.set_statusbar("Nothing to stop.")
+            return
+
+        graceful = [vm_instance.get_id() for vm_instance in running
+                    if self.get_stop_mode(vm_instance) == c.STOP_MODE_GRACEFUL]
+        worker = VMLaunchworker()
+        self.__shutdown = ShutdownExecutor(running, self.__view,
+                                           worker.stop_worker,
+                                           self.__project.get_stop_parallelism(),
+                                           self.__project.get_stop_rate(),
+                                           worker.shutdown_worker,
+                                           self.get_running_names,
+                                           graceful,
+                                           self.__project.get_stop_timeout())
+        self.__shutdown.start()
+
+    def get_stop_mode(self, vm_instance):
+        '''
+        Stop mode of the VM, falls back to the project stop mode
+        '''
+        if len(vm_instance.get_stop_mode()) > 0:
+            return vm_instance.get_stop_mode()
+        return self.__project.get_stop_mode()
+
+    def get_running_names(self, vm_instances):
+        '''
+        Ids of vm_instances running now, from one bulk snapshot
+        '''
+        snapshot = self.collect_states()
+        running = set()
+        for vm_instance in vm_instances:
+            if snapshot.get(vm_instance.get_id(), (None, VMState.Gone))[1] is VMState.Running:
+                running.add(vm_instance.get_id())
+        return running
+
+    def get_shutdown(self):
+        return self.__shutdown
 
     def get_vm(self, name_or_instance):
-        return self.__vms[self.__vms.index(name_or_instance)]
+        if isinstance(name_or_instance, VMInstance):
+            name_or_instance = name_or_instance.get_id()
+        with self.__lock:
+            return self.__vms.get(name_or_instance)
+
+    def get_vm_by_uuid(self, uuid):
+        with self.__lock:
+            return self.__uuids.get(uuid)
 
     def get_vms(self):
-        return self.__vms
+        with self.__lock:
+            return list(self.__vms.values())
 
     def set_vms_metadata(self, metadata, vm_instance_name):
-        if vm_instance_name in self.__vms:
-            self.get_vm(vm_instance_name).set_metadataref(metadata)
-        else:
-            self.catalog(vm_instance_name)
+        with self.__lock:
+            if vm_instance_name not in self.__vms:
+                self.catalog(vm_instance_name)
             self.get_vm(vm_instance_name).set_metadataref(metadata)
+            self.record_change("mark_metadata", vm_instance_name)
 
     def get_vms_metadata(self):
         metadata = {}
-        for vm_instance in self.__vms:
-            metadata[vm_instance.get_name()] = vm_instance.get_metadataref()
+        for vm_instance in self.get_vms():
+            metadata[vm_instance.get_id()] = vm_instance.get_metadataref()
         return metadata
 
     def reset(self):
-        del self.__vms[:]
-        self.__project.reset()
+        with self.__lock:
+            for vm_instance_name in self.__vms:
+                self.record_change("mark_removed", vm_instance_name)
+            self.__vms.clear()
+            self.__uuids.clear()
+            self.__project.reset()
         self.refresh_vms_list()
 
     def refresh_vms_list(self):
@@ -107,24 +368,171 @@ class VMCatalog(object):
         Returns False if no status change from hypervisor
         Returns True if status change is occured
         '''
-        domains = self.libvirtdao.get_domain_list()
+        if not self.is_connected():
+            return self.is_changed()
+
+        return self.apply_collected(self.collect_states_async())
 
-        for vm_instance_name in domains:
+    def apply_collected(self, future):
+        '''
+        Apply the snapshot of a complete collect_states_async() future.
+        Raises its failure when no host answered.
+        '''
+        try:
+            snapshot = future.result()
+        except VMLabException:
+            # No host answered, flag every state as unconfirmed
+            self.apply_states({})
+            raise
+        return self.apply_snapshot(snapshot)
+
+    def apply_snapshot(self, snapshot):
+        '''
+        Catalog new VMs of a complete snapshot and apply all states
+        '''
+        with self.__lock:
+            for vm_instance_name in snapshot:
+                if vm_instance_name not in self.__vms:
+                    self.catalog(vm_instance_name)
+
+            self.apply_states(snapshot)
+
+        return self.is_changed()
+
+    def reconcile(self, snapshot):
+        '''
+        Apply a complete snapshot after a warm start. Cached VMs no longer
+        on the hypervisor are dropped unless the project refers to them,
+        those of unreachable hosts stay stale.
+        '''
+        with self.__lock:
+            for vm_instance in self.get_vms():
+                if vm_instance.is_stale() and vm_instance.get_id() not in snapshot \
+                        and vm_instance.get_host() not in self.__unreachable \
+                        and not vm_instance.has_defined_role():
+                    self.uncatalog(vm_instance.get_id())
+            return self.apply_snapshot(snapshot)
+
+    def restore_snapshot(self, records):
+        '''
+        Fill the catalog from snapshot cache records, states are marked
+        stale until the hypervisor confirms them
+        '''
+        for record in records:
+            metadata = VMMetadata()
+            metadata.set_order(record.get("order", 0))
+            metadata.set_delay(record.get("delay", 0.0))
+            metadata.set_desc(record.get("desc", ""))
+            metadata.set_depends(record.get("depends", []))
+            metadata.set_probe(record.get("probe", ""))
+            metadata.set_stop_mode(record.get("stop_mode", ""))
+            self.set_vms_metadata(metadata, record["name"])
+            vm_instance = self.get_vm(record["name"])
+            vm_instance.set_state(VMState.from_str(record.get("state")))
+            vm_instance.set_stale(True)
+            if record.get("uuid") is not None:
+                self.index_uuid(vm_instance, record["uuid"])
+
+    def apply_partial_states(self, snapshot):
+        '''
+        Catalog and update only the VMs in a partial snapshot, VMs not
+        in it are left as they are.
+        '''
+        with self.__lock:
+            for vm_instance_name, (uuid, state) in snapshot.items():
+                if vm_instance_name not in self.__vms:
+                    self.catalog(vm_instance_name)
+                vm_instance = self.__vms[vm_instance_name]
+                if uuid is not None:
+                    self.index_uuid(vm_instance, uuid)
+                vm_instance.apply_state(state)
+        return self.is_changed()
+
+    def apply_states(self, snapshot):
+        '''
+        Apply states of a bulk snapshot to the catalog in one pass.
+        VMs missing from the snapshot are marked gone. VMs of unreachable
+        hosts keep their last state, marked stale.
+        '''
+        with self.__lock:
+            for vm_instance in self.__vms.values():
+                if vm_instance.get_host() in self.__unreachable:
+                    vm_instance.mark_stale()
+                    continue
+                uuid, state = snapshot.get(vm_instance.get_id(), (None, VMState.Gone))
+                if uuid is not None:
+                    self.index_uuid(vm_instance, uuid)
+                vm_instance.apply_state(state)
+
+    def apply_domain_event(self, vm_instance_name, uuid, state):
+        '''
+        Apply a single domain lifecycle event to the catalog.
+        State None means the event does not tell the resulting state and
+        the domain is queried from the hypervisor.
+        Returns True if the catalog changed
+        '''
+        with self.__lock:
             if vm_instance_name not in self.__vms:
+                if state is VMState.Gone:
+                    return self.is_changed()
                 self.catalog(vm_instance_name)
 
-        self.request_state_reload()
+            vm_instance = self.get_vm(vm_instance_name)
+            if uuid is not None:
+                self.index_uuid(vm_instance, uuid)
+        # The query is a hypervisor call, made without the lock
+        if state is None:
+            vm_instance.query_state()
+        else:
+            vm_instance.apply_state(state)
+        return self.is_changed()
+
+    def query_domain_state_async(self, vm_instance_name):
+        '''
+        Future of the current VMState of a domain, queried on the RPC
+        workers of its host without touching the catalog. The state is
+        None before the host is connected.
+        '''
+        host, name = self.parse_id(vm_instance_name)
+        async_dao = self.get_async_dao(host)
+        if async_dao is None:
+            return completed(None)
 
-        return self.__reload_flag
+        def query(dao):
+            vm_instance = dao.vm_build(name, vm_instance_name)
+            dao.update_domain_state(vm_instance)
+            return vm_instance.get_state()
+        return async_dao.submit(query, async_dao.get_dao())
 
     def catalog(self, vm_instance_name):
-        vm_instance = self.libvirtdao.vm_build(vm_instance_name)
+        host, name = self.parse_id(vm_instance_name)
+        if self.is_connected():
+            vm_instance = self.get_dao(host).vm_build(name, vm_instance_name)
+        else:
+            # Restored from the snapshot cache, bound to a DAO on connect
+            vm_instance = VMInstance(name, None, vm_instance_name, host)
         vm_instance.set_metadataref(VMMetadata())
         vm_instance.set_vmcatalogref(self)
-        self.__vms.append(vm_instance)
+        with self.__lock:
+            self.__vms[vm_instance_name] = vm_instance
+            self.record_change("mark_added", vm_instance_name)
+
+    def uncatalog(self, vm_instance_name):
+        with self.__lock:
+            vm_instance = self.__vms.pop(vm_instance_name, None)
+            if vm_instance is not None:
+                self.__uuids.pop(vm_instance.get_uuid(), None)
+                self.record_change("mark_removed", vm_instance_name)
+
+    def index_uuid(self, vm_instance, uuid):
+        with self.__lock:
+            if vm_instance.get_uuid() != uuid:
+                self.__uuids.pop(vm_instance.get_uuid(), None)
+                vm_instance.set_uuid(uuid)
+            self.__uuids[uuid] = vm_instance
 
     def request_state_reload(self):
-        for vm_istance in self.__vms:
+        for vm_istance in self.get_vms():
             vm_istance.query_state()
 
     def set_view(self, view):
@@ -138,61 +546,144 @@ class VMCatalog(object):
 
     def scheduled_vm_launcher(self, zero_delay=False):
         # Do not start launch if launch is already running.
-        if len(self.__threads) is 0:
-            startable = []
-
-            # Which instances should be started
-            for vm_instance in self.__vms:
-                if vm_instance.get_state() is VMState.Stopped and vm_instance.has_defined_role():
-                    startable.append(vm_instance)
-
-            # Sort according to order
-            startable.sort(cmp=None, key=lambda x: x.get_order(), reverse=False)
-            # Sort according to start delay if same order
-            startable.sort(lambda x, y: x.get_order() == y.get_order() and x.get_delay() < y.get_delay(), reverse=False)
-
-            incr_delay = 0
-            for vm_instance in startable:
-                if incr_delay > 0:
-                    self.__view.add_status_dialogbox(vm_instance.get_name() + " starts in " + str(incr_delay * 60) + " seconds.")
-                if vm_instance is startable[-1]:
-                    t = threading.Timer(incr_delay * 60, VMLaunchworker.start_worker, args=(VMLaunchworker(), self, vm_instance, True),)
-                else:
-                    t = threading.Timer(incr_delay * 60, VMLaunchworker.start_worker, args=(VMLaunchworker(), self, vm_instance, False),)
-                if not zero_delay:
-                    incr_delay = incr_delay + vm_instance.get_delay()
-                t.start()
-                self.__threads.append(t)
+        if self.__launch is not None and self.__launch.is_running():
+            return
+
+        startable = self.get_startable()
+        if len(startable) == 0:
+            self.__view.set_statusbar("Nothing to launch.")
+            return
+
+        admission = None
+        if self.__project.has_admission():
+            admission = AdmissionControl(self.__project.get_memory_overcommit(),
+                                         self.__project.get_cpu_overcommit())
+        throttle = None
+        if self.__project.is_adaptive():
+            daos = OrderedDict((vm_instance.get_host(), vm_instance.get_daoref()) for vm_instance in startable)
+            throttle = AdaptiveThrottle(list(daos.values()), self.__project.get_concurrency(),
+                                        self.__project.get_max_concurrency(), profiler=self.__profiler)
+        try:
+            self.__launch = LaunchEngine(startable, self.__view,
+                                         self.__project.get_concurrency(),
+                                         zero_delay, self.__profiler,
+                                         admission, throttle)
+        except VMLabException as exception:
+            self.__view.add_status_dialogbox(exception.msg)
+            self.__view.set_statusbar("Launch failed.")
+            return
+        self.__launch.start()
+
+    def get_startable(self):
+        '''
+        VMs a launch would start: stopped, bound to a hypervisor and with
+        a role in the project
+        '''
+        return [vm_instance for vm_instance in self.get_vms()
+                if vm_instance.get_state() is VMState.Stopped and vm_instance.has_defined_role()
+                and vm_instance.get_daoref() is not None]
 
-            if len(startable) is 0:
-                self.__view.set_statusbar("Nothing to launch.")
+    def plan_vm_launch(self, zero_delay=False):
+        '''
+        LaunchPlan of what scheduled_vm_launcher(zero_delay) would do now
+        '''
+        return plan_launch(self.get_startable(), self.__project.get_concurrency(),
+                           zero_delay, self.__profiler)
+
+    def get_launch(self):
+        return self.__launch
+
+    def set_profiler(self, profiler):
+        '''
+        BootProfiler recording the launches of this catalog
+        '''
+        self.__profiler = profiler
 
+    def get_profiler(self):
+        return self.__profiler
 
     def cancel_vm_launch(self):
-        if len(self.__threads) > 0:
-            for thread in self.__threads:
-                thread.cancel()
+        if self.__launch is not None and self.__launch.is_running():
+            self.__launch.cancel()
             self.__view.add_status_dialogbox("Launch terminated.")
             self.__view.set_statusbar("Launch terminated.")
             self.clear_vm_launch()
 
     def clear_vm_launch(self):
-        del self.__threads[:]
+        self.__launch = None
 
 
-class VMLaunchworker(object):
-    def start_worker(self, model, vm_instance, last=False):
-        model.get_view().add_status_dialogbox(vm_instance.get_name() + " started.")
-        vm_instance.start()
-        if last:
-            model.get_view().set_statusbar("Launch completed.")
-            model.get_view().add_status_dialogbox("Launch completed.")
-            model.clear_vm_launch()
+class VMChangeSet(object):
+    '''
+    Coalesced catalog changes by VM id: added, removed, state changed
+    and metadata changed. A VM added and removed between two drains does
+    not show up at all.
+    '''
+
+    def __init__(self):
+        self.__reload = False
+        self.__added = set()
+        self.__removed = set()
+        self.__state = set()
+        self.__metadata = set()
+
+    def mark_reload(self):
+        self.__reload = True
+
+    def mark_added(self, vm_instance_name):
+        if vm_instance_name in self.__removed:
+            self.__removed.discard(vm_instance_name)
+            self.__state.add(vm_instance_name)
+            self.__metadata.add(vm_instance_name)
+        else:
+            self.__added.add(vm_instance_name)
+
+    def mark_removed(self, vm_instance_name):
+        self.__state.discard(vm_instance_name)
+        self.__metadata.discard(vm_instance_name)
+        if vm_instance_name in self.__added:
+            self.__added.discard(vm_instance_name)
         else:
-            model.get_view().set_statusbar("Launch in progress.")
-        return
+            self.__removed.add(vm_instance_name)
+
+    def mark_state(self, vm_instance_name):
+        if vm_instance_name not in self.__added:
+            self.__state.add(vm_instance_name)
+
+    def mark_metadata(self, vm_instance_name):
+        if vm_instance_name not in self.__added:
+            self.__metadata.add(vm_instance_name)
 
+    def is_reload(self):
+        return self.__reload
+
+    def is_empty(self):
+        return not (self.__reload or self.__added or self.__removed
+                    or self.__state or self.__metadata)
+
+    def get_added(self):
+        return self.__added
+
+    def get_removed(self):
+        return self.__removed
+
+    def get_state_changed(self):
+        return self.__state
+
+    def get_metadata_changed(self):
+        return self.__metadata
+
+    def get_changed(self):
+        '''
+        Ids of all VMs touched by this change set
+        '''
+        return self.__added | self.__removed | self.__state | self.__metadata
+
+
+class VMLaunchworker(object):
     def stop_worker(self, vm_instance):
-        vm_instance.stop()
-        return
+        return vm_instance.stop()
+
+    def shutdown_worker(self, vm_instance):
+        return vm_instance.shutdown()
 
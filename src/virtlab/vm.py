@@ -20,17 +20,125 @@ Copyright 2012 Harri Savolainen
 @license: GPLv3
 
 '''
+import multiprocessing
+import threading
+import time
 import virtlab.constant as c
 from virtlab.auxiliary import VMLabException
+from virtlab.backend import HypervisorBackend, HostCapacity, LoadSample
+from virtlab.metrics import TimedBlock
 import libvirt
 from libvirt import libvirtError
+from collections import OrderedDict
+from xml.etree import ElementTree
+try:
+    from urlparse import urlsplit
+except ImportError:
+    from urllib.parse import urlsplit
 
 
-class LibVirtDao():
+def host_label(hook):
+    '''
+    Short name of the hypervisor host of a libvirt URI,
+    "localhost" for local URIs such as qemu:///system
+    '''
+    return urlsplit(hook).hostname or "localhost"
 
-    def __init__(self, hook="qemu:///system"):
+
+# libvirt error codes that mean the connection itself is broken
+CONNECTION_ERRORS = (libvirt.VIR_ERR_SYSTEM_ERROR, libvirt.VIR_ERR_NO_CONNECT,
+                     libvirt.VIR_ERR_INVALID_CONN, libvirt.VIR_ERR_RPC)
+
+
+# Domain methods answered from the local object, not by the hypervisor
+LOCAL_CALLS = frozenset(["name", "UUIDString", "UUID", "ID", "connect"])
+
+
+def supervised(method):
+    '''
+    Turn libvirt errors caused by a broken connection into
+    VMLabException(EXCEPTION_LIBVIRT_002) and start reconnecting
+    '''
+    def wrapper(self, *args, **kwargs):
+        try:
+            return method(self, *args, **kwargs)
+        except libvirtError as error:
+            self.raise_if_lost(error)
+            raise
+    wrapper.__name__ = method.__name__
+    wrapper.__doc__ = method.__doc__
+    return wrapper
+
+
+def read_load_average():
+    '''
+    1 minute load average of this machine per CPU, None if unknown
+    '''
+    try:
+        loadavg_file = open("/proc/loadavg", "r")
+        try:
+            load = float(loadavg_file.read().split()[0])
+        finally:
+            loadavg_file.close()
+        return load / multiprocessing.cpu_count()
+    except (IOError, ValueError, IndexError, NotImplementedError):
+        return None
+
+
+class TimedProxy(object):
+    '''
+    virConnect or virDomain of host whose calls are timed into the
+    metrics registry, one "rpc" per libvirt call. Domains the calls
+    return are wrapped too.
+    '''
+
+    def __init__(self, target, host):
+        self.__target = target
+        self.__host = host
+
+    def __getattr__(self, name):
+        attribute = getattr(self.__target, name)
+        if name in LOCAL_CALLS or not callable(attribute):
+            return attribute
+
+        def call(*args, **kwargs):
+            with TimedBlock("rpc", operation=name, host=self.__host):
+                result = attribute(*args, **kwargs)
+            return self.wrap(result)
+        return call
+
+    def wrap(self, result):
+        if isinstance(result, libvirt.virDomain):
+            return TimedProxy(result, self.__host)
+        if isinstance(result, list):
+            return [self.wrap(item) for item in result]
+        return result
+
+
+class LibVirtDao(HypervisorBackend):
+    '''
+    Access to one hypervisor. The connection is supervised: a lost
+    connection is reopened in the background with exponential backoff
+    and calls made meanwhile fail fast with EXCEPTION_LIBVIRT_002.
+    Without connect the DAO starts disconnected and connects the same
+    way.
+    '''
+
+    # Keepalive and close callbacks need a running libvirt event loop,
+    # set by VMStateTracker.register_event_loop()
+    event_loop = False
+
+    def __init__(self, hook=c.LIBVIRT_URI, connect=True):
         self.__hook = hook
-        self.__conn = self.get_libvirt()
+        self.__lock = threading.Lock()
+        self.__listeners = []
+        self.__reconnector = None
+        self.__generation = 0
+        self.__conn = None
+        if connect:
+            self.set_conn(self.get_libvirt())
+        else:
+            self.start_reconnect()
 
     def get_libvirt(self):
         try:
@@ -39,59 +147,402 @@ class LibVirtDao():
             raise VMLabException(c.EXCEPTION_LIBVIRT_001, \
                                  c.EXCEPTION_LIBVIRT_001_DESC)
 
+    def get_hook(self):
+        return self.__hook
+
+    def get_host(self):
+        return host_label(self.__hook)
+
+    def get_conn(self):
+        '''
+        The connection, its calls count as RPCs in the metrics
+        '''
+        conn = self.__conn
+        if conn is None:
+            raise VMLabException(c.EXCEPTION_LIBVIRT_002, \
+                                 c.EXCEPTION_LIBVIRT_002_DESC)
+        return TimedProxy(conn, self.get_host())
+
+    def set_conn(self, conn):
+        # Without an event loop a broken connection is noticed on the next call
+        if LibVirtDao.event_loop:
+            try:
+                conn.setKeepAlive(c.KEEPALIVE_INTERVAL, c.KEEPALIVE_COUNT)
+                conn.registerCloseCallback(self.connection_closed, None)
+            except (AttributeError, libvirtError):
+                pass
+        with self.__lock:
+            self.__conn = conn
+            self.__generation += 1
+
+    def is_connected(self):
+        return self.__conn is not None
+
+    def get_generation(self):
+        '''
+        Number of connections opened so far, changes on every reconnect
+        '''
+        return self.__generation
+
+    def add_connection_listener(self, listener):
+        '''
+        listener(dao, connected) is called when the connection is lost
+        and when it is back. Called from the thread that noticed it.
+        '''
+        self.__listeners.append(listener)
+
+    def remove_connection_listener(self, listener):
+        if listener in self.__listeners:
+            self.__listeners.remove(listener)
+
+    def raise_if_lost(self, error):
+        '''
+        Raise VMLabException(EXCEPTION_LIBVIRT_002) if error was caused
+        by a broken connection
+        '''
+        if error.get_error_code() in CONNECTION_ERRORS or not self.is_alive():
+            self.connection_lost()
+            raise VMLabException(c.EXCEPTION_LIBVIRT_002, \
+                                 c.EXCEPTION_LIBVIRT_002_DESC)
+
+    def is_alive(self):
+        conn = self.__conn
+        try:
+            return conn is not None and conn.isAlive() == 1
+        except (AttributeError, libvirtError):
+            return False
+
+    # pylint: disable=W0613
+    def connection_closed(self, conn, reason, opaque):
+        self.connection_lost()
+
+    def connection_lost(self):
+        with self.__lock:
+            lost = self.__conn
+            if lost is None:
+                return
+            self.__conn = None
+            self.start_reconnect(lost)
+        self.notify_connection(False)
+
+    def start_reconnect(self, lost=None):
+        # Caller holds the lock or the DAO is not shared yet
+        self.__reconnector = threading.Thread(target=self.reconnect, args=(lost,),
+                                name="reconnect-" + self.get_host())
+        self.__reconnector.setDaemon(True)
+        self.__reconnector.start()
+
+    def reconnect(self, lost=None):
+        # The loss may be noticed in the close callback of the lost
+        # connection, it is closed here instead
+        if lost is not None:
+            self.close_conn(lost)
+        delay = c.RECONNECT_DELAY
+        while True:
+            time.sleep(delay)
+            try:
+                conn = libvirt.open(self.__hook)
+            except Exception:
+                delay = min(delay * 2, c.RECONNECT_DELAY_MAX)
+                continue
+            self.set_conn(conn)
+            self.notify_connection(True)
+            return
+
+    @staticmethod
+    def close_conn(conn):
+        '''
+        Release a connection, errors of a dead connection are ignored
+        '''
+        if LibVirtDao.event_loop:
+            try:
+                conn.unregisterCloseCallback()
+            except (AttributeError, libvirtError):
+                pass
+        try:
+            conn.close()
+        except (AttributeError, libvirtError):
+            pass
+
+    def notify_connection(self, connected):
+        for listener in list(self.__listeners):
+            listener(self, connected)
+
+    @supervised
     def start_domain(self, vm_instance):
-        domain = self.__conn.lookupByName(vm_instance.get_name())
+        domain = self.get_conn().lookupByName(vm_instance.get_name())
         if domain.isActive() is 0:
             if domain.create() is 0:
                 return True
             else:
                 return False
 
+    @supervised
+    def shutdown_domain(self, vm_instance):
+        '''
+        Request ACPI shutdown, does not wait for the guest to power off
+        '''
+        domain = self.get_conn().lookupByName(vm_instance.get_name())
+        if domain.isActive() is 1:
+            if domain.shutdown() is 0:
+                return True
+            else:
+                return False
+
+    @supervised
     def stop_domain(self, vm_instance):
-        domain = self.__conn.lookupByName(vm_instance.get_name())
+        domain = self.get_conn().lookupByName(vm_instance.get_name())
         if domain.isActive() is 1:
             if domain.destroy() is 0:
                 return True
             else:
                 return False
 
+    @supervised
     def update_domain_state(self, vm_instance):
-
-        if vm_instance not in self.get_domain_list():
-            vm_instance.set_state(VMState.Gone)
-            return
-
         try:
-            domain = self.__conn.lookupByName(vm_instance.get_name())
+            domain = self.get_conn().lookupByName(vm_instance.get_name())
             if domain.isActive() is 1:
                 vm_instance.set_state(VMState.Running)
             else:
                 vm_instance.set_state(VMState.Stopped)
-        except libvirtError:
+        except libvirtError as error:
+            self.raise_if_lost(error)
             vm_instance.set_state(VMState.Gone)
 
         return
 
+    @supervised
     def get_domain_list(self):
         domains = []
-        for domain_id in self.__conn.listDomainsID():
+        for domain_id in self.get_conn().listDomainsID():
             try:
-                domain = self.__conn.lookupByID(domain_id)
+                domain = self.get_conn().lookupByID(domain_id)
                 domains.append(domain.name())
             except libvirt.libvirtError:
                 pass
-        return domains + self.__conn.listDefinedDomains()
+        return domains + self.get_conn().listDefinedDomains()
+
+    @supervised
+    def get_domain_states(self):
+        '''
+        Bulk snapshot of all domains on the hypervisor.
+        Returns dictionary of domain name -> (uuid, state) fetched with
+        a constant number of RPCs regardless of the amount of domains.
+        '''
+        try:
+            active = self.get_conn().listAllDomains(libvirt.VIR_CONNECT_LIST_DOMAINS_ACTIVE)
+            inactive = self.get_conn().listAllDomains(libvirt.VIR_CONNECT_LIST_DOMAINS_INACTIVE)
+        except AttributeError:
+            # Bindings without virConnectListAllDomains
+            return self.get_domain_states_legacy()
+        except libvirtError as error:
+            # Hypervisor without it, any other failure is the caller's
+            if error.get_error_code() != libvirt.VIR_ERR_NO_SUPPORT:
+                raise
+            return self.get_domain_states_legacy()
+
+        snapshot = OrderedDict()
+        for domain in active:
+            snapshot[domain.name()] = (domain.UUIDString(), VMState.Running)
+        for domain in inactive:
+            snapshot[domain.name()] = (domain.UUIDString(), VMState.Stopped)
+        return snapshot
+
+    def get_domain_states_legacy(self):
+        snapshot = OrderedDict()
+        for domain_id in self.get_conn().listDomainsID():
+            try:
+                domain = self.get_conn().lookupByID(domain_id)
+                snapshot[domain.name()] = (domain.UUIDString(), VMState.Running)
+            except libvirtError as error:
+                self.raise_if_lost(error)
+        for domain_name in self.get_conn().listDefinedDomains():
+            snapshot[domain_name] = (None, VMState.Stopped)
+        return snapshot
+
+    @supervised
+    def get_host_capacity(self):
+        '''
+        Node info, free memory and the configured memory and vCPUs of
+        the running domains, in one bulk stats call where supported
+        '''
+        try:
+            info = self.get_conn().getInfo()
+            free_memory = self.get_conn().getFreeMemory() // 1024
+            committed_memory, committed_vcpus = self.get_committed_resources()
+        except libvirtError as error:
+            self.raise_if_lost(error)
+            raise
+        # getInfo() reports memory in MiB
+        return HostCapacity(info[1] * 1024, free_memory, info[2],
+                            committed_memory, committed_vcpus)
+
+    def get_committed_resources(self):
+        try:
+            stats = self.get_conn().getAllDomainStats(libvirt.VIR_DOMAIN_STATS_BALLOON |
+                                                      libvirt.VIR_DOMAIN_STATS_VCPU,
+                                                      libvirt.VIR_CONNECT_GET_ALL_DOMAINS_STATS_ACTIVE)
+        except AttributeError:
+            stats = None
+        except libvirtError as error:
+            if error.get_error_code() != libvirt.VIR_ERR_NO_SUPPORT:
+                raise
+            stats = None
+        if stats is not None:
+            return (sum(values.get("balloon.maximum", 0) for domain, values in stats),
+                    sum(values.get("vcpu.maximum", values.get("vcpu.current", 0)) for domain, values in stats))
+        # One info() call per running domain
+        committed_memory = committed_vcpus = 0
+        for domain in self.get_conn().listAllDomains(libvirt.VIR_CONNECT_LIST_DOMAINS_ACTIVE):
+            state, max_memory, memory, vcpus, cpu_time = domain.info()
+            committed_memory += max_memory
+            committed_vcpus += vcpus
+        return committed_memory, committed_vcpus
+
+    @supervised
+    def get_load_sample(self):
+        '''
+        Host CPU times and block I/O totals of the running domains, plus
+        the load average when libvirtd runs on this machine
+        '''
+        try:
+            cpu = self.get_conn().getCPUStats(libvirt.VIR_NODE_CPU_STATS_ALL_CPUS, 0)
+            io_requests, io_time = self.get_block_totals()
+        except libvirtError as error:
+            self.raise_if_lost(error)
+            if error.get_error_code() == libvirt.VIR_ERR_NO_SUPPORT:
+                return None
+            raise
+        load = None
+        if self.get_host() == "localhost":
+            load = read_load_average()
+        return LoadSample(cpu.get("iowait", 0), sum(cpu.values()), io_requests, io_time, load)
+
+    def get_block_totals(self):
+        try:
+            stats = self.get_conn().getAllDomainStats(libvirt.VIR_DOMAIN_STATS_BLOCK,
+                                                      libvirt.VIR_CONNECT_GET_ALL_DOMAINS_STATS_ACTIVE)
+        except AttributeError:
+            return 0, 0
+        except libvirtError as error:
+            if error.get_error_code() != libvirt.VIR_ERR_NO_SUPPORT:
+                raise
+            return 0, 0
+        io_requests = io_time = 0
+        for domain, values in stats:
+            for key, value in values.items():
+                if key.endswith(".rd.reqs") or key.endswith(".wr.reqs"):
+                    io_requests += value
+                elif key.endswith(".rd.times") or key.endswith(".wr.times"):
+                    io_time += value
+        return io_requests, io_time
+
+    @supervised
+    def get_domain_resources(self, vm_instance):
+        try:
+            state, max_memory, memory, vcpus, cpu_time = \
+                self.get_conn().lookupByName(vm_instance.get_name()).info()
+        except libvirtError as error:
+            self.raise_if_lost(error)
+            return None
+        return max_memory, vcpus
+
+    @supervised
+    def is_domain_active(self, vm_instance):
+        try:
+            return self.get_conn().lookupByName(vm_instance.get_name()).isActive() == 1
+        except libvirtError as error:
+            self.raise_if_lost(error)
+            return False
+
+    @supervised
+    def get_domain_addresses(self, vm_instance):
+        '''
+        IPv4 addresses of the guest from the DHCP leases of its networks
+        '''
+        addresses = []
+        try:
+            domain = self.get_conn().lookupByName(vm_instance.get_name())
+            interfaces = domain.interfaceAddresses(libvirt.VIR_DOMAIN_INTERFACE_ADDRESSES_SRC_LEASE, 0)
+        except AttributeError:
+            return addresses
+        except libvirtError as error:
+            self.raise_if_lost(error)
+            return addresses
+        for interface in (interfaces or {}).values():
+            for address in interface.get("addrs") or []:
+                if address["type"] == libvirt.VIR_IP_ADDR_TYPE_IPV4:
+                    addresses.append(address["addr"])
+        return addresses
+
+    @supervised
+    def ping_guest_agent(self, vm_instance):
+        try:
+            import libvirt_qemu
+        except ImportError:
+            return False
+        try:
+            domain = self.get_conn().lookupByName(vm_instance.get_name())
+            libvirt_qemu.qemuAgentCommand(domain, '{"execute": "guest-ping"}', \
+                                          c.PROBE_AGENT_TIMEOUT, 0)
+            return True
+        except libvirtError as error:
+            self.raise_if_lost(error)
+            return False
+
+    @supervised
+    def get_console_log_path(self, vm_instance):
+        '''
+        Path of the file the serial console of the domain is logged to
+        '''
+        try:
+            domain = self.get_conn().lookupByName(vm_instance.get_name())
+            desc = ElementTree.fromstring(domain.XMLDesc(0))
+        except libvirtError as error:
+            self.raise_if_lost(error)
+            return None
+        except ElementTree.ParseError:
+            return None
+        for device in desc.findall("devices/serial") + desc.findall("devices/console"):
+            source = device.find("source")
+            if device.get("type") == "file" and source is not None:
+                return source.get("path")
+            log = device.find("log")
+            if log is not None:
+                return log.get("file")
+        return None
+
+    def requires_event_loop(self):
+        return True
 
-    def vm_build(self, vm_instance_name=None):
-        vm_instance = VMInstance(vm_instance_name, self)
+    @supervised
+    def register_lifecycle_callback(self, callback):
+        '''
+        Subscribe callback(conn, domain, event, detail, opaque) to domain
+        lifecycle events. Requires a registered libvirt event loop.
+        '''
+        return self.get_conn().domainEventRegisterAny(None, \
+                                    libvirt.VIR_DOMAIN_EVENT_ID_LIFECYCLE, \
+                                    callback, None)
+
+    def deregister_lifecycle_callback(self, callback_id):
+        self.get_conn().domainEventDeregisterAny(callback_id)
+
+    def vm_build(self, vm_instance_name=None, vm_id=None):
+        vm_instance = VMInstance(vm_instance_name, self, vm_id, self.get_host())
         return vm_instance
 
 
 class VMInstance(object):
 
-    def __init__(self, name, daoref):
+    def __init__(self, name, daoref, vm_id=None, host=None):
         self.__name = name
+        self.__id = vm_id if vm_id is not None else name
+        self.__host = host
+        self.__uuid = None
         self.__state = None
+        self.__stale = False
         self.__metadataref = None
         self.__vmcatalogref = None
         self.__daoref = daoref
@@ -99,6 +550,12 @@ class VMInstance(object):
     def get_vmcatalogref(self):
         return self.__vmcatalogref
 
+    def get_daoref(self):
+        return self.__daoref
+
+    def set_daoref(self, value):
+        self.__daoref = value
+
     def set_vmcatalogref(self, value):
         self.__vmcatalogref = value
 
@@ -107,22 +564,67 @@ class VMInstance(object):
 
     def set_desc(self, value):
         self.__metadataref.set_desc(value)
+        self.notify_metadata_change()
 
     def set_order(self, value):
         self.__metadataref.set_order(value)
+        self.notify_metadata_change()
 
     def get_order(self):
         return self.__metadataref.get_order()
 
     def set_delay(self, value):
         self.__metadataref.set_delay(value)
+        self.notify_metadata_change()
 
     def get_delay(self):
         return self.__metadataref.get_delay()
 
+    def set_depends(self, value):
+        self.__metadataref.set_depends(value)
+        self.notify_metadata_change()
+
+    def get_depends(self):
+        return self.__metadataref.get_depends()
+
+    def set_probe(self, value):
+        self.__metadataref.set_probe(value)
+        self.notify_metadata_change()
+
+    def get_probe(self):
+        return self.__metadataref.get_probe()
+
+    def set_stop_mode(self, value):
+        self.__metadataref.set_stop_mode(value)
+        self.notify_metadata_change()
+
+    def get_stop_mode(self):
+        return self.__metadataref.get_stop_mode()
+
     def get_name(self):
         return self.__name
 
+    def get_id(self):
+        '''
+        Catalog key, the domain name qualified with the host
+        when the domain is not on the primary hypervisor
+        '''
+        return self.__id
+
+    def get_host(self):
+        if self.__host is None and self.__daoref is not None:
+            return self.__daoref.get_host()
+        return self.__host
+
+    def get_key(self):
+        return (self.get_host(), self.__name)
+
+    def get_uuid(self):
+        return self.__uuid
+
+    def set_uuid(self, value):
+        self.__uuid = value
+
     def get_state(self):
         return self.__state
 
@@ -139,15 +641,20 @@ class VMInstance(object):
         if self.state is VMState.Running:
             ret = self.__daoref.stop_domain(self)
             self.__daoref.update_domain_state(self)
-            self.__vmcatalogref.notify_change()
+            self.__vmcatalogref.notify_change(self)
             return ret
         return None
 
+    def shutdown(self):
+        if self.state is VMState.Running:
+            return self.__daoref.shutdown_domain(self)
+        return None
+
     def start(self):
         if self.state is VMState.Stopped:
             ret = self.__daoref.start_domain(self)
             self.__daoref.update_domain_state(self)
-            self.__vmcatalogref.notify_change()
+            self.__vmcatalogref.notify_change(self)
             return ret
         return None
 
@@ -155,17 +662,48 @@ class VMInstance(object):
         previous_state = self.get_state()
         self.__daoref.update_domain_state(self)
         if previous_state is not self.get_state():
-            self.__vmcatalogref.notify_change()
+            self.__vmcatalogref.notify_change(self)
+
+    def apply_state(self, state):
+        '''
+        Set state from a bulk snapshot without querying the hypervisor
+        '''
+        if self.get_state() is not state or self.__stale:
+            self.__stale = False
+            self.set_state(state)
+            self.__vmcatalogref.notify_change(self)
+
+    def is_stale(self):
+        '''
+        State comes from the snapshot cache and is not confirmed yet
+        '''
+        return self.__stale
+
+    def set_stale(self, value):
+        self.__stale = value
+
+    def mark_stale(self):
+        '''
+        Keep the state but flag it unconfirmed, the hypervisor is not
+        reachable
+        '''
+        if not self.__stale:
+            self.__stale = True
+            self.__vmcatalogref.notify_change(self)
 
     def set_metadataref(self, value):
         self.__metadataref = value
 
+    def notify_metadata_change(self):
+        if self.__vmcatalogref is not None:
+            self.__vmcatalogref.notify_change(self, metadata=True)
+
     def get_metadataref(self):
         return self.__metadataref
 
     def __eq__(self, other):
         if isinstance(other, VMInstance):
-            if self.name == other.get_name():
+            if self.get_id() == other.get_id():
                 return True
             else:
                 return False
@@ -182,6 +720,8 @@ class VMInstance(object):
         return (self.get_order() > 0 or len(self.get_desc()) > 0) and self.get_order() is not -1
 
     name = property(get_name, "Virtual machine name")
+    vm_id = property(get_id, None, None, "Catalog key of the virtual machine")
+    host = property(get_host, None, None, "Hypervisor host of the virtual machine")
     state = property(get_state, set_state, "Virtual machine state")
     order = property(get_order, set_order, "Virtual machine order")
     desc = property(get_desc, set_desc, "Virtual machine description")
@@ -196,6 +736,9 @@ class VMMetadata(object):
         self.__desc = ""
         self.__delay = 0.0
         self.__time = 0
+        self.__depends = []
+        self.__probe = ""
+        self.__stop_mode = ""
 
     def get_delay(self):
         return self.__delay
@@ -215,9 +758,30 @@ class VMMetadata(object):
     def get_order(self):
         return self.__order
 
+    def get_depends(self):
+        return self.__depends
+
+    def set_depends(self, value):
+        self.__depends = list(value)
+
+    def get_probe(self):
+        return self.__probe
+
+    def set_probe(self, value):
+        self.__probe = value
+
+    def get_stop_mode(self):
+        return self.__stop_mode
+
+    def set_stop_mode(self, value):
+        self.__stop_mode = value
+
     order = property(get_order, set_order, "Virtual machine order")
     desc = property(get_desc, set_desc, "Virtual machine description")
     delay = property(get_delay, set_delay, None, None)
+    depends = property(get_depends, set_depends, None, "Launch dependencies")
+    probe = property(get_probe, set_probe, None, "Readiness probe")
+    stop_mode = property(get_stop_mode, set_stop_mode, None, "Stop mode, empty follows project")
 
 
 class VMState(object):
@@ -242,3 +806,10 @@ class VMState(object):
     Running = State(1, c.STATE_RUNNING)
     Stopped = State(2, c.STATE_STOPPED)
     Gone = State(3, c.STATE_GONE)
+
+    @staticmethod
+    def from_str(state_str):
+        for state in (VMState.Running, VMState.Stopped, VMState.Gone):
+            if state.get_state_str() == state_str:
+                return state
+        return VMState.Gone
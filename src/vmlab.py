@@ -31,43 +31,222 @@ from kiwi.ui.dialogs import error, messagedialog
 from virtlab.virtual import VMCatalog
 import gtk
 import gobject
+import pango
 import sys
-from time import strftime, localtime
+import argparse
+import logging
 import virtlab.constant as c
 from virtlab.project import Project, ProjectDao
-from virtlab.auxiliary import VMLabException
+from virtlab.auxiliary import VMLabException, Stopwatch
 from gtk import TRUE
 import os
+import threading
+from collections import OrderedDict
 import virtlab
 from virtlab.vm import VMState
+from virtlab.events import VMStateTracker
+from virtlab.cache import CatalogCache
+from virtlab.simulator import SimulatedBackend
+from virtlab.metrics import TimedBlock, get_registry, MetricsWriter
+from virtlab.launchlog import LaunchLog
+from virtlab.dispatch import UIDispatcher
+from virtlab.profiler import BootProfiler, format_boot_stats
+from virtlab.planner import format_plan
 
 class VirtLabControl(BaseController):
     '''
     MVC Controller
     '''
 
-    def __init__(self, view, model):
+    def __init__(self, view, model, stopwatch=None, cache=None):
         BaseController.__init__(self, view)
         self.model = model
-        gobject.timeout_add_seconds(1, self.callback)
+        self.trackers = []
+        self.stopwatch = stopwatch or Stopwatch()
+        self.cache = cache
+        self.cache_save_pending = False
+        self.selected_vm_id = None
+        self.refresh_pending = False
+        self.dispatcher = view.get_dispatcher()
+        # Changes from launch, stop and event threads redraw once per drain
+        model.set_change_listener(lambda: self.dispatcher.coalesce("vmlist", self.update_view_vmlist))
+
+    def load_catalog(self):
+        '''
+        Connect and enumerate domains off the main loop, rows are added
+        to the view in chunks as the catalog fills
+        '''
+        self.view.set_statusbar("Loading virtual machines...")
+        # Warm started VMs have no hypervisor connection yet
+        self.view.set_actions_sensitive(False)
+        loader = threading.Thread(target=self.load_worker, name="catalog-loader")
+        loader.setDaemon(True)
+        loader.start()
+
+    def load_worker(self):
+        try:
+            self.model.connect()
+            # Each host fills its rows as soon as it answers
+            snapshot = self.model.collect_states(self.load_partial)
+        except VMLabException as exception:
+            gobject.idle_add(self.view.connection_error, exception)
+            return
+        gobject.idle_add(self.loaded, snapshot)
+
+    def load_partial(self, snapshot):
+        vm_instance_names = list(snapshot.keys())
+        for pos in range(0, len(vm_instance_names), c.LOAD_CHUNK):
+            chunk = OrderedDict((vm_instance_name, snapshot[vm_instance_name])
+                                for vm_instance_name in vm_instance_names[pos:pos + c.LOAD_CHUNK])
+            gobject.idle_add(self.load_chunk, chunk)
+
+    def load_chunk(self, chunk):
+        self.model.apply_partial_states(chunk)
+        self.update_view_vmlist()
+        return False
+
+    def loaded(self, snapshot):
+        # Drop or mark gone what the snapshot cache had but libvirt has not
+        self.model.reconcile(snapshot)
+        self.update_view_vmlist()
+        self.view.set_actions_sensitive(True)
+        tracking = True
+        for dao in self.model.get_daos():
+            # A host down at startup is tracked once it connects
+            dao.add_connection_listener(self.on_connection_change)
+            tracking = self.track(dao) and tracking
+        for host in sorted(self.model.get_unreachable()):
+            self.view.add_status_dialogbox(host + " unreachable, reconnecting.")
+        # With lifecycle events the poll is only a reconciliation safety net
+        if tracking:
+            gobject.timeout_add_seconds(c.RECONCILE_INTERVAL, self.callback)
+        else:
+            gobject.timeout_add_seconds(c.POLL_INTERVAL, self.callback)
+        self.view.update_order_dropdown()
+        self.stopwatch.lap("catalog")
+        self.view.set_statusbar(str(len(self.model.get_vms())) + " virtual machines, startup " + str(self.stopwatch) + ".")
+        logging.getLogger("vmlab").debug("startup %s", self.stopwatch)
+        return False
+
+    def track(self, dao):
+        '''
+        Follow lifecycle events of the current connection of dao.
+        Returns False if the connection does not deliver events
+        '''
+        tracker = VMStateTracker(dao)
+        self.trackers = [old for old in self.trackers if old.get_daoref() is not dao]
+        self.trackers.append(tracker)
+        return tracker.start(self.domain_event_listener(dao.get_host()))
 
     def callback(self):
         '''
         Callback for timer of refreshing list of VMs
         '''
-        self.reload_view_vmlist()
+        # States are collected off the main loop, a tick is skipped
+        # while the previous collection is still in flight
+        if not self.refresh_pending:
+            self.refresh_pending = True
+            self.model.collect_states_async().add_done_callback(idle_callback(self.refreshed))
         return True
 
+    def refreshed(self, future):
+        self.refresh_pending = False
+        try:
+            self.model.apply_collected(future)
+        except VMLabException as exception:
+            # Every hypervisor is down, DAOs reconnect on their own
+            self.view.set_statusbar(exception.msg + ".")
+        self.update_view_vmlist()
+        return False
+
+    def on_connection_change(self, dao, connected):
+        '''
+        Connection listener of the DAOs, runs in the thread that
+        noticed the change
+        '''
+        self.dispatcher.call(self.connection_changed, dao, connected)
+
+    def connection_changed(self, dao, connected):
+        if not connected:
+            self.view.add_status_dialogbox("Connection to " + dao.get_host() + " lost, reconnecting.")
+            return False
+        # Events of the old connection are gone, subscribe again and
+        # resync everything in one bulk pass
+        self.track(dao)
+        try:
+            self.reload_view_vmlist()
+        except VMLabException:
+            pass
+        self.view.add_status_dialogbox("Reconnected to " + dao.get_host() + ".")
+        return False
+
+    def domain_event_listener(self, host):
+        '''
+        Listener for the state tracker of host, events carry only the
+        domain name
+        '''
+        def listener(vm_instance_name, uuid, state):
+            self.on_domain_event(self.model.vm_id(host, vm_instance_name), uuid, state)
+        return listener
+
+    def on_domain_event(self, vm_instance_name, uuid, state):
+        '''
+        Listener for the state tracker, runs in the libvirt event thread.
+        The view is redrawn by the change listener of the catalog.
+        '''
+        if state is None:
+            # The state is queried off the main loop, only the result is applied there
+            self.model.query_domain_state_async(vm_instance_name).add_done_callback(
+                lambda future: self.dispatcher.call(self.domain_state_queried, vm_instance_name, uuid, future))
+            return
+        self.dispatcher.call(self.model.apply_domain_event, vm_instance_name, uuid, state)
+
+    def domain_state_queried(self, vm_instance_name, uuid, future):
+        try:
+            state = future.result()
+        except VMLabException:
+            # Connection lost, the resync after reconnecting covers the event
+            return
+        if state is not None:
+            self.model.apply_domain_event(vm_instance_name, uuid, state)
+
     def reload_view_vmlist(self, force_view_reload=False):
-        if self.model.refresh_vms_list() or force_view_reload:
-            self.model.reset_change_notify()
-            self.view.populate_vmlist()
+        self.model.refresh_vms_list()
+        self.update_view_vmlist(force_view_reload)
+
+    def update_view_vmlist(self, force_view_reload=False):
+        '''
+        Apply changes drained from the catalog to the view
+        '''
+        changes = self.model.drain_changes()
+        with TimedBlock("ui", operation="populate"):
+            if force_view_reload or changes.is_reload():
+                self.view.populate_vmlist()
+            elif not changes.is_empty():
+                self.view.populate_vmlist(changes.get_changed())
+        if not changes.is_empty():
+            self.schedule_cache_save()
+
+    def schedule_cache_save(self):
+        '''
+        Coalesce snapshot cache writes to one per CACHE_SAVE_DELAY seconds
+        '''
+        if self.cache is not None and not self.cache_save_pending:
+            self.cache_save_pending = True
+            gobject.timeout_add_seconds(c.CACHE_SAVE_DELAY, self.save_cache)
+
+    def save_cache(self):
+        self.cache_save_pending = False
+        if self.cache is not None and self.model.is_connected():
+            self.cache.save(self.model.get_vms())
+        return False
 
     # pylint: disable=W0613
     def on_vmlist_widget__selection_changed(self, vmlist_widget_allrows,
                                             vmlist_widget_row):
         if vmlist_widget_row is None:
             return
+        self.selected_vm_id = vmlist_widget_row.vm_id
         self.view.vmname.set_text(vmlist_widget_row.name)
         text_buffer = self.view.vmdesc.get_buffer()
         text_buffer.set_text(vmlist_widget_row.desc)
@@ -85,19 +264,31 @@ class VirtLabControl(BaseController):
         text_buffer = self.view.vmdesc.get_buffer()
         vm_desc = text_buffer.get_text(text_buffer.get_start_iter(), text_buffer.get_end_iter(), False)
 
-        self.model.get_vm(vm_name).set_desc(vm_desc)
+        # Without a selected row the name field names the VM, as an id
+        # of the primary host
+        vm_instance = None
+        if self.selected_vm_id is not None:
+            vm_instance = self.model.get_vm(self.selected_vm_id)
+        if vm_instance is None:
+            vm_instance = self.model.get_vm(vm_name)
+        if vm_instance is None:
+            # Gone from the hypervisor since it was selected
+            self.clear_vm_edit()
+            return
+        vm_instance.set_desc(vm_desc)
         if vm_order > 0:
-            self.model.get_vm(vm_name).set_order(vm_order)
-            self.model.get_vm(vm_name).set_delay(vm_time)
+            vm_instance.set_order(vm_order)
+            vm_instance.set_delay(vm_time)
         else:
-            self.model.get_vm(vm_name).set_order(0)
+            vm_instance.set_order(0)
         self.clear_vm_edit()
-        self.reload_view_vmlist(True)
+        self.update_view_vmlist()
 
     def on_cancelbutton__clicked(self, *args):
         self.clear_vm_edit()
 
     def clear_vm_edit(self):
+        self.selected_vm_id = None
         self.view.vmname.set_text("")
         self.view.vmdesc.get_buffer().set_text("")
         self.view.startspinner.set_value(0)
@@ -191,11 +382,15 @@ class VirtLabControl(BaseController):
             return
 
     def on_quitmenuitem__activate(self, *args):
+        self.save_cache()
         sys.exit(0)
 
     def on_aboutmenuitem__activate(self, *args):
         self.view.show_about()
 
+    def on_diagnosticsmenuitem__activate(self, *args):
+        self.view.show_diagnostics()
+
     def on_launchbutton__clicked(self, *args):
         self.view.show_dialog()
 
@@ -214,6 +409,12 @@ class VirtLabControl(BaseController):
     def hook_dialog_all_start_clicked(self, *args):
         self.model.start_all_related_vms_once()
 
+    def hook_dialog_plan_clicked(self, *args):
+        try:
+            self.view.show_plan(self.model.plan_vm_launch())
+        except VMLabException as exception:
+            self.view.add_status_dialogbox(exception.msg)
+
     def form_filename(self, file_name):
         if not file_name.endswith(c.SAVE_FILE_SUFFIX):
             return file_name+c.SAVE_FILE_SUFFIX
@@ -229,14 +430,64 @@ class VirtLabControl(BaseController):
 
 
 
-def populate_image(_state):
-    if _state is VMState.Running:
-        return gtk.gdk.pixbuf_new_from_file("pixmaps/computer-on.png")
-    else:
-        if _state is VMState.Stopped:
-            return gtk.gdk.pixbuf_new_from_file("pixmaps/computer-off.png")
+PIXMAPS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pixmaps")
+
+STATE_ICONS = {
+        VMState.Running.get_state_id(): "computer-on.png",
+        VMState.Stopped.get_state_id(): "computer-off.png",
+        VMState.Gone.get_state_id(): "computer-gone.png"
+        }
+
+_pixbuf_cache = {}
+
 
-    return gtk.gdk.pixbuf_new_from_file("pixmaps/computer-gone.png")
+def load_pixbuf(file_name, size=None):
+    '''
+    Returns pixbuf of an image in the pixmaps directory, each file and
+    size is decoded only once per process
+    '''
+    key = (file_name, size)
+    if key not in _pixbuf_cache:
+        path = os.path.join(PIXMAPS_PATH, file_name)
+        if size is None:
+            _pixbuf_cache[key] = gtk.gdk.pixbuf_new_from_file(path)
+        else:
+            _pixbuf_cache[key] = gtk.gdk.pixbuf_new_from_file_at_size(path, size, size)
+    return _pixbuf_cache[key]
+
+
+def populate_image(_state, size=None):
+    if _state is None:
+        _state = VMState.Gone
+    return load_pixbuf(STATE_ICONS.get(_state.get_state_id(), STATE_ICONS[VMState.Gone.get_state_id()]), size)
+
+
+def format_diagnostics(summary):
+    lines = ["%-16s %8s %7s %9s %9s %9s %9s" % ("host", "rpcs", "errors", "error %",
+                                                 "rpc/ref", "p50 ms", "p99 ms")]
+    for host, values in sorted(summary["hosts"].items()):
+        lines.append("%-16s %8d %7d %9.2f %9.1f %9.2f %9.2f" % (
+            host, values["rpcs"], values["errors"], values["error_rate"] * 100,
+            values["rpcs_per_refresh"], values["p50"] * 1000, values["p99"] * 1000))
+    lines.append("")
+    lines.append("%-24s %-16s %-12s %8s %9s %9s %9s" % ("operation", "host", "outcome", "calls",
+                                                       "total s", "p50 ms", "p99 ms"))
+    for row in summary["rpc"]:
+        lines.append("%-24s %-16s %-12s %8d %9.3f %9.2f %9.2f" % (
+            row["operation"], row["host"], row["outcome"], row["count"],
+            row["seconds"], row["p50"] * 1000, row["p99"] * 1000))
+    for row in summary["ui"]:
+        lines.append("%-24s %-16s %-12s %8d %9.3f %9.2f %9.2f" % (
+            "ui " + row["operation"], "", "", row["count"],
+            row["seconds"], row["p50"] * 1000, row["p99"] * 1000))
+    return "\n".join(lines)
+
+
+def idle_callback(function):
+    '''
+    Done callback for futures, runs function(future) in the main loop
+    '''
+    return lambda future: gobject.idle_add(function, future)
 
 
 # pylint: disable=R0904
@@ -245,9 +496,11 @@ class VirtLabView(BaseView):
     MVC View
     '''
 
-    def __init__(self, model):
+    def __init__(self, model, launch_log=None, dispatcher=None):
 
         self.__model = model
+        self.__launch_log = launch_log or LaunchLog()
+        self.__dispatcher = dispatcher or UIDispatcher(gobject.timeout_add)
         #self.__model.set_view(self)
 
         BaseView.__init__(self,
@@ -263,7 +516,10 @@ class VirtLabView(BaseView):
         tableColumns = [
                     Column("image", title=" ", width=30, data_type=gtk.gdk.Pixbuf, sorted=False),
                     Column("name", title='VM Name', width=130, sorted=True),
+                    Column("host", title='Host', width=90),
+                    Column("vm_id", visible=False),
                     Column("state", title='State', width=70),
+                    Column("boot", title='Boot p50/p95', width=100),
                     Column("order", title='Order (Delay/min)', width=145),
                     Column("ordinal", visible=False),
                     Column("delay", visible=False),
@@ -276,23 +532,18 @@ class VirtLabView(BaseView):
         self.vmlist_widget.set_selection_mode(gtk.SELECTION_SINGLE)
         self.hbox4.pack_start(self.vmlist_widget)
 
-        store = gtk.ListStore(gobject.TYPE_STRING)
+        self.__order_store = gtk.ListStore(gobject.TYPE_STRING)
 
         self.vmlist_widget.show()
 
         self.__dialog = None
         self.__status_text = gtk.TextBuffer()
+        self.__rows = {}
 
-        try:
-            self.populate_vmlist()
-            self.populate_order_dropdown(store, len(self.__model.get_vms()))
-        except VMLabException as exception:
-            if exception.vme_id is c.EXCEPTION_LIBVIRT_001:
-                error("Initialization error",
-                      "No connection to Libvirtd.\n Exiting.")
-                exit(1)
+        self.populate_vmlist()
+        self.update_order_dropdown()
 
-        self.ordercombo.set_model(store)
+        self.ordercombo.set_model(self.__order_store)
         cell = gtk.CellRendererText()
         self.ordercombo.pack_start(cell, True)
         self.ordercombo.add_attribute(cell, 'text', 0)
@@ -301,7 +552,7 @@ class VirtLabView(BaseView):
 
         self.change_title("")
         self.__statusbar_ctx = self.statusbar.get_context_id("virtlab")
-        self.virtlab.set_icon(gtk.gdk.pixbuf_new_from_file("pixmaps/about-logo.png"))
+        self.virtlab.set_icon(load_pixbuf("about-logo.png"))
 
     def __delaystring(self, delay):
         if delay > 0:
@@ -351,20 +602,76 @@ class VirtLabView(BaseView):
             chooser.destroy()
             return
 
-    def populate_vmlist(self):
+    def populate_vmlist(self, vm_instance_names=None):
         '''
-        Populates view with current status
+        Populates view with current status.
+        Rows are kept between calls and only changed rows are touched,
+        vm_instance_names limits the update to the given VMs.
         '''
-        self.vmlist_widget.clear()
+        if vm_instance_names is None:
+            vm_instances = self.__model.get_vms()
+            current = set(vm_instance.get_id() for vm_instance in vm_instances)
+            for vm_instance_name in set(self.__rows) - current:
+                self.vmlist_widget.remove(self.__rows.pop(vm_instance_name))
+        else:
+            vm_instances = []
+            for vm_instance_name in vm_instance_names:
+                vm_instance = self.__model.get_vm(vm_instance_name)
+                if vm_instance is not None:
+                    vm_instances.append(vm_instance)
+                elif vm_instance_name in self.__rows:
+                    self.vmlist_widget.remove(self.__rows.pop(vm_instance_name))
+
+        for vm_instance in vm_instances:
+            self.update_vmlist_row(vm_instance)
+
+    def update_vmlist_row(self, vm_instance):
+        state = vm_instance.get_state().get_state_str()
+        if vm_instance.is_stale():
+            state += " (cached)"
+        values = dict(name=vm_instance.get_name(),
+                      host=vm_instance.get_host(),
+                      vm_id=vm_instance.get_id(),
+                      state=state,
+                      boot=self.get_boot_stats(vm_instance),
+                      order=self.get_display_order(vm_instance.get_order()) + self.__delaystring(vm_instance.get_delay()),
+                      ordinal=vm_instance.get_order(),
+                      delay=vm_instance.get_delay(),
+                      desc=vm_instance.get_desc())
+
+        row = self.__rows.get(vm_instance.get_id())
+        if row is None:
+            row = Settable(image=populate_image(vm_instance.get_state()), **values)
+            self.__rows[vm_instance.get_id()] = row
+            self.vmlist_widget.append(row)
+            return
+
+        changed = [key for key in values if getattr(row, key) != values[key]]
+        if len(changed) is 0:
+            return
+        if "state" in changed:
+            row.image = populate_image(vm_instance.get_state())
+        for key in changed:
+            setattr(row, key, values[key])
+        self.vmlist_widget.update(row)
 
-        for vm_instance in self.__model.get_vms():
-            self.vmlist_widget.append(Settable(image=populate_image(vm_instance.get_state()), name=vm_instance.get_name(),
-                            state=vm_instance.get_state().get_state_str(),
-                            order=self.get_display_order(vm_instance.get_order()) + self.__delaystring(vm_instance.get_delay()),
-                            ordinal=vm_instance.get_order(),
-                            delay=vm_instance.get_delay(),
-                            desc=vm_instance.get_desc()))
 
+    def get_boot_stats(self, vm_instance):
+        profiler = self.__model.get_profiler()
+        if profiler is None:
+            return ""
+        return format_boot_stats(profiler.get_stats(vm_instance.get_id()))
+
+    def connection_error(self, exception):
+        if exception.vme_id is c.EXCEPTION_LIBVIRT_001:
+            error("Initialization error",
+                  "No connection to Libvirtd.\n Exiting.")
+            exit(1)
+        error("Initialization error", str(exception.msg))
+        return False
+
+    def update_order_dropdown(self):
+        self.populate_order_dropdown(self.__order_store, len(self.__model.get_vms()))
 
     def populate_order_dropdown(self, list_store, vm_count):
         list_store.clear()
@@ -373,12 +680,32 @@ class VirtLabView(BaseView):
             for num in range(1, vm_count + 1):
                 list_store.append([self.get_display_order(num)])
 
+    def get_dispatcher(self):
+        return self.__dispatcher
+
+    def set_actions_sensitive(self, value):
+        '''
+        Enable or disable launching and stopping VMs
+        '''
+        for widget in (self.launchbutton, self.stopallbutton, self.stoprelatedbutton):
+            widget.set_sensitive(value)
+
     def add_status_dialogbox(self, text):
-        field_content = self.__status_text.get_text(self.__status_text.get_start_iter(), self.__status_text.get_end_iter(), False)
-        field_content += strftime("%d %b %Y %H:%M:%S", localtime()) + " " + text + "\n"
-        self.__status_text.set_text(field_content)
+        # Called from launch and stop threads, the buffer is touched in the main loop
+        line = self.__launch_log.append(text)
+        self.__dispatcher.call(self.append_status_line, line)
+
+    def append_status_line(self, line):
+        self.__status_text.insert(self.__status_text.get_end_iter(), line + "\n")
+        # The last line is the empty one after the newline
+        excess = self.__status_text.get_line_count() - 1 - self.__launch_log.get_capacity()
+        if excess > 0:
+            self.__status_text.delete(self.__status_text.get_start_iter(),
+                                      self.__status_text.get_iter_at_line(excess))
+        return False
 
     def clear_dialog_log(self):
+        self.__launch_log.clear()
         self.__status_text.set_text("")
 
     def show_dialog(self):
@@ -390,11 +717,13 @@ class VirtLabView(BaseView):
         clear_button = gtk.Button("Clear log")
         start_button = gtk.Button("Launch scheduled")
         start_once_button = gtk.Button("Launch all once")
+        plan_button = gtk.Button("Preview plan")
         close_button.connect("clicked", lambda d, r: r.destroy(), self.__dialog)
         clear_button.connect("clicked", lambda d, r: r.clear_dialog_log(), self)
         terminate_button.connect("clicked", self.controller.hook_dialog_terminate_clicked, None)
         start_button.connect("clicked", self.controller.hook_dialog_start_clicked, None)
         start_once_button.connect("clicked", self.controller.hook_dialog_all_start_clicked, None)
+        plan_button.connect("clicked", self.controller.hook_dialog_plan_clicked, None)
         scrolled_window = gtk.ScrolledWindow(hadjustment=None, vadjustment=None)
         scrolled_window.set_policy(gtk.POLICY_NEVER, gtk.POLICY_ALWAYS)
         text_view = gtk.TextView()
@@ -404,6 +733,7 @@ class VirtLabView(BaseView):
         # pylint: disable=E1101
         self.__dialog.action_area.pack_start(start_button, True, True, 0)
         self.__dialog.action_area.pack_start(start_once_button, True, True, 0)
+        self.__dialog.action_area.pack_start(plan_button, True, True, 0)
         self.__dialog.action_area.pack_start(clear_button, True, True, 0)
         self.__dialog.action_area.pack_start(terminate_button, True, True, 0)
         self.__dialog.action_area.pack_start(close_button, True, True, 0)
@@ -411,6 +741,7 @@ class VirtLabView(BaseView):
         scrolled_window.set_size_request(500, 200)
         start_button.show()
         start_once_button.show()
+        plan_button.show()
         terminate_button.show()
         close_button.show()
         clear_button.show()
@@ -419,6 +750,48 @@ class VirtLabView(BaseView):
         text_view.set_editable(False)
         text_view.set_cursor_visible(False)
 
+    def show_diagnostics(self):
+        '''
+        RPC and UI timings, refreshed while the dialog is open
+        '''
+        self.show_text_dialog("Diagnostics", lambda: format_diagnostics(get_registry().summary()),
+                              c.DIAGNOSTICS_INTERVAL)
+
+    def show_plan(self, plan):
+        # Opened from the modal launch dialog, so modal as well
+        self.show_text_dialog("Launch plan", lambda: format_plan(plan), modal=True)
+
+    def show_text_dialog(self, title, get_text, interval=None, modal=False):
+        '''
+        Dialog with the monospace text of get_text(), refreshed every
+        interval seconds while open
+        '''
+        dialog = gtk.Dialog(title=title, parent=self.virtlab,
+                            flags=gtk.DIALOG_MODAL if modal else 0,
+                            buttons=(gtk.STOCK_CLOSE, gtk.RESPONSE_CLOSE))
+        dialog.set_transient_for(self.virtlab)
+        dialog.connect("response", lambda d, r: d.destroy())
+        scrolled_window = gtk.ScrolledWindow()
+        scrolled_window.set_policy(gtk.POLICY_AUTOMATIC, gtk.POLICY_AUTOMATIC)
+        scrolled_window.set_size_request(640, 320)
+        text_view = gtk.TextView()
+        text_view.set_editable(False)
+        text_view.set_cursor_visible(False)
+        text_view.modify_font(pango.FontDescription("monospace"))
+        scrolled_window.add(text_view)
+        # pylint: disable=E1101
+        dialog.vbox.pack_start(scrolled_window, True, True, 0)
+
+        def refresh():
+            if text_view.get_toplevel() is not dialog:
+                return False
+            text_view.get_buffer().set_text(get_text())
+            return True
+        refresh()
+        if interval is not None:
+            gobject.timeout_add_seconds(interval, refresh)
+        dialog.show_all()
+
     def show_about(self):
         about = gtk.AboutDialog()
         about.set_program_name("Virtual Lab Manager")
@@ -428,7 +801,7 @@ class VirtLabView(BaseView):
         f = open(path + '/LICENCE', 'r')
         about.set_license(f.read())
         about.set_copyright("GPLv3, (c) Authors")
-        about.set_logo(gtk.gdk.pixbuf_new_from_file("pixmaps/about-logo.png"))
+        about.set_logo(load_pixbuf("about-logo.png"))
         about.set_authors(["Harri Savolainen", "Esa Elo"])
         about.set_comments("Virtual Machine lab tool")
         about.set_website("https://github.com/hsavolai/vmlab")
@@ -455,6 +828,10 @@ class VirtLabView(BaseView):
                     )
 
     def set_statusbar(self, value):
+        # Any thread, only the latest text of a drain is shown
+        self.__dispatcher.coalesce("statusbar", self.show_statusbar, value)
+
+    def show_statusbar(self, value):
         #self.statusbar.remove_all(self.__statusbar_ctx)
         self.statusbar.pop(self.__statusbar_ctx)
         self.statusbar.push(self.__statusbar_ctx, value)
@@ -487,13 +864,52 @@ class VirtLabView(BaseView):
 
 # pylint: disable=W0613
 def main(argv=None):
-
-    model = VMCatalog()
-    view = VirtLabView(model)
-    VirtLabControl(view, model)
+    parser = argparse.ArgumentParser(prog="vmlab", description="Virtual Lab Manager")
+    parser.add_argument("-c", "--connect", action="append",
+                        help="libvirt URI, repeat for every hypervisor of the lab")
+    parser.add_argument("-s", "--simulate", type=int, metavar="DOMAINS",
+                        help="use a simulated hypervisor with DOMAINS domains instead of libvirt")
+    parser.add_argument("--metrics", metavar="FILE",
+                        help="write RPC metrics to FILE periodically, JSON if it ends with .json")
+    parser.add_argument("--log", metavar="FILE",
+                        help="also write the launch log to FILE, rotated at %d bytes" % c.LAUNCH_LOG_MAX_BYTES)
+    parser.add_argument("--debug", action="store_true",
+                        help="log startup timings and other diagnostics to stderr")
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+    if args.debug:
+        logging.basicConfig(level=logging.DEBUG, format="%(name)s: %(message)s")
+
+    stopwatch = Stopwatch()
+    gobject.threads_init()
+    # Event loop has to be registered before the libvirt connection is opened
+    VMStateTracker.register_event_loop()
+    if args.simulate is not None:
+        model = VMCatalog(SimulatedBackend(args.simulate), autoload=False)
+    else:
+        model = VMCatalog(args.connect or c.LIBVIRT_URI, autoload=False)
+    # Last known state is shown until libvirt has been reconciled
+    cache = CatalogCache(model.get_hooks())
+    profiler = BootProfiler(model.get_hooks())
+    profiler.load()
+    model.set_profiler(profiler)
+    model.restore_snapshot(cache.load())
+    model.drain_changes()
+    launch_log = LaunchLog(path=args.log)
+    view = VirtLabView(model, launch_log)
+    controller = VirtLabControl(view, model, stopwatch, cache)
     model.set_view(view)
     view.show()
+    stopwatch.lap("window")
+    controller.load_catalog()
+    if args.metrics is not None:
+        metrics_writer = MetricsWriter(args.metrics)
+        metrics_writer.start()
     gtk.main()
+    controller.save_cache()
+    model.close()
+    launch_log.close()
+    if args.metrics is not None:
+        metrics_writer.stop()
 
 if __name__ == "__main__":
     sys.exit(main())
@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+'''
+This file is part of Virtual Lab Manager.
+
+VM Lab Manager program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Copyright 2012 Harri Savolainen
+
+@author: hsavolai, epelo
+@license: GPLv3
+
+Virtual Lab Manager headless command line interface
+
+    vmlabcli.py start|stop|status|plan [options] project.lab
+
+Progress is written to stderr, the result as JSON to stdout.
+Never imports gtk, so it runs on hypervisor hosts without a display.
+'''
+import argparse
+import json
+import sys
+import virtlab.constant as c
+from virtlab.auxiliary import VMLabException
+from virtlab.project import ProjectDao
+from virtlab.virtual import VMCatalog
+from virtlab.simulator import SimulatedBackend
+from virtlab.metrics import MetricsWriter
+from virtlab.launchlog import LaunchLog
+from virtlab.profiler import BootProfiler
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_ERROR = 2
+
+
+class ConsoleReporter(object):
+    '''
+    Stands in for the view as the reporter of the catalog
+    '''
+
+    def __init__(self, quiet=False, launch_log=None):
+        self.__quiet = quiet
+        self.__launch_log = launch_log or LaunchLog()
+
+    def add_status_dialogbox(self, text):
+        line = self.__launch_log.append(text)
+        if not self.__quiet:
+            sys.stderr.write(line + "\n")
+
+    def set_statusbar(self, value):
+        pass
+
+
+def vm_status(model, vm_instance):
+    return {"name": vm_instance.get_name(),
+            "id": vm_instance.get_id(),
+            "host": vm_instance.get_host(),
+            "uuid": vm_instance.get_uuid(),
+            "state": str(vm_instance.get_state()),
+            "order": vm_instance.get_order(),
+            "delay": vm_instance.get_delay(),
+            "desc": vm_instance.get_desc(),
+            "depends": vm_instance.get_depends(),
+            "probe": vm_instance.get_probe(),
+            "stop_mode": model.get_stop_mode(vm_instance),
+            "role": vm_instance.has_defined_role(),
+            "boot": boot_status(model, vm_instance)}
+
+
+def boot_status(model, vm_instance):
+    stats = model.get_profiler().get_stats(vm_instance.get_id())
+    if stats is None:
+        return None
+    launches, p50, p95 = stats
+    return {"launches": launches, "p50": p50, "p95": p95}
+
+
+def command_status(model, args):
+    '''
+    Status of the VMs
+    '''
+    vm_instances = model.get_vms()
+    if not args.all:
+        vm_instances = [vm_instance for vm_instance in vm_instances if vm_instance.has_defined_role()]
+    return EXIT_OK, {"vms": [vm_status(model, vm_instance) for vm_instance in vm_instances]}
+
+
+def command_start(model, args):
+    '''
+    Start the project VMs
+    '''
+    model.scheduled_vm_launcher(args.all)
+    launch = model.get_launch()
+    if launch is None:
+        return EXIT_OK, {"launched": []}
+    try:
+        launch.join()
+    except KeyboardInterrupt:
+        model.cancel_vm_launch()
+
+    nodes = [{"name": node.get_name(), "status": node.get_status()} for node in launch.get_nodes()]
+    failed = [node for node in nodes if node["status"] != c.LAUNCH_DONE]
+    return EXIT_FAILED if failed else EXIT_OK, {"launched": nodes}
+
+
+def command_plan(model, args):
+    '''
+    Show what start would do
+    '''
+    return EXIT_OK, {"plan": model.plan_vm_launch(args.all).as_dict()}
+
+
+def command_stop(model, args):
+    '''
+    Stop the project VMs
+    '''
+    if args.mode is not None:
+        model.get_project().set_stop_mode(args.mode)
+        for vm_instance in model.get_vms():
+            vm_instance.set_stop_mode("")
+    if args.all:
+        model.stop_all_vms_once()
+    else:
+        model.stop_all_related_vms_once()
+    shutdown = model.get_shutdown()
+    if shutdown is None:
+        return EXIT_OK, {"clean": [], "forced": [], "failed": []}
+    shutdown.join()
+    result = {"clean": shutdown.get_clean(),
+              "forced": shutdown.get_forced(),
+              "failed": shutdown.get_failed()}
+    return EXIT_FAILED if shutdown.get_failed() else EXIT_OK, result
+
+
+COMMANDS = {
+    "plan": command_plan,
+    "start": command_start,
+    "stop": command_stop,
+    "status": command_status,
+}
+
+
+def parse_args(argv):
+    '''
+    Options and the project file follow the command in any order, so
+    each command has its own parser sharing the options
+    '''
+    options = argparse.ArgumentParser(add_help=False)
+    options.add_argument("project", nargs="?", help="project file (" + c.SAVE_FILE_SUFFIX + ")")
+    options.add_argument("-c", "--connect", action="append",
+                         help="libvirt URI, repeat for every hypervisor of the lab")
+    options.add_argument("-s", "--simulate", type=int, metavar="DOMAINS",
+                         help="use a simulated hypervisor with DOMAINS domains instead of libvirt")
+    options.add_argument("-a", "--all", action="store_true",
+                         help="start/plan: launch all at once, stop/status: all VMs, not only project VMs")
+    options.add_argument("-m", "--mode", choices=[c.STOP_MODE_DESTROY, c.STOP_MODE_GRACEFUL],
+                         help="stop mode overriding the project")
+    options.add_argument("--metrics", metavar="FILE",
+                         help="write RPC metrics to FILE, JSON if it ends with .json")
+    options.add_argument("--log", metavar="FILE",
+                         help="also write progress to FILE, rotated at %d bytes" % c.LAUNCH_LOG_MAX_BYTES)
+    options.add_argument("-q", "--quiet", action="store_true", help="no progress to stderr")
+
+    parser = argparse.ArgumentParser(prog="vmlabcli",
+                                     description="Virtual Lab Manager without GUI")
+    commands = parser.add_subparsers(dest="command", metavar="command")
+    commands.required = True
+    for command in sorted(COMMANDS.keys()):
+        commands.add_parser(command, parents=[options], help=COMMANDS[command].__doc__)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    if args.metrics is not None:
+        metrics_writer = MetricsWriter(args.metrics)
+        metrics_writer.start()
+
+    launch_log = LaunchLog(path=args.log)
+    model = None
+    try:
+        if args.simulate is not None:
+            model = VMCatalog(SimulatedBackend(args.simulate))
+        else:
+            model = VMCatalog(args.connect or c.LIBVIRT_URI)
+        if args.project is not None:
+            model.inject_project(ProjectDao.load_project(args.project))
+            model.refresh_vms_list()
+        model.set_view(ConsoleReporter(args.quiet, launch_log))
+        profiler = BootProfiler(model.get_hooks())
+        profiler.load()
+        model.set_profiler(profiler)
+        exit_code, result = COMMANDS[args.command](model, args)
+    except VMLabException as exception:
+        exit_code, result = EXIT_ERROR, {"error": exception.vme_id, "message": exception.msg}
+    except (IOError, KeyError) as exception:
+        exit_code, result = EXIT_ERROR, {"error": "PROJECT", "message": str(exception)}
+    finally:
+        if model is not None:
+            model.close()
+
+    launch_log.close()
+    result["project"] = args.project
+    sys.stdout.write(json.dumps(result, indent=2, sort_keys=True) + "\n")
+    if args.metrics is not None:
+        metrics_writer.stop()
+    return exit_code
+
+if __name__ == "__main__":
+    sys.exit(main())